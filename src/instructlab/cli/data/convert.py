@@ -0,0 +1,57 @@
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard
+from pathlib import Path
+import logging
+
+# Third Party
+import click
+
+# First Party
+from instructlab import clickext
+from instructlab.data.columnar import FORMATS, JSONL_SUFFIX, convert_dataset
+
+logger = logging.getLogger(__name__)
+
+
+@click.command(name="convert")
+@click.argument(
+    "dataset_paths",
+    nargs=-1,
+    required=True,
+    type=click.Path(path_type=Path),
+)
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(tuple(FORMATS)),
+    default="arrow",
+    show_default=True,
+    help="Columnar format to write. Arrow files are memory-mapped when loaded, Parquet files are smaller.",
+)
+@clickext.display_params
+def convert(dataset_paths, fmt):
+    """Converts JSONL datasets to Parquet or Arrow
+
+    Every JSONL file given, or found in the directories given, is written next to
+    itself with the suffix of the format. Training and testing then read the converted
+    file in place of the JSONL file.
+    """
+    files: list[Path] = []
+    for path in dataset_paths:
+        if path.is_dir():
+            files.extend(sorted(path.rglob(f"*{JSONL_SUFFIX}")))
+        elif path.is_file() and path.suffix == JSONL_SUFFIX:
+            files.append(path)
+        else:
+            raise click.BadParameter(
+                f"{path} is not a JSONL file or a directory", param_hint="DATASET_PATHS"
+            )
+
+    for file in files:
+        try:
+            output = convert_dataset(file, fmt)
+        except Exception as exc:
+            click.secho(f"Failed to convert {file}: {exc}", fg="red")
+            raise click.exceptions.Exit(1) from exc
+        click.echo(f"{file} -> {output}")
@@ -0,0 +1,88 @@
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard
+from pathlib import Path
+import logging
+
+# Third Party
+import click
+
+# First Party
+from instructlab import clickext
+from instructlab.data.dedup import dedup_dataset
+from instructlab.utils import print_table
+
+logger = logging.getLogger(__name__)
+
+
+@click.command(name="dedup")
+@click.argument("dataset_path", type=click.Path(path_type=Path))
+@click.option(
+    "--output",
+    type=click.Path(path_type=Path),
+    help="Path of the filtered dataset. Defaults to <dataset>_dedup next to the dataset, where `ilab model train` picks it up.",
+)
+@click.option(
+    "--threshold",
+    type=click.FloatRange(min=0, max=1, min_open=True),
+    default=0.8,
+    show_default=True,
+    help="Estimated Jaccard similarity of the word n-grams above which two samples are duplicates.",
+)
+@click.option(
+    "--num-perm",
+    type=click.IntRange(min=2),
+    default=128,
+    show_default=True,
+    help="Number of hash functions of the MinHash signatures.",
+)
+@click.option(
+    "--ngram",
+    type=click.IntRange(min=1),
+    default=5,
+    show_default=True,
+    help="Number of words of the n-grams compared.",
+)
+@click.option(
+    "--num-workers",
+    type=click.IntRange(min=1),
+    help="Number of processes computing the signatures. Defaults to the number of CPUs.",
+)
+@clickext.display_params
+def dedup(dataset_path, output, threshold, num_perm, ngram, num_workers):
+    """Removes near-duplicate samples from a generated dataset
+
+    Samples are compared on their user and assistant text with MinHash LSH. The
+    first sample of every cluster of near-duplicates is kept, and the filtered
+    dataset is written in the format of the input.
+    """
+    if not dataset_path.is_file():
+        raise click.BadParameter(
+            f"{dataset_path} does not exist", param_hint="DATASET_PATH"
+        )
+    try:
+        output, report = dedup_dataset(
+            dataset_path,
+            output=output,
+            threshold=threshold,
+            num_perm=num_perm,
+            ngram=ngram,
+            num_workers=num_workers,
+        )
+    except (OSError, ValueError) as exc:
+        click.secho(f"Failed to deduplicate {dataset_path}: {exc}", fg="red")
+        raise click.exceptions.Exit(1) from exc
+
+    removed_pct = 100 * report.removed / report.samples if report.samples else 0
+    click.echo(
+        f"Kept {report.kept} of {report.samples} samples, removed {report.removed} near-duplicates ({removed_pct:.1f}%)"
+    )
+    click.echo(
+        f"{report.clusters} clusters of near-duplicates, the largest with {report.largest} samples"
+    )
+    if report.cluster_sizes:
+        print_table(
+            ["Cluster size", "Clusters"],
+            [[str(size), str(count)] for size, count in report.cluster_sizes.items()],
+        )
+    click.echo(f"Filtered dataset written to {output}")
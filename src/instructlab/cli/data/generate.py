@@ -13,7 +13,7 @@ import click
 
 # First Party
 from instructlab import clickext
-from instructlab.client_utils import HttpClientParams
+from instructlab.client_utils import HttpClientParams, read_endpoint_pool_file
 from instructlab.configuration import DEFAULTS
 from instructlab.data.generate_data import gen_data  # type: ignore
 from instructlab.defaults import ILAB_PROCESS_MODES
@@ -84,7 +84,13 @@ logger = logging.getLogger(__name__)
 @click.option(
     "--endpoint-url",
     type=click.STRING,
-    help="Custom URL endpoint for OpenAI-compatible API. Defaults to the `ilab model serve` endpoint.",
+    multiple=True,
+    help="Custom URL endpoint for OpenAI-compatible API. Defaults to the `ilab model serve` endpoint. Repeat to spread the requests over several replicas of the teacher model.",
+)
+@click.option(
+    "--endpoint-pool-file",
+    type=click.Path(exists=True, dir_okay=False),
+    help="File listing endpoint URLs of teacher model replicas, one per line. Added to the --endpoint-url endpoints.",
 )
 @click.option(
     "--api-key",
@@ -178,6 +184,7 @@ def generate(
     output_dir,
     quiet,
     endpoint_url,
+    endpoint_pool_file,
     api_key,
     yaml_rules,
     chunk_word_count,
@@ -263,6 +270,10 @@ def generate(
             student_model_path, student_model_arch
         )
 
+    endpoint_urls = list(endpoint_url)
+    if endpoint_pool_file:
+        endpoint_urls.extend(read_endpoint_pool_file(endpoint_pool_file))
+
     process_mode = ILAB_PROCESS_MODES.ATTACHED
     if detached:
         process_mode = ILAB_PROCESS_MODES.DETACHED
@@ -282,7 +293,7 @@ def generate(
             taxonomy_base,
             dated_output_dir,
             quiet,
-            endpoint_url,
+            endpoint_urls,
             api_key,
             yaml_rules,
             chunk_word_count,
@@ -49,7 +49,18 @@ def extract_model_name(
     default=[DEFAULTS.DATASETS_DIR],
     show_default=True,
 )
-def list_datasets(dataset_dirs):
+@click.option(
+    "--tokenizer",
+    "tokenizer_path",
+    type=click.STRING,
+    help="Tokenizer, a model directory or Hugging Face model name, to count the tokens of each dataset with.",
+)
+@click.option(
+    "--num-workers",
+    type=click.IntRange(min=1),
+    help="Number of datasets tokenized in parallel.",
+)
+def list_datasets(dataset_dirs, tokenizer_path, num_workers):
     """lists datasets"""
 
     data: List[List[str]] = []
@@ -57,12 +68,14 @@ def list_datasets(dataset_dirs):
     dirs = [Path(dir) for dir in dataset_dirs]
 
     try:
-        data = list_data(dirs)
+        data = list_data(dirs, tokenizer_path=tokenizer_path, num_workers=num_workers)
     except OSError as exc:
         click.secho(f"Failed to list datasets with exception: {exc}")
         raise click.exceptions.Exit(1)
 
-    headers = ["Dataset", "Model", "Created At", "File size"]
+    headers = ["Dataset", "Model", "Created At", "File size", "Samples", "Schema"]
+    if tokenizer_path is not None:
+        headers.append("Tokens")
     # Check if data is empty and print an empty table if so
     if not data:
         print_table(headers, data)
@@ -84,6 +97,7 @@ def list_datasets(dataset_dirs):
                 model_name,
                 created_at,
                 size,
+                *item[4:],
             ]
         )
 
@@ -0,0 +1,183 @@
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard
+from pathlib import Path
+import itertools
+import logging
+
+# Third Party
+import click
+
+# First Party
+from instructlab import clickext
+from instructlab.data.stats import (
+    length_histogram,
+    length_percentiles,
+    plan_packing,
+    token_lengths,
+)
+from instructlab.utils import print_table
+
+logger = logging.getLogger(__name__)
+
+# width of the longest bar of the histogram
+HISTOGRAM_WIDTH = 40
+
+
+@click.command(name="stats")
+@click.argument("dataset_path", type=click.Path(path_type=Path))
+@click.option(
+    "--model-path",
+    type=click.STRING,
+    cls=clickext.ConfigOption,
+    config_class="train",
+)
+@click.option(
+    "--max-seq-len",
+    type=click.IntRange(min=1),
+    multiple=True,
+    help="Candidate maximum sample length. Can be repeated. Defaults to 'train.max_seq_len'.",
+)
+@click.option(
+    "--max-batch-len",
+    type=click.IntRange(min=1),
+    multiple=True,
+    help="Candidate maximum tokens per GPU and batch. Can be repeated. Defaults to 'train.max_batch_len'.",
+)
+@click.option(
+    "--effective-batch-size",
+    type=click.IntRange(min=1),
+    multiple=True,
+    help="Candidate number of samples per optimizer step. Can be repeated. Defaults to 'train.effective_batch_size'.",
+)
+@click.option(
+    "--num-gpus",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of GPUs the batches are spread over.",
+)
+@click.option(
+    "--bins",
+    type=click.IntRange(min=1),
+    default=10,
+    show_default=True,
+    help="Number of bins of the token length histogram.",
+)
+@click.option(
+    "--num-workers",
+    type=click.IntRange(min=1),
+    help="Number of tokenizing processes. Defaults to the number of CPUs.",
+)
+@clickext.display_params
+@click.pass_context
+def stats(
+    ctx,
+    dataset_path,
+    model_path,
+    max_seq_len,
+    max_batch_len,
+    effective_batch_size,
+    num_gpus,
+    bins,
+    num_workers,
+):
+    """Token length statistics of a dataset and the training batches they pack into
+
+    The samples are tokenized with the tokenizer of the model to train. Every
+    combination of the candidate settings gets the projected gradient
+    accumulation, packed batches, padding waste and tokens per epoch.
+    """
+    if not dataset_path.is_file():
+        raise click.BadParameter(
+            f"{dataset_path} does not exist", param_hint="DATASET_PATH"
+        )
+    train_cfg = ctx.obj.config.train
+    candidates = list(
+        itertools.product(
+            max_seq_len or (train_cfg.max_seq_len,),
+            max_batch_len or (train_cfg.max_batch_len,),
+            effective_batch_size or (train_cfg.effective_batch_size,),
+        )
+    )
+
+    try:
+        lengths = token_lengths(dataset_path, model_path, num_workers=num_workers)
+    except (OSError, ValueError) as exc:
+        click.secho(f"Failed to tokenize {dataset_path}: {exc}", fg="red")
+        raise click.exceptions.Exit(1) from exc
+    if not len(lengths):
+        click.secho(f"{dataset_path} has no samples to train on", fg="red")
+        raise click.exceptions.Exit(1)
+
+    click.echo(
+        f"{len(lengths)} samples, {int(lengths.sum())} tokens, mean length {lengths.mean():.1f}, longest {int(lengths.max())}"
+    )
+    print_table(
+        ["Percentile", "Tokens"],
+        [[f"p{p}", str(v)] for p, v in length_percentiles(lengths).items()],
+    )
+
+    histogram = length_histogram(lengths, bins)
+    most = max(count for _, _, count in histogram)
+    print_table(
+        ["Tokens", "Samples", ""],
+        [
+            [
+                f"{low}-{high}",
+                str(count),
+                "#" * round(HISTOGRAM_WIDTH * count / most),
+            ]
+            for low, high, count in histogram
+        ],
+    )
+
+    rows = []
+    for seq_len, batch_len, batch_size in candidates:
+        plan = plan_packing(lengths, seq_len, batch_len, batch_size, num_gpus)
+        packing = (
+            [
+                str(plan.grad_accum),
+                str(plan.packing_max_batch_len),
+                str(plan.packed_batches),
+                f"{100 * plan.packing_efficiency:.1f}%",
+                f"{100 * plan.padding_waste:.1f}%",
+            ]
+            if plan.error is None
+            else ["-"] * 5
+        )
+        rows.append(
+            [
+                str(seq_len),
+                str(batch_len),
+                str(batch_size),
+                str(plan.dropped),
+                *packing,
+                str(plan.steps),
+                str(plan.tokens),
+            ]
+        )
+        if plan.error is not None:
+            click.secho(
+                f"max_seq_len={seq_len} max_batch_len={batch_len} effective_batch_size={batch_size}: {plan.error}",
+                fg="yellow",
+            )
+    print_table(
+        [
+            "Max seq len",
+            "Max batch len",
+            "Eff. batch size",
+            "Dropped",
+            "Grad accum",
+            "Packed len",
+            "Packed batches",
+            "Packing eff.",
+            "Padding waste",
+            "Steps/epoch",
+            "Tokens/epoch",
+        ],
+        rows,
+    )
+    click.echo(
+        "Packed batches are per GPU and epoch. Padding waste is the share of padding tokens when batches are padded instead of packed."
+    )
@@ -202,6 +202,11 @@ def set_benchmark_specific_vars(
     type=click.FloatRange(min=0.0, max=1.0),
     cls=clickext.ConfigOption,
 )
+@click.option(
+    "--streaming",
+    is_flag=True,
+    help="Score DK-Bench questions one at a time and append each result to a JSONL file as soon as it is available. An interrupted run resumes from that file when run again with the same model and input questions.",
+)
 @click.pass_context
 @clickext.display_params
 def evaluate(
@@ -232,8 +237,13 @@ def evaluate(
     output_file_formats,
     system_prompt,
     temperature,
+    streaming: bool,
 ) -> None:
     """Evaluates a trained model"""
+    if streaming and benchmark != Benchmark.DK_BENCH:
+        raise click.UsageError(
+            f"--streaming is only supported by the {Benchmark.DK_BENCH.value} benchmark"
+        )
     try:
         judge_model, output_dir = set_benchmark_specific_vars(
             ctx, benchmark, judge_model, output_dir
@@ -267,6 +277,7 @@ def evaluate(
             output_file_formats=output_file_formats,
             system_prompt=system_prompt,
             temperature=temperature,
+            streaming=streaming,
         )
     except Exception as e:
         logger.error(f"An error occurred during evaluation: {str(e)}")
@@ -0,0 +1,213 @@
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard
+import logging
+import os
+
+# Third Party
+import click
+
+# First Party
+from instructlab import clickext
+from instructlab.configuration import DEFAULTS
+from instructlab.model.backends import backends
+from instructlab.model.evaluate_matrix import MATRIX_BENCHMARKS, evaluate_matrix
+
+logger = logging.getLogger(__name__)
+
+
+@click.command(name="evaluate-matrix")
+@click.option(
+    "--models",
+    "-m",
+    multiple=True,
+    required=True,
+    type=click.STRING,
+    help="Model to evaluate. Pass once per candidate model.",
+)
+@click.option(
+    "--benchmarks",
+    "-b",
+    multiple=True,
+    required=True,
+    type=click.Choice([b.value for b in MATRIX_BENCHMARKS]),
+    help="Benchmark to run against every model. Pass once per benchmark.",
+)
+@click.option(
+    "--judge-model",
+    default=None,
+    type=click.STRING,
+    help="Judge model for mt_bench. Defaults to the mt_bench judge model in the config.",
+)
+@click.option(
+    "--judge-endpoint",
+    default=None,
+    type=click.STRING,
+    help="API base of an already running mt_bench judge, e.g. 'http://judge:8000/v1'. When set, judging of one model overlaps with answer generation of the next.",
+)
+@click.option(
+    "--judge-workers",
+    type=click.IntRange(min=1),
+    default=2,
+    show_default=True,
+    help="Number of models whose answers can be judged at the same time.",
+)
+@click.option(
+    "--output-dir",
+    type=click.Path(),
+    default=lambda: os.path.join(DEFAULTS.EVAL_DATA_DIR, "matrix"),
+    show_default="<eval_data>/matrix",
+    help="Directory the consolidated matrix report is written to.",
+)
+@click.option(
+    "--max-workers",
+    type=click.STRING,
+    cls=clickext.ConfigOption,
+    config_class="evaluate",
+    config_sections="mt_bench",
+)
+@click.option(
+    "--few-shots",
+    type=click.INT,
+    cls=clickext.ConfigOption,
+    config_class="evaluate",
+    config_sections="mmlu",
+)
+@click.option(
+    "--batch-size",
+    type=click.STRING,
+    cls=clickext.ConfigOption,
+    config_class="evaluate",
+    config_sections="mmlu",
+)
+@click.option(
+    "--input-questions",
+    type=click.STRING,
+    cls=clickext.ConfigOption,
+    config_class="evaluate",
+    config_sections="dk_bench",
+)
+@click.option(
+    "--output-file-formats",
+    type=click.STRING,
+    cls=clickext.ConfigOption,
+    config_class="evaluate",
+    config_sections="dk_bench",
+)
+@click.option(
+    "--temperature",
+    type=click.FloatRange(min=0.0, max=1.0),
+    cls=clickext.ConfigOption,
+    config_class="evaluate",
+)
+@click.option(
+    "--gpus",
+    type=click.IntRange(min=0),
+    help="Number of GPUs to utilize for evaluation (not applicable to llama-cpp)",
+)
+@click.option(
+    "--merge-system-user-message",
+    is_flag=True,
+    help="Indicates whether to merge system and user message for mt_bench (required for Mistral based judges)",
+)
+@click.option(
+    "--backend",
+    type=click.Choice(tuple(backends.SUPPORTED_BACKENDS)),
+    help="Serving backend to use for the models during evaluation. Options are vllm and llama-cpp.",
+)
+@click.option(
+    "--judge-backend",
+    type=click.Choice(tuple(backends.SUPPORTED_BACKENDS)),
+    help="Serving backend to use for the judge model during mt_bench evaluation. Options are vllm and llama-cpp.",
+)
+@click.option(
+    "--tls-insecure",
+    is_flag=True,
+    help="Disable TLS verification for model serving.",
+)
+@click.option(
+    "--tls-client-cert",
+    type=click.Path(),
+    default="",
+    show_default=True,
+    help="Path to the TLS client certificate to use for model serving.",
+)
+@click.option(
+    "--tls-client-key",
+    type=click.Path(),
+    default="",
+    show_default=True,
+    help="Path to the TLS client key to use for model serving.",
+)
+@click.option(
+    "--tls-client-passwd",
+    type=click.STRING,
+    default="",
+    help="TLS client certificate password for model serving.",
+)
+@click.option(
+    "--enable-serving-output",
+    is_flag=True,
+    help="Print serving engine logs.",
+)
+@click.pass_context
+@clickext.display_params
+def evaluate_matrix_cmd(
+    ctx,
+    models,
+    benchmarks,
+    judge_model,
+    judge_endpoint,
+    judge_workers,
+    output_dir,
+    max_workers,
+    few_shots,
+    batch_size,
+    input_questions,
+    output_file_formats,
+    temperature,
+    gpus,
+    merge_system_user_message,
+    backend,
+    judge_backend,
+    tls_insecure,
+    tls_client_cert,
+    tls_client_key,
+    tls_client_passwd,
+    enable_serving_output,
+) -> None:
+    """Evaluates several models against several benchmarks in one run"""
+    evaluate_config = ctx.obj.config.evaluate
+    if judge_model is None:
+        judge_model = evaluate_config.mt_bench.judge_model
+    try:
+        evaluate_matrix(
+            ctx.obj.config.serve,
+            models=list(models),
+            benchmarks=list(benchmarks),
+            output_dir=output_dir,
+            judge_model=judge_model,
+            judge_endpoint=judge_endpoint,
+            judge_backend=judge_backend,
+            dk_bench_judge_model=evaluate_config.dk_bench.judge_model,
+            dk_bench_output_dir=evaluate_config.dk_bench.output_dir,
+            mt_bench_output_dir=evaluate_config.mt_bench.output_dir,
+            max_workers=max_workers,
+            judge_workers=judge_workers,
+            few_shots=few_shots,
+            batch_size=batch_size,
+            input_questions=input_questions,
+            output_file_formats=output_file_formats,
+            temperature=temperature,
+            merge_system_user_message=merge_system_user_message,
+            gpus=gpus,
+            backend=backend,
+            tls_insecure=tls_insecure,
+            tls_client_cert=tls_client_cert,
+            tls_client_key=tls_client_key,
+            tls_client_passwd=tls_client_passwd,
+            enable_serving_output=enable_serving_output,
+        )
+    except Exception as e:
+        logger.error(f"An error occurred during evaluation: {str(e)}")
+        raise click.exceptions.Exit(1) from e
@@ -22,7 +22,7 @@ signal.signal(signal.SIGTERM, signal_handler)
 
 
 def warn_for_unsupported_backend_param(ctx):
-    for param in ["gpu_layers", "num_threads", "max_ctx_size"]:
+    for param in ["gpu_layers", "num_threads", "max_ctx_size", "parallel"]:
         if ctx.get_parameter_source(param) == click.core.ParameterSource.COMMANDLINE:
             logger.warning(
                 f"Option '--{param.replace('_','-')}' not supported by the backend."
@@ -57,6 +57,12 @@ def warn_for_unsupported_backend_param(ctx):
     cls=clickext.ConfigOption,
     config_sections="llama_cpp",
 )
+@click.option(
+    "--parallel",
+    type=click.IntRange(min=1),
+    cls=clickext.ConfigOption,
+    config_sections="llama_cpp",
+)
 @click.option(
     "--model-family",
     type=str,
@@ -107,6 +113,7 @@ def serve(
     gpu_layers: int,
     num_threads: int | None,
     max_ctx_size: int,
+    parallel: int,
     model_family,
     log_file: pathlib.Path | None,
     backend: str | None,
@@ -140,6 +147,7 @@ def serve(
         gpus,
         host,
         port,
+        parallel,
     )
 
 
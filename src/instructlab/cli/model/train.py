@@ -14,6 +14,7 @@ import click
 from instructlab import clickext
 from instructlab.configuration import DEFAULTS, map_train_to_library
 from instructlab.model.accelerated_train import SupportedTrainingStrategies
+from instructlab.train.telemetry import TelemetryOptions
 
 logger = logging.getLogger(__name__)
 
@@ -349,6 +350,11 @@ def clickpath_setup(is_dir: bool) -> click.Path:
     type=click.Path(dir_okay=True, file_okay=False, path_type=pathlib.Path),
     cls=clickext.ConfigOption,
 )
+@click.option(
+    "--phased-pipelined-eval",
+    is_flag=True,
+    help="Evaluate each phase 2 checkpoint as soon as it is saved, on the GPUs not used by training, instead of after training.",
+)
 @click.option(
     "--skip-user-confirm",
     "-y",
@@ -384,6 +390,68 @@ def clickpath_setup(is_dir: bool) -> click.Path:
     is_flag=True,
     help="Optimize Memory Usage on CPU and MacOS. This uses the torch_dtype='auto' instead of float32",
 )
+@click.option(
+    "--async-checkpointing",
+    is_flag=True,
+    help="With '--pipeline full', convert and quantize each epoch's checkpoint to GGUF in a background process while training continues.",
+)
+@click.option(
+    "--padding-free",
+    is_flag=True,
+    help="With '--pipeline full' or '--pipeline simple', pack each batch into one sequence with per-sample position ids and a block-diagonal attention mask instead of padding it. The simple pipeline on Linux also picks the number of samples per step from the memory available.",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    help="With '--pipeline full' or '--pipeline simple', continue from the latest step checkpoint in the checkpoint directory instead of starting over.",
+)
+@click.option(
+    "--step-checkpoint-interval",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+    help="With '--pipeline full' or '--pipeline simple', save a resumable checkpoint (weights, optimizer, RNG and data position) every that many optimizer steps. 0 disables step checkpoints.",
+)
+@click.option(
+    "--step-checkpoints-kept",
+    type=click.IntRange(min=1),
+    default=2,
+    show_default=True,
+    help="Number of the most recent step checkpoints to keep.",
+)
+@click.option(
+    "--test-batch-size",
+    type=click.IntRange(min=1),
+    default=8,
+    show_default=True,
+    help="With '--pipeline simple' on Linux, number of test samples the model answers at once when comparing it before and after training.",
+)
+@click.option(
+    "--max-test-samples",
+    type=click.IntRange(min=0),
+    default=None,
+    help="With '--pipeline simple' on Linux, compare the model before and after training on at most this many test samples. All test samples by default.",
+)
+@click.option(
+    "--cpu-performance",
+    is_flag=True,
+    help="With '--pipeline full' on CPU, pad batches to a few fixed lengths, compile the model with torch.compile and use bf16 autocast where the CPU supports it. The speedup over eager float32 is reported after the first epoch.",
+)
+@click.option(
+    "--autotune",
+    is_flag=True,
+    help="On CPU, pick the training step configuration with short timed trials before training: intra-op threads, micro-batch length and dataloader workers with '--pipeline full', intra-op threads with '--pipeline simple'. The result is saved and reused for the same host and model.",
+)
+@click.option(
+    "--telemetry",
+    is_flag=True,
+    help="Write the data wait, forward, backward and optimizer time, tokens/sec and memory of every training step to telemetry.jsonl in the checkpoint directory. The latest step is shown by `ilab process list`.",
+)
+@click.option(
+    "--telemetry-prometheus-file",
+    type=click.Path(dir_okay=False, path_type=pathlib.Path),
+    help="Also export the latest training step as a Prometheus textfile, for the node exporter's textfile collector. Implies '--telemetry'.",
+)
 @click.option(
     "--disable-accelerate-full-state-at-epoch",
     is_flag=True,
@@ -418,6 +486,7 @@ def train(
     phased_phase2_learning_rate: float | None,
     phased_phase2_effective_batch_size: int | None,
     phased_mt_bench_judge: pathlib.Path | None,
+    phased_pipelined_eval: bool,
     skip_user_confirm: bool,
     enable_serving_output: bool,
     pipeline: str,
@@ -425,6 +494,17 @@ def train(
     force_clear_phased_cache: bool,
     distributed_backend,
     optimize_memory,
+    async_checkpointing: bool,
+    padding_free: bool,
+    resume: bool,
+    step_checkpoint_interval: int,
+    step_checkpoints_kept: int,
+    test_batch_size: int,
+    max_test_samples: int | None,
+    cpu_performance: bool,
+    autotune: bool,
+    telemetry: bool,
+    telemetry_prometheus_file: pathlib.Path | None,
     disable_accelerate_full_state_at_epoch: bool,
     **kwargs,
 ):
@@ -444,6 +524,12 @@ def train(
         # By default, generate output-dir is used as train input-dir
         input_dir = ctx.obj.config.generate.output_dir
 
+    telemetry_options = None
+    if telemetry or telemetry_prometheus_file is not None:
+        telemetry_options = TelemetryOptions(
+            prometheus_textfile=telemetry_prometheus_file
+        )
+
     if four_bit_quant and device != "cuda":
         ctx.fail("'--4-bit-quant' option requires '--device=cuda'")
 
@@ -489,6 +575,8 @@ def train(
                 eval_serve=ctx.obj.config.serve,
                 eval_gpus=ctx.obj.config.evaluate.gpus,
                 training_journal=training_journal,
+                phased_pipelined_eval=phased_pipelined_eval,
+                telemetry=telemetry_options,
             )
         except Exception as exc:
             click.secho(f"Accelerated Training failed with {str(exc)}")
@@ -507,7 +595,17 @@ def train(
         # off of the structure of the training repo, just with different optimizers, model sizes, and special data gradient accumulation to get it
         # to fit on most consumer laptops
         full_train.train(
-            train_args=train_args, device=device, optimize_memory=optimize_memory
+            train_args=train_args,
+            device=device,
+            optimize_memory=optimize_memory,
+            async_checkpointing=async_checkpointing,
+            padding_free=padding_free,
+            telemetry=telemetry_options,
+            autotune=autotune,
+            cpu_performance=cpu_performance,
+            checkpoint_interval=step_checkpoint_interval,
+            keep_checkpoints=step_checkpoints_kept,
+            resume=resume,
         )
         click.echo("ᕦ(òᴗóˇ)ᕤ Full model training completed successfully! ᕦ(òᴗóˇ)ᕤ")
     elif pipeline == "simple":
@@ -529,6 +627,14 @@ def train(
                 num_epochs=num_epochs,
                 device=device,
                 four_bit_quant=four_bit_quant,
+                telemetry=telemetry_options,
+                autotune=autotune,
+                checkpoint_interval=step_checkpoint_interval,
+                keep_checkpoints=step_checkpoints_kept,
+                resume=resume,
+                test_batch_size=test_batch_size,
+                max_test_samples=max_test_samples,
+                packing=padding_free,
             )
             click.echo(
                 "ᕦ(òᴗóˇ)ᕤ Simple Model training completed successfully! ᕦ(òᴗóˇ)ᕤ"
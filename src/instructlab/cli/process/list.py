@@ -6,7 +6,7 @@ import click
 # First Party
 from instructlab import clickext
 from instructlab.defaults import ILAB_PROCESS_STATUS
-from instructlab.process.process import filter_processes
+from instructlab.process.process import filter_processes, filter_telemetry
 from instructlab.utils import print_table
 
 
@@ -29,6 +29,22 @@ def list_processes(state: str):
         print_table(
             ["Type", "PID", "UUID", "Log File", "Runtime", "Status"], process_list
         )
+        telemetry = filter_telemetry(state=state)
+        if telemetry:
+            print_table(
+                [
+                    "UUID",
+                    "Epoch/Step",
+                    "Tokens/s",
+                    "Data Wait",
+                    "Forward",
+                    "Backward",
+                    "Optimizer",
+                    "RSS",
+                    "VRAM",
+                ],
+                telemetry,
+            )
     else:
         click.secho(
             "No processes found in registry",
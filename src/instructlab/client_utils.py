@@ -2,7 +2,11 @@
 # pylint: disable=duplicate-code
 
 # Standard
-from typing import TypedDict
+from typing import Callable, Iterator, Optional, TypedDict
+import logging
+import pathlib
+import threading
+import time
 
 # Third Party
 from openai import OpenAI, OpenAIError
@@ -11,6 +15,13 @@ import httpx
 # Local
 from .configuration import DEFAULTS
 
+logger = logging.getLogger(__name__)
+
+# seconds before an endpoint taken out of rotation is probed again
+HEALTH_CHECK_INTERVAL = 30
+# responses of an overloaded or restarting replica, retried on another endpoint
+FAILOVER_STATUS_CODES = {502, 503, 504}
+
 
 class ClientException(Exception):
     """An exception raised when invoking client operations."""
@@ -68,3 +79,200 @@ def http_client(params: HttpClientParams):
         ),
         verify=not params.get("tls_insecure", True),
     )
+
+
+def read_endpoint_pool_file(path: str | pathlib.Path) -> list[str]:
+    """Endpoint URLs listed one per line, skipping blank lines and # comments"""
+    endpoints = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                endpoints.append(line)
+    return endpoints
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Response body that calls release once it is closed"""
+
+    def __init__(self, stream: httpx.SyncByteStream, release: Callable[[], None]):
+        self.stream = stream
+        self.release: Optional[Callable[[], None]] = release
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield from self.stream
+
+    def close(self) -> None:
+        try:
+            self.stream.close()
+        finally:
+            if self.release is not None:
+                self.release()
+                self.release = None
+
+
+class EndpointPoolTransport(httpx.BaseTransport):
+    """
+    Spreads the requests of a client over replicas of an OpenAI-compatible API
+
+    Requests are built against the first endpoint and sent to the healthy endpoint
+    with the fewest requests in flight. An endpoint that fails to connect, or answers
+    with a gateway error, is taken out of rotation and the request is retried on
+    another endpoint. Endpoints out of rotation are probed again every
+    health_check_interval seconds.
+    """
+
+    def __init__(
+        self,
+        endpoints: list[str],
+        transport: httpx.BaseTransport,
+        health_check_interval: float = HEALTH_CHECK_INTERVAL,
+    ) -> None:
+        if not endpoints:
+            raise ValueError("At least one endpoint is required")
+        # the OpenAI client joins routes to a base URL ending with a slash
+        self.endpoints = [endpoint.rstrip("/") + "/" for endpoint in endpoints]
+        self.transport = transport
+        self.health_check_interval = health_check_interval
+        self.outstanding = dict.fromkeys(self.endpoints, 0)
+        self._down_since: dict[str, float] = {}
+        self._offset = -1
+        self._lock = threading.Lock()
+
+    @property
+    def healthy_endpoints(self) -> list[str]:
+        with self._lock:
+            return [e for e in self.endpoints if e not in self._down_since]
+
+    def check_health(self, endpoint: str) -> bool:
+        """Probes the models route of an endpoint and updates its rotation"""
+        try:
+            response = self.transport.handle_request(
+                httpx.Request(
+                    "GET",
+                    f"{endpoint}models",
+                    extensions={
+                        "timeout": httpx.Timeout(DEFAULTS.CONNECTION_TIMEOUT).as_dict()
+                    },
+                )
+            )
+            response.read()
+            response.close()
+            healthy = response.status_code < 500
+        except httpx.TransportError:
+            healthy = False
+        with self._lock:
+            if healthy:
+                if self._down_since.pop(endpoint, None) is not None:
+                    logger.info(f"Endpoint {endpoint} is back in rotation")
+            else:
+                self._down_since[endpoint] = time.monotonic()
+        return healthy
+
+    def _take_down(self, endpoint: str, reason: str) -> None:
+        logger.warning(f"Taking endpoint {endpoint} out of rotation: {reason}")
+        with self._lock:
+            self._down_since[endpoint] = time.monotonic()
+
+    def _acquire(self, tried: set[str]) -> Optional[str]:
+        now = time.monotonic()
+        with self._lock:
+            stale = [
+                endpoint
+                for endpoint, since in self._down_since.items()
+                if now - since >= self.health_check_interval
+            ]
+            # a single request probes each endpoint per interval
+            for endpoint in stale:
+                self._down_since[endpoint] = now
+        for endpoint in stale:
+            self.check_health(endpoint)
+
+        with self._lock:
+            # ties go round-robin
+            self._offset = (self._offset + 1) % len(self.endpoints)
+            rotated = self.endpoints[self._offset :] + self.endpoints[: self._offset]
+            candidates = [
+                e for e in rotated if e not in tried and e not in self._down_since
+            ]
+            if not candidates:
+                return None
+            endpoint = min(candidates, key=self.outstanding.__getitem__)
+            self.outstanding[endpoint] += 1
+        return endpoint
+
+    def _release(self, endpoint: str) -> None:
+        with self._lock:
+            self.outstanding[endpoint] -= 1
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        url = str(request.url)
+        base = self.endpoints[0]
+        if not url.startswith(base):
+            return self.transport.handle_request(request)
+
+        route = url[len(base) :]
+        tried: set[str] = set()
+        last_exc: Optional[httpx.TransportError] = None
+        while (endpoint := self._acquire(tried)) is not None:
+            tried.add(endpoint)
+            request.url = httpx.URL(endpoint + route)
+            request.headers["Host"] = request.url.netloc.decode("ascii")
+            try:
+                response = self.transport.handle_request(request)
+            except httpx.TransportError as exc:
+                self._release(endpoint)
+                self._take_down(endpoint, str(exc))
+                last_exc = exc
+                continue
+            if response.status_code in FAILOVER_STATUS_CODES and len(tried) < len(
+                self.endpoints
+            ):
+                response.close()
+                self._release(endpoint)
+                self._take_down(endpoint, f"status {response.status_code}")
+                continue
+            if response.is_closed:
+                # the body was read already
+                self._release(endpoint)
+                return response
+            assert isinstance(response.stream, httpx.SyncByteStream)
+            response.stream = _ReleasingStream(
+                response.stream, lambda endpoint=endpoint: self._release(endpoint)
+            )
+            return response
+
+        if last_exc is not None:
+            raise last_exc
+        raise httpx.ConnectError(
+            f"No healthy endpoint out of {', '.join(self.endpoints)}", request=request
+        )
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+def endpoint_pool_http_client(
+    endpoints: list[str], params: HttpClientParams
+) -> httpx.Client:
+    """HTTP client spreading the requests made against endpoints[0] over all endpoints"""
+    transport = EndpointPoolTransport(
+        endpoints,
+        httpx.HTTPTransport(
+            cert=get_ssl_cert_config(
+                params.get("tls_client_cert", None),
+                params.get("tls_client_key", None),
+                params.get("tls_client_passwd", None),
+            ),
+            verify=not params.get("tls_insecure", True),
+        ),
+    )
+    healthy = [e for e in transport.endpoints if transport.check_health(e)]
+    if not healthy:
+        raise ClientException(
+            f"None of the endpoints {', '.join(transport.endpoints)} is reachable"
+        )
+    logger.info(
+        f"Spreading requests over {len(healthy)} of {len(transport.endpoints)} endpoints"
+    )
+    return httpx.Client(transport=transport)
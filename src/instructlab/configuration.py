@@ -226,6 +226,10 @@ class _serve_llama_cpp(BaseModel):
         description="Large Language Model Family",
         examples=["granite", "mixtral"],
     )
+    parallel: PositiveInt = Field(
+        default=1,
+        description="Number of requests served concurrently. Each one runs on its own copy of the model context with an equal share of the CPU threads.",
+    )
 
 
 class _serve_server(BaseModel):
@@ -0,0 +1,149 @@
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Columnar (Parquet and Arrow) copies of JSONL datasets.
+
+A dataset converted with `ilab data convert` is written next to its JSONL file
+with the same name and a `.parquet` or `.arrow` suffix. Loaders ask for the
+JSONL path and get the columnar copy instead when it is at least as recent.
+Arrow files are Arrow IPC streams and are read through a memory map without
+copying or parsing, so several processes share the same pages. Parquet files
+are decoded column by column and cached as Arrow by `datasets`.
+"""
+
+# Standard
+from pathlib import Path
+from typing import Iterator, Optional
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+JSONL_SUFFIX = ".jsonl"
+PARQUET_SUFFIX = ".parquet"
+ARROW_SUFFIX = ".arrow"
+# preferred first when several copies of a dataset exist
+COLUMNAR_SUFFIXES = (ARROW_SUFFIX, PARQUET_SUFFIX)
+DATASET_SUFFIXES = (JSONL_SUFFIX, *COLUMNAR_SUFFIXES)
+FORMATS = {"parquet": PARQUET_SUFFIX, "arrow": ARROW_SUFFIX}
+
+
+def resolve_dataset_file(path: str | os.PathLike) -> Path:
+    """
+    The file to read the dataset at path from
+
+    A columnar copy of a JSONL dataset is used when it is not older than the JSONL file,
+    or when the JSONL file does not exist.
+    """
+    path = Path(path)
+    if path.suffix != JSONL_SUFFIX:
+        return path
+    for suffix in COLUMNAR_SUFFIXES:
+        candidate = path.with_suffix(suffix)
+        if candidate.is_file() and (
+            not path.exists() or candidate.stat().st_mtime >= path.stat().st_mtime
+        ):
+            logger.debug(f"Reading {path} from {candidate}")
+            return candidate
+    return path
+
+
+def load_dataset_file(path: str | os.PathLike):
+    """
+    Loads a JSONL, Parquet or Arrow file as a datasets.Dataset
+
+    JSONL paths are resolved with resolve_dataset_file first.
+    """
+    # Third Party
+    from datasets import Dataset, load_dataset
+
+    path = resolve_dataset_file(path)
+    if path.suffix == ARROW_SUFFIX:
+        return Dataset.from_file(os.fspath(path), in_memory=False)
+    if path.suffix == PARQUET_SUFFIX:
+        return load_dataset("parquet", data_files=os.fspath(path), split="train")
+    return load_dataset("json", data_files=os.fspath(path), split="train")
+
+
+def iter_dataset_file(path: str | os.PathLike) -> Iterator[dict]:
+    """Rows of a JSONL, Parquet or Arrow file, read in batches"""
+    # Third Party
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = resolve_dataset_file(path)
+    if path.suffix == PARQUET_SUFFIX:
+        for batch in pq.ParquetFile(path).iter_batches():
+            yield from batch.to_pylist()
+    elif path.suffix == ARROW_SUFFIX:
+        with pa.memory_map(os.fspath(path)) as source:
+            for batch in pa.ipc.open_stream(source):
+                yield from batch.to_pylist()
+    else:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def count_rows(path: str | os.PathLike) -> int:
+    """Rows of a Parquet or Arrow file, from its metadata or batch headers"""
+    # Third Party
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = Path(path)
+    if path.suffix == PARQUET_SUFFIX:
+        return pq.ParquetFile(path).metadata.num_rows
+    with pa.memory_map(os.fspath(path)) as source:
+        return sum(batch.num_rows for batch in pa.ipc.open_stream(source))
+
+
+def column_names(path: str | os.PathLike) -> list[str]:
+    """Top-level columns of a Parquet or Arrow file"""
+    # Third Party
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = Path(path)
+    if path.suffix == PARQUET_SUFFIX:
+        return pq.read_schema(path).names
+    with pa.memory_map(os.fspath(path)) as source:
+        return pa.ipc.open_stream(source).schema.names
+
+
+def convert_dataset(
+    path: str | os.PathLike, fmt: str, output: Optional[str | os.PathLike] = None
+) -> Path:
+    """
+    Writes a JSONL dataset as Parquet or Arrow
+
+    The output defaults to the JSONL path with the suffix of the format, where the
+    loaders find it. Returns the path written.
+    """
+    # Third Party
+    from datasets import load_dataset
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = Path(path)
+    if fmt not in FORMATS:
+        raise ValueError(
+            f"Unknown dataset format '{fmt}', expected one of {', '.join(FORMATS)}"
+        )
+    output = Path(output) if output is not None else path.with_suffix(FORMATS[fmt])
+
+    table = load_dataset("json", data_files=os.fspath(path), split="train").data.table
+    tmp_output = output.with_name(f".{output.name}.tmp")
+    if fmt == "parquet":
+        pq.write_table(table, tmp_output)
+    else:
+        with (
+            pa.OSFile(os.fspath(tmp_output), "wb") as sink,
+            pa.ipc.new_stream(sink, table.schema) as writer,
+        ):
+            writer.write_table(table)
+    os.replace(tmp_output, output)
+    logger.info(f"Wrote {table.num_rows} samples of {path} to {output}")
+    return output
@@ -0,0 +1,289 @@
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Near-duplicate filtering of generated samples with MinHash LSH.
+
+Every sample is reduced to the set of word n-grams of its user and assistant
+text and to a MinHash signature of that set. Signatures are cut into bands;
+samples sharing a band are candidate duplicates and are clustered when their
+estimated Jaccard similarity reaches the threshold. The first sample of each
+cluster is kept.
+"""
+
+# Standard
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterable, Optional
+import json
+import logging
+import os
+import re
+import zlib
+
+# Third Party
+import numpy as np
+
+# First Party
+from instructlab.data.columnar import (
+    ARROW_SUFFIX,
+    JSONL_SUFFIX,
+    PARQUET_SUFFIX,
+    iter_dataset_file,
+    load_dataset_file,
+)
+
+logger = logging.getLogger(__name__)
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+# samples hashed per task of the worker processes
+SIGNATURE_CHUNK_SIZE = 2048
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def dedup_text(sample: dict[str, Any]) -> str:
+    """User and assistant text of a messages or legacy sample"""
+    if isinstance(sample.get("messages"), list):
+        return "\n".join(
+            str(m.get("content", ""))
+            for m in sample["messages"]
+            if m.get("role") in ("user", "assistant")
+        )
+    return f"{sample.get('user', '')}\n{sample.get('assistant', '')}"
+
+
+def shingles(text: str, ngram: int) -> set[bytes]:
+    """Word n-grams of a text, the whole text when it is shorter than n words"""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= ngram:
+        return {" ".join(words).encode("utf-8")}
+    return {
+        " ".join(words[i : i + ngram]).encode("utf-8")
+        for i in range(len(words) - ngram + 1)
+    }
+
+
+def permutations(num_perm: int, seed: int = 1) -> tuple[np.ndarray, np.ndarray]:
+    """Coefficients of the num_perm hash functions (a * x + b) mod p"""
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, int(MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+    b = rng.randint(0, int(MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def minhash_signatures(
+    texts: list[str], ngram: int, num_perm: int, seed: int = 1
+) -> np.ndarray:
+    """MinHash signatures of texts, shape (len(texts), num_perm)"""
+    a, b = permutations(num_perm, seed)
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint32)
+    for i, text in enumerate(texts):
+        hashes = np.fromiter(
+            (zlib.crc32(s) for s in shingles(text, ngram)), dtype=np.uint64
+        )
+        # products wrap around 2**64, as in the usual 32-bit MinHash implementations
+        permuted = ((hashes[:, None] * a + b) % MERSENNE_PRIME) & MAX_HASH
+        signatures[i] = permuted.min(axis=0)
+    return signatures
+
+
+def lsh_params(threshold: float, num_perm: int) -> tuple[int, int]:
+    """
+    Number of bands and rows per band for a Jaccard threshold
+
+    Two samples share a band with probability 1 - (1 - s**rows)**bands at similarity s.
+    The steepest point of that curve, (1 / bands) ** (1 / rows), is placed as close to
+    the threshold as possible.
+    """
+    best = (num_perm, 1)
+    best_error = float("inf")
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        error = abs((1 / bands) ** (1 / rows) - threshold)
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class _UnionFind:
+    def __init__(self, size: int) -> None:
+        self.parent = list(range(size))
+
+    def find(self, x: int) -> int:
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, x: int, y: int) -> None:
+        x, y = self.find(x), self.find(y)
+        # the earliest sample is the root and is kept
+        if x < y:
+            self.parent[y] = x
+        elif y < x:
+            self.parent[x] = y
+
+
+def cluster_duplicates(signatures: np.ndarray, threshold: float) -> list[int]:
+    """Cluster root of every sample; samples are their own root when unique"""
+    num_samples, num_perm = signatures.shape
+    bands, rows = lsh_params(threshold, num_perm)
+    clusters = _UnionFind(num_samples)
+    for band in range(bands):
+        buckets: dict[bytes, int] = {}
+        band_values = signatures[:, band * rows : (band + 1) * rows]
+        for i in range(num_samples):
+            key = band_values[i].tobytes()
+            first = buckets.setdefault(key, i)
+            if first == i:
+                continue
+            # candidates are checked against the estimated Jaccard similarity
+            root = clusters.find(first)
+            if clusters.find(i) == root:
+                continue
+            similarity = np.mean(signatures[i] == signatures[first])
+            if similarity >= threshold:
+                clusters.union(first, i)
+    return [clusters.find(i) for i in range(num_samples)]
+
+
+@dataclass
+class DedupReport:
+    """
+    Outcome of a deduplication
+
+    Attributes:
+        samples         samples read
+        kept            samples written, one per cluster
+        clusters        clusters of two samples or more
+        largest         size of the largest cluster
+        cluster_sizes   number of clusters of each size above one
+    """
+
+    samples: int
+    kept: int
+    clusters: int
+    largest: int
+    cluster_sizes: dict[int, int] = field(default_factory=dict)
+
+    @property
+    def removed(self) -> int:
+        return self.samples - self.kept
+
+
+def _signatures_of_chunk(args: tuple[list[str], int, int, int]) -> np.ndarray:
+    return minhash_signatures(*args)
+
+
+def compute_signatures(
+    texts: list[str],
+    ngram: int,
+    num_perm: int,
+    num_workers: Optional[int] = None,
+    seed: int = 1,
+) -> np.ndarray:
+    """MinHash signatures of texts, hashed in chunks by worker processes"""
+    if not texts:
+        return np.empty((0, num_perm), dtype=np.uint32)
+    chunks = [
+        (texts[i : i + SIGNATURE_CHUNK_SIZE], ngram, num_perm, seed)
+        for i in range(0, len(texts), SIGNATURE_CHUNK_SIZE)
+    ]
+    if num_workers == 1 or len(chunks) == 1:
+        return np.concatenate([_signatures_of_chunk(chunk) for chunk in chunks])
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        return np.concatenate(list(executor.map(_signatures_of_chunk, chunks)))
+
+
+def _write_samples(
+    path: Path, output: Path, keep: list[int], raw_lines: Optional[list[str]]
+) -> None:
+    # Third Party
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    tmp_output = output.with_name(f".{output.name}.tmp")
+    if raw_lines is not None:
+        with open(tmp_output, "w", encoding="utf-8") as f:
+            f.writelines(raw_lines[i] for i in keep)
+    else:
+        table = load_dataset_file(path).select(keep).flatten_indices().data.table
+        if output.suffix == PARQUET_SUFFIX:
+            pq.write_table(table, tmp_output)
+        else:
+            with (
+                pa.OSFile(os.fspath(tmp_output), "wb") as sink,
+                pa.ipc.new_stream(sink, table.schema) as writer,
+            ):
+                writer.write_table(table)
+    os.replace(tmp_output, output)
+
+
+def _read_samples(path: Path) -> tuple[list[str], Optional[list[str]]]:
+    """Texts to deduplicate, and the lines of JSONL files to write them back as they were"""
+    if path.suffix in (PARQUET_SUFFIX, ARROW_SUFFIX):
+        return [dedup_text(sample) for sample in iter_dataset_file(path)], None
+    texts = []
+    lines = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            texts.append(dedup_text(json.loads(line)))
+            lines.append(line if line.endswith("\n") else f"{line}\n")
+    return texts, lines
+
+
+def cluster_report(roots: Iterable[int]) -> DedupReport:
+    roots = list(roots)
+    sizes = Counter(roots)
+    duplicate_sizes = Counter(size for size in sizes.values() if size > 1)
+    return DedupReport(
+        samples=len(roots),
+        kept=len(sizes),
+        clusters=sum(duplicate_sizes.values()),
+        largest=max(sizes.values(), default=0),
+        cluster_sizes=dict(sorted(duplicate_sizes.items())),
+    )
+
+
+def dedup_dataset(
+    path: str | os.PathLike,
+    output: Optional[str | os.PathLike] = None,
+    threshold: float = 0.8,
+    num_perm: int = 128,
+    ngram: int = 5,
+    num_workers: Optional[int] = None,
+) -> tuple[Path, DedupReport]:
+    """
+    Writes the samples of a dataset without their near-duplicates
+
+    The output has the format of the input and defaults to `<name>_dedup<suffix>` next
+    to it, keeping the `train_`/`test_` prefix that `ilab model train` looks for.
+    Returns the output path and the cluster statistics.
+    """
+    path = Path(path)
+    if path.suffix not in (JSONL_SUFFIX, PARQUET_SUFFIX, ARROW_SUFFIX):
+        raise ValueError(f"{path} is not a JSONL, Parquet or Arrow dataset")
+    output = (
+        Path(output)
+        if output is not None
+        else path.with_name(f"{path.stem}_dedup{path.suffix}")
+    )
+    if output.suffix != path.suffix:
+        raise ValueError(f"{output} must have the format of {path}")
+
+    texts, raw_lines = _read_samples(path)
+    signatures = compute_signatures(texts, ngram, num_perm, num_workers)
+    roots = cluster_duplicates(signatures, threshold)
+    keep = [i for i, root in enumerate(roots) if root == i]
+    _write_samples(path, output, keep, raw_lines)
+
+    report = cluster_report(roots)
+    logger.info(
+        f"Removed {report.removed} near-duplicates out of {report.samples} samples of {path}"
+    )
+    return output, report
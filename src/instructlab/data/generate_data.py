@@ -17,7 +17,7 @@ def gen_data(
     taxonomy_base,
     output_dir,
     quiet,
-    endpoint_url,
+    endpoint_urls,
     api_key,
     yaml_rules,
     chunk_word_count,
@@ -62,7 +62,7 @@ def gen_data(
         taxonomy_base=taxonomy_base,
         output_dir=output_dir,
         console_output=not quiet,
-        endpoint_url=endpoint_url,
+        endpoint_urls=endpoint_urls,
         api_key=api_key,
         yaml_rules=yaml_rules,
         chunk_word_count=chunk_word_count,
@@ -104,7 +104,7 @@ def create_server_and_generate(
     taxonomy_base,
     output_dir,
     console_output,
-    endpoint_url,
+    endpoint_urls,
     api_key,
     yaml_rules,
     chunk_word_count,
@@ -144,7 +144,7 @@ def create_server_and_generate(
     import openai
 
     # First Party
-    from instructlab.client_utils import http_client
+    from instructlab.client_utils import endpoint_pool_http_client, http_client
 
     http_client_params = HttpClientParams(
         {
@@ -155,8 +155,9 @@ def create_server_and_generate(
         }
     )
 
-    if endpoint_url:
-        api_base = endpoint_url
+    if endpoint_urls:
+        # requests are built against the first endpoint and spread over all of them
+        api_base = endpoint_urls[0]
     else:
         # First Party
         from instructlab.model.backends import backends
@@ -182,17 +183,30 @@ def create_server_and_generate(
         except Exception as exc:
             raise ValueError(f"Failed to start server: {exc}") from exc
 
-        # disable batching when running with the local llama.cpp server
+        # the local llama.cpp server answers one prompt per request, keep one
+        # request in flight per copy of the model it serves
         if isinstance(backend_instance, llama_cpp_server):
-            if batch_size is not None:
-                logger.warning(
-                    "Disabling SDG batching - unsupported with llama.cpp serving"
+            if backend_instance.parallel > 1 and batch_size != 0:
+                logger.info(
+                    f"Sending {backend_instance.parallel} concurrent requests to the llama.cpp server"
                 )
-            batch_size = 0
+                num_cpus = backend_instance.parallel
+            else:
+                if batch_size is not None:
+                    logger.warning(
+                        "Disabling SDG batching - set 'parallel' in the llama_cpp section of the teacher config to batch with llama.cpp serving"
+                    )
+                batch_size = 0
 
-    client = openai.OpenAI(
-        base_url=api_base, api_key=api_key, http_client=http_client(http_client_params)
-    )
+    if endpoint_urls and len(endpoint_urls) > 1:
+        logger.info(
+            f"Sending up to {num_cpus} concurrent requests to each of {len(endpoint_urls)} endpoints"
+        )
+        num_cpus *= len(endpoint_urls)
+        client_http = endpoint_pool_http_client(endpoint_urls, http_client_params)
+    else:
+        client_http = http_client(http_client_params)
+    client = openai.OpenAI(base_url=api_base, api_key=api_key, http_client=client_http)
     # Third Party
     from instructlab.sdg.generate_data import generate_data
 
@@ -200,32 +214,35 @@ def create_server_and_generate(
     from instructlab.sdg.utils import GenerateException
 
     # First Party
+    from instructlab.document_cache import taxonomy_document_clones
     from instructlab.process.process import complete_process
 
     try:
         logger.info(
             f"Generating synthetic data using '{pipeline}' pipeline, '{model_name}' model, '{taxonomy}' taxonomy, against {api_base} server"
         )
-        generate_data(
-            client=client,
-            model_family=model_family,
-            model_name=model_name,
-            num_cpus=num_cpus,
-            num_instructions_to_generate=num_instructions_to_generate,
-            taxonomy=taxonomy,
-            taxonomy_base=taxonomy_base,
-            output_dir=output_dir,
-            console_output=console_output,
-            yaml_rules=yaml_rules,
-            chunk_word_count=chunk_word_count,
-            server_ctx_size=server_ctx_size,
-            pipeline=pipeline,
-            batch_size=batch_size,
-            checkpoint_dir=checkpoint_dir,
-            max_num_tokens=max_num_tokens,
-            system_prompt=system_prompt,
-            use_legacy_pretraining_format=use_legacy_pretraining_format,
-        )
+        # knowledge documents are cloned from the shared document cache
+        with taxonomy_document_clones(taxonomy, taxonomy_base):
+            generate_data(
+                client=client,
+                model_family=model_family,
+                model_name=model_name,
+                num_cpus=num_cpus,
+                num_instructions_to_generate=num_instructions_to_generate,
+                taxonomy=taxonomy,
+                taxonomy_base=taxonomy_base,
+                output_dir=output_dir,
+                console_output=console_output,
+                yaml_rules=yaml_rules,
+                chunk_word_count=chunk_word_count,
+                server_ctx_size=server_ctx_size,
+                pipeline=pipeline,
+                batch_size=batch_size,
+                checkpoint_dir=checkpoint_dir,
+                max_num_tokens=max_num_tokens,
+                system_prompt=system_prompt,
+                use_legacy_pretraining_format=use_legacy_pretraining_format,
+            )
     except GenerateException as exc:
         # mark process as errored on registry and set end_time
         complete_process(
@@ -1,35 +1,223 @@
 # SPDX-License-Identifier: Apache-2.0
 
 # Standard
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import Any, Iterator, List, Optional
+import json
 import logging
+import mmap
+import os
 import time
 
 # First Party
+from instructlab.configuration import DEFAULTS
+from instructlab.data.columnar import (
+    DATASET_SUFFIXES,
+    JSONL_SUFFIX,
+    column_names,
+    count_rows,
+    iter_dataset_file,
+)
 from instructlab.utils import convert_bytes_to_proper_mag
 
 logger = logging.getLogger(__name__)
 
+# bytes scanned at a time when counting samples
+COUNT_CHUNK_SIZE = 1 << 24
+# samples tokenized per call of the tokenizer
+TOKENIZE_BATCH_SIZE = 1024
 
-def list_data(dataset_dirs: list[str]) -> List[List[str]]:
+SCHEMA_MESSAGES = "messages"
+SCHEMA_LEGACY = "legacy"
+SCHEMA_UNKNOWN = "unknown"
+
+
+def count_samples(path: Path) -> int:
+    """
+    Number of samples of a dataset file
+
+    Lines of a JSONL file are counted over a memory map of the file, the rows of
+    columnar files are read from their metadata.
+    """
+    if path.suffix != JSONL_SUFFIX:
+        return count_rows(path)
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            count = sum(
+                mm[offset : offset + COUNT_CHUNK_SIZE].count(b"\n")
+                for offset in range(0, size, COUNT_CHUNK_SIZE)
+            )
+            # the last line may have no newline
+            if mm[size - 1 : size] != b"\n":
+                count += 1
+    return count
+
+
+def sample_schema(sample: Any) -> str:
+    """Whether a sample is in the messages or the legacy (system/user/assistant) format"""
+    if not isinstance(sample, dict):
+        return SCHEMA_UNKNOWN
+    if isinstance(sample.get("messages"), list):
+        return SCHEMA_MESSAGES
+    if {"system", "user", "assistant"} <= sample.keys():
+        return SCHEMA_LEGACY
+    return SCHEMA_UNKNOWN
+
+
+def detect_schema(path: Path) -> str:
+    """Schema of a dataset file, from its first sample or its columns"""
+    if path.suffix != JSONL_SUFFIX:
+        columns = column_names(path)
+        if "messages" in columns:
+            return SCHEMA_MESSAGES
+        if {"system", "user", "assistant"} <= set(columns):
+            return SCHEMA_LEGACY
+        return SCHEMA_UNKNOWN
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                return sample_schema(json.loads(line))
+            except json.JSONDecodeError:
+                return SCHEMA_UNKNOWN
+    return SCHEMA_UNKNOWN
+
+
+def sample_text(sample: dict[str, Any], schema: str) -> str:
+    if schema == SCHEMA_MESSAGES:
+        return "\n".join(str(m.get("content", "")) for m in sample["messages"])
+    return "\n".join(str(sample[key]) for key in ("system", "user", "assistant"))
+
+
+def read_samples(path: Path) -> Iterator[Any]:
+    """Samples of a dataset file, skipping the JSONL lines that do not parse"""
+    if path.suffix != JSONL_SUFFIX:
+        yield from iter_dataset_file(path)
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def count_tokens(path: Path, schema: str, tokenizer) -> Optional[int]:
+    """Tokens of the text of every sample, None when the schema is not known"""
+    if schema == SCHEMA_UNKNOWN:
+        return None
+    total = 0
+    batch: list[str] = []
+    for sample in read_samples(path):
+        if sample_schema(sample) != schema:
+            continue
+        batch.append(sample_text(sample, schema))
+        if len(batch) == TOKENIZE_BATCH_SIZE:
+            total += sum(len(ids) for ids in tokenizer(batch)["input_ids"])
+            batch = []
+    if batch:
+        total += sum(len(ids) for ids in tokenizer(batch)["input_ids"])
+    return total
+
+
+class DatasetInventoryCache:
     """
-    Recursively lists all JSONL files in the given directories and gathers their metadata.
+    Sample counts, schemas and token counts of dataset files
+
+    An entry is reused while the size and modification time of its file are unchanged.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = Path(path if path is not None else DEFAULTS.DATASET_INVENTORY_CACHE)
+        self.entries: dict[str, dict[str, Any]] = {}
+        self.seen: set[str] = set()
+        self.changed = False
+        try:
+            self.entries = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            pass
+        except (OSError, json.JSONDecodeError) as exc:
+            logger.warning(
+                f"Ignoring unreadable dataset inventory cache {self.path}: {exc}"
+            )
+
+    def get(self, path: Path, stat: os.stat_result) -> dict[str, Any]:
+        key = str(path.resolve())
+        self.seen.add(key)
+        entry = self.entries.get(key)
+        if (
+            entry is None
+            or entry["size"] != stat.st_size
+            or entry["mtime_ns"] != stat.st_mtime_ns
+        ):
+            entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "tokens": {}}
+            self.entries[key] = entry
+            self.changed = True
+        return entry
+
+    def prune(self, directory: Path) -> None:
+        """Drops the entries of files under directory that were not looked up"""
+        prefix = f"{directory.resolve()}{os.sep}"
+        for key in list(self.entries):
+            if key.startswith(prefix) and key not in self.seen:
+                del self.entries[key]
+                self.changed = True
+
+    def save(self) -> None:
+        if not self.changed:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.path.with_suffix(".tmp")
+            tmp_file.write_text(json.dumps(self.entries), encoding="utf-8")
+            os.replace(tmp_file, self.path)
+            self.changed = False
+        except OSError as exc:
+            logger.warning(f"Failed to save dataset inventory cache {self.path}: {exc}")
+
+
+def list_data(
+    dataset_dirs: list[str],
+    tokenizer_path: Optional[str] = None,
+    num_workers: Optional[int] = None,
+    cache_path: Optional[str] = None,
+) -> List[List[str]]:
+    """
+    Recursively lists all JSONL, Parquet and Arrow files in the given directories and gathers their metadata.
 
     Args:
         dataset_dirs (list[Path]): A list of paths to directories where JSONL files are searched for.
+        tokenizer_path (str): Tokenizer to count the tokens of the samples with. Tokens are not
+            counted when not set.
+        num_workers (int): Number of files tokenized in parallel.
+        cache_path (str): File caching the counts of every dataset file.
 
     Returns:
-        List[List[Path]]: A list of lists, where each inner list contains three strings:
-            - The relative file path of the `.jsonl` file.
+        List[List[Path]]: A list of lists, where each inner list contains these strings:
+            - The relative file path of the `.jsonl`, `.parquet` or `.arrow` file.
             - The creation timestamp of the file (format: 'YYYY-MM-DD HH:MM:SS').
             - The formatted size of the file with appropriate units (e.g., '12.34 MB').
+            - The run ID, the top-level subdirectory of the file.
+            - The number of samples of the file.
+            - The schema of the samples: 'messages', 'legacy' or 'unknown'.
+            - The number of tokens of the samples, when tokenizer_path is set ('-' for unknown schemas).
 
     Raises:
         OSError: If any directory in `dataset_dirs` does not exist.
     """
 
+    cache = DatasetInventoryCache(cache_path)
     data: List[List[str]] = []
+    # files to tokenize and the cache entries to store their counts in
+    to_tokenize: list[tuple[Path, dict[str, Any]]] = []
+    entries: list[dict[str, Any]] = []
     for directory in dataset_dirs:
         dirpath = Path(directory)
         directories: List[Path] = [dirpath]
@@ -42,7 +230,7 @@ def list_data(dataset_dirs: list[str]) -> List[List[str]]:
                 if entry.is_dir():
                     directories.append(entry)
                     continue
-                if entry.suffix != ".jsonl":
+                if entry.suffix not in DATASET_SUFFIXES:
                     continue
 
                 stat = entry.stat()
@@ -60,13 +248,50 @@ def list_data(dataset_dirs: list[str]) -> List[List[str]]:
                 # parse top-level subdirectory to determine run name
                 run_id = Path(relative_name).parts[0]
 
+                counts = cache.get(entry, stat)
+                if "samples" not in counts:
+                    counts["samples"] = count_samples(entry)
+                    counts["schema"] = detect_schema(entry)
+                if (
+                    tokenizer_path is not None
+                    and tokenizer_path not in counts["tokens"]
+                ):
+                    to_tokenize.append((entry, counts))
+
+                entries.append(counts)
                 data.append(
                     [
                         relative_name,
                         created_at,
                         formatted_size,
                         run_id,
+                        str(counts["samples"]),
+                        counts["schema"],
                     ]
                 )
+        cache.prune(dirpath)
+
+    if tokenizer_path is not None:
+        if to_tokenize:
+            # Third Party
+            from transformers import AutoTokenizer
+
+            tokenizer = AutoTokenizer.from_pretrained(tokenizer_path, use_fast=True)
+
+            def tokenize(item: tuple[Path, dict[str, Any]]) -> None:
+                path, counts = item
+                counts["tokens"][tokenizer_path] = count_tokens(
+                    path, counts["schema"], tokenizer
+                )
+
+            # fast tokenizers release the GIL while encoding
+            with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                list(executor.map(tokenize, to_tokenize))
+            cache.changed = True
+
+        for row, counts in zip(data, entries, strict=True):
+            tokens = counts["tokens"][tokenizer_path]
+            row.append("-" if tokens is None else str(tokens))
 
+    cache.save()
     return data
@@ -0,0 +1,280 @@
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Token length statistics of datasets and projected packing of training batches.
+
+The samples are rendered with the chat template of the model's tokenizer and
+tokenized in batches by worker processes. The packing plan mirrors how the
+training library's multipack sampler derives the gradient accumulation and
+the packed batch length from `max_batch_len` and `effective_batch_size`.
+"""
+
+# Standard
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Iterable, Iterator, Optional
+import heapq
+import logging
+import math
+import os
+
+# Third Party
+import numpy as np
+
+# First Party
+from instructlab.data.columnar import iter_dataset_file
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 90, 95, 99)
+# samples tokenized per task of the worker processes
+TOKENIZE_CHUNK_SIZE = 1024
+# seed of the multipack sampler of the training library
+PACKING_SEED = 47
+
+# tokenizer of the worker process
+_tokenizer = None
+
+
+def sample_messages(sample: dict[str, Any]) -> Optional[list[dict[str, str]]]:
+    """Messages of a messages or legacy sample, None for other samples"""
+    if isinstance(sample.get("messages"), list):
+        return [
+            {"role": str(m.get("role", "")), "content": str(m.get("content", ""))}
+            for m in sample["messages"]
+        ]
+    if {"system", "user", "assistant"} <= sample.keys():
+        return [
+            {"role": role, "content": str(sample[role])}
+            for role in ("system", "user", "assistant")
+        ]
+    return None
+
+
+def render_sample(messages: list[dict[str, str]], tokenizer) -> str:
+    """Text of a sample as the model is trained on it"""
+    if getattr(tokenizer, "chat_template", None):
+        try:
+            return tokenizer.apply_chat_template(messages, tokenize=False)
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            # templates may reject some roles or their order
+            logger.debug(f"Chat template failed, tokenizing the plain text: {exc}")
+    return "\n".join(m["content"] for m in messages)
+
+
+def sample_lengths(samples: list[dict[str, Any]], tokenizer) -> np.ndarray:
+    """Token lengths of samples; samples in an unknown format are skipped"""
+    texts = []
+    for sample in samples:
+        messages = sample_messages(sample)
+        if messages is not None:
+            texts.append(render_sample(messages, tokenizer))
+    if not texts:
+        return np.empty(0, dtype=np.int64)
+    input_ids = tokenizer(texts, add_special_tokens=False)["input_ids"]
+    return np.fromiter((len(ids) for ids in input_ids), dtype=np.int64)
+
+
+def load_tokenizer(tokenizer_path: str):
+    # Third Party
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(tokenizer_path, use_fast=True)
+
+
+def _init_worker(tokenizer_path: str) -> None:
+    global _tokenizer  # pylint: disable=global-statement
+    # worker processes tokenize a batch each, without extra threads of their own
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    _tokenizer = load_tokenizer(tokenizer_path)
+
+
+def _lengths_of_chunk(samples: list[dict[str, Any]]) -> np.ndarray:
+    return sample_lengths(samples, _tokenizer)
+
+
+def _chunks(samples: Iterable[Any], size: int) -> Iterator[list[dict[str, Any]]]:
+    chunk: list[dict[str, Any]] = []
+    for sample in samples:
+        if not isinstance(sample, dict):
+            continue
+        chunk.append(sample)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def token_lengths(
+    path: str | os.PathLike, tokenizer_path: str, num_workers: Optional[int] = None
+) -> np.ndarray:
+    """
+    Token lengths of the samples of a JSONL, Parquet or Arrow dataset
+
+    The dataset is read in chunks and at most two chunks per worker process are
+    in flight, so memory does not grow with the size of the dataset.
+    """
+    chunks = _chunks(iter_dataset_file(path), TOKENIZE_CHUNK_SIZE)
+    if num_workers == 1:
+        tokenizer = load_tokenizer(tokenizer_path)
+        lengths = [sample_lengths(chunk, tokenizer) for chunk in chunks]
+    else:
+        num_workers = num_workers or os.cpu_count() or 1
+        lengths = []
+        with ProcessPoolExecutor(
+            max_workers=num_workers,
+            initializer=_init_worker,
+            initargs=(tokenizer_path,),
+        ) as executor:
+            pending: deque[Future] = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(_lengths_of_chunk, chunk))
+                if len(pending) >= 2 * num_workers:
+                    lengths.append(pending.popleft().result())
+            lengths.extend(future.result() for future in pending)
+    if not lengths:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate(lengths)
+
+
+def length_percentiles(lengths: np.ndarray) -> dict[int, int]:
+    if not len(lengths):
+        return {}
+    values = np.percentile(lengths, PERCENTILES, method="higher")
+    return {p: int(v) for p, v in zip(PERCENTILES, values, strict=True)}
+
+
+def length_histogram(lengths: np.ndarray, bins: int) -> list[tuple[int, int, int]]:
+    """(lowest, highest, samples) of bins of equal width over the token lengths"""
+    if not len(lengths):
+        return []
+    low, high = int(lengths.min()), int(lengths.max())
+    width = max(1, math.ceil((high - low + 1) / bins))
+    counts = np.bincount((lengths - low) // width)
+    return [
+        (low + i * width, low + (i + 1) * width - 1, int(count))
+        for i, count in enumerate(counts)
+    ]
+
+
+def packed_batch_count(lengths: np.ndarray, capacity: int) -> int:
+    """
+    Batches of at most capacity tokens the samples are packed into
+
+    Samples are placed longest first into the batch with the most room left, a
+    close and fast estimate of the first-fit-decreasing packing of the sampler.
+    """
+    # max-heap of the room left in every batch
+    room: list[int] = []
+    for length in np.sort(lengths)[::-1].tolist():
+        if room and -room[0] >= length:
+            heapq.heapreplace(room, room[0] + length)
+        else:
+            heapq.heappush(room, length - capacity)
+    return len(room)
+
+
+def padding_waste(
+    lengths: np.ndarray, batch_size: int, seed: int = PACKING_SEED
+) -> float:
+    """Share of padding tokens in shuffled batches padded to their longest sample"""
+    if not len(lengths):
+        return 0.0
+    batch_size = max(1, batch_size)
+    shuffled = np.random.default_rng(seed).permutation(lengths)
+    padded = 0
+    for start in range(0, len(shuffled), batch_size):
+        batch = shuffled[start : start + batch_size]
+        padded += int(batch.max()) * len(batch)
+    return 1 - int(shuffled.sum()) / padded
+
+
+@dataclass
+class PackingPlan:
+    """
+    Projected training batches of one candidate setting
+
+    Attributes:
+        max_seq_len             samples longer than this are dropped
+        max_batch_len           tokens per GPU and minibatch
+        effective_batch_size    samples per optimizer step
+        num_gpus                GPUs the minibatches are spread over
+        samples                 samples kept
+        dropped                 samples dropped for being longer than max_seq_len
+        tokens                  tokens of the kept samples, seen once per epoch
+        steps                   optimizer steps per epoch
+        grad_accum              minibatches per optimizer step
+        packing_max_batch_len   tokens per packed minibatch
+        packed_batches          packed minibatches per GPU and epoch
+        packing_efficiency      share of the packed minibatch tokens used by samples
+        padding_waste           share of padding without packing, padded batches of
+                                the same number of samples
+        error                   why the samples cannot be packed, if so
+    """
+
+    max_seq_len: int
+    max_batch_len: int
+    effective_batch_size: int
+    num_gpus: int
+    samples: int
+    dropped: int
+    tokens: int
+    steps: int
+    grad_accum: int = 0
+    packing_max_batch_len: int = 0
+    packed_batches: int = 0
+    packing_efficiency: float = 0.0
+    padding_waste: float = 0.0
+    error: Optional[str] = None
+
+
+def plan_packing(
+    lengths: np.ndarray,
+    max_seq_len: int,
+    max_batch_len: int,
+    effective_batch_size: int,
+    num_gpus: int = 1,
+) -> PackingPlan:
+    """Projects the batches of training on samples of the given token lengths"""
+    kept = lengths[lengths <= max_seq_len]
+    plan = PackingPlan(
+        max_seq_len=max_seq_len,
+        max_batch_len=max_batch_len,
+        effective_batch_size=effective_batch_size,
+        num_gpus=num_gpus,
+        samples=len(kept),
+        dropped=len(lengths) - len(kept),
+        tokens=int(kept.sum()),
+        steps=math.ceil(len(kept) / effective_batch_size),
+    )
+    if not len(kept):
+        plan.error = f"every sample is longer than {max_seq_len} tokens"
+        return plan
+
+    # as find_packing_max_batch_len_and_grad_accum of the training library
+    avg_sample_len = kept.mean()
+    longest = int(kept.max())
+    grad_accum = 0
+    packing_max_batch_len = max_batch_len + 1
+    while packing_max_batch_len > max_batch_len:
+        grad_accum += 1
+        samples_per_gpu = effective_batch_size / grad_accum / num_gpus
+        packing_max_batch_len = int(avg_sample_len * samples_per_gpu)
+        if packing_max_batch_len < longest:
+            plan.error = (
+                f"effective batch size too low to pack samples of {longest} tokens "
+                f"into at most {max_batch_len} tokens per GPU"
+            )
+            return plan
+
+    plan.grad_accum = grad_accum
+    plan.packing_max_batch_len = packing_max_batch_len
+    batches = packed_batch_count(kept, packing_max_batch_len)
+    plan.packed_batches = math.ceil(batches / num_gpus)
+    plan.packing_efficiency = plan.tokens / (batches * packing_max_batch_len)
+    plan.padding_waste = padding_waste(
+        kept, round(effective_batch_size / grad_accum / num_gpus)
+    )
+    return plan
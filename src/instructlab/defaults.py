@@ -55,6 +55,7 @@ class STORAGE_DIR_NAMES:
     ILAB = "instructlab"
     DATASETS = "datasets"
     CONVERTED_DOCUMENTS = "converted_documents"
+    DOCUMENTS = "documents"
     CHECKPOINTS = "checkpoints"
     OCI = "oci"
     MODELS = "models"
@@ -64,6 +65,8 @@ class STORAGE_DIR_NAMES:
     )
     CHATLOGS = "chatlogs"
     PHASED = "phased"
+    PROCESSED_DATASETS = "processed_datasets"
+    TRAINING_TUNING = "training_tuning"
     LOGS = "logs"
 
 
@@ -162,6 +165,30 @@ class _InstructlabDefaults:
     def DATASETS_DIR(self) -> str:
         return path.join(self._data_dir, STORAGE_DIR_NAMES.DATASETS)
 
+    @property
+    def PROCESSED_DATASETS_DIR(self) -> str:
+        return path.join(self._cache_home, STORAGE_DIR_NAMES.PROCESSED_DATASETS)
+
+    @property
+    def TRAINING_TUNING_DIR(self) -> str:
+        return path.join(self._cache_home, STORAGE_DIR_NAMES.TRAINING_TUNING)
+
+    @property
+    def DATASET_INVENTORY_CACHE(self) -> str:
+        return path.join(self._cache_home, "dataset_inventory.json")
+
+    @property
+    def TAXONOMY_DIFF_CACHE(self) -> str:
+        return path.join(self._cache_home, "taxonomy_diff.json")
+
+    @property
+    def TAXONOMY_VALIDATION_CACHE(self) -> str:
+        return path.join(self._cache_home, "taxonomy_validation.json")
+
+    @property
+    def DOCUMENTS_CACHE_DIR(self) -> str:
+        return path.join(self._cache_home, STORAGE_DIR_NAMES.DOCUMENTS)
+
     @property
     def CONVERTED_DOCUMENTS_DIR(self) -> str:
         return path.join(self._data_dir, STORAGE_DIR_NAMES.CONVERTED_DOCUMENTS)
@@ -242,6 +269,10 @@ class _InstructlabDefaults:
     def DK_BENCH_DATA_DIR(self) -> str:
         return path.join(self.EVAL_DATA_DIR, "dk_bench")
 
+    @property
+    def MMLU_CACHE_DIR(self) -> str:
+        return path.join(self.EVAL_DATA_DIR, "mmlu_cache")
+
     @property
     def SYSTEM_PROFILE_DIR(self) -> str:
         return path.join(self.INTERNAL_DIR, "system_profiles")
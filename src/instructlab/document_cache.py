@@ -0,0 +1,244 @@
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Persistent cache of the knowledge documents referenced by taxonomies.
+
+Every document repository is kept as a bare mirror under the cache directory,
+named after a hash of its URL. Only the commits that taxonomies reference are
+fetched, each with one shallow fetch. The files matching the patterns of a
+qna.yaml are checked out to a directory per commit, which later checkouts of
+the same commit reuse.
+
+Code outside of this package clones the repositories itself; within
+redirect_clones, git clones of a cached URL are served by its mirror through
+`url.<mirror>.insteadOf`, without going to the network.
+"""
+
+# Standard
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+import contextlib
+import hashlib
+import json
+import logging
+import os
+
+# Third Party
+from filelock import FileLock
+import git
+import yaml
+
+# Local
+from .defaults import DEFAULTS
+
+logger = logging.getLogger(__name__)
+
+# repositories fetched at the same time
+FETCH_WORKERS = 4
+
+
+class DocumentCache:
+    """Mirrors of document repositories and checkouts of their files by commit"""
+
+    def __init__(self, root: Optional[str | os.PathLike] = None) -> None:
+        self.root = Path(root if root is not None else DEFAULTS.DOCUMENTS_CACHE_DIR)
+
+    def _key(self, repo_url: str) -> str:
+        return hashlib.sha256(repo_url.encode("utf-8")).hexdigest()[:16]
+
+    def mirror_path(self, repo_url: str) -> Path:
+        return self.root / f"{self._key(repo_url)}.git"
+
+    def _lock(self, repo_url: str) -> FileLock:
+        self.root.mkdir(parents=True, exist_ok=True)
+        return FileLock(self.root / f"{self._key(repo_url)}.lock")
+
+    def _resolve(self, mirror: git.Repo, commit: str) -> Optional[str]:
+        try:
+            return mirror.git.rev_parse("--verify", "--quiet", f"{commit}^{{commit}}")
+        except git.exc.GitCommandError:
+            return None
+
+    def fetch(self, repo_url: str, commit: str) -> str:
+        """
+        Fetches a commit of a repository into its mirror, unless it is there already
+
+        Returns the full hash of the commit.
+        """
+        with self._lock(repo_url):
+            path = self.mirror_path(repo_url)
+            if path.is_dir():
+                mirror = git.Repo(path)
+            else:
+                mirror = git.Repo.init(path, bare=True, mkdir=True)
+            sha = self._resolve(mirror, commit)
+            if sha is not None:
+                return sha
+
+            logger.debug(f"Fetching {repo_url} at {commit} into {path}")
+            try:
+                mirror.git.fetch("--depth=1", repo_url, commit)
+            except git.exc.GitCommandError as e:
+                # servers may only serve the commits of branches and tags, and
+                # abbreviated hashes cannot be fetched
+                logger.debug(f"Fetching {commit} alone failed, fetching all refs: {e}")
+                mirror.git.fetch(
+                    repo_url,
+                    "+refs/heads/*:refs/remotes/origin/*",
+                    "+refs/tags/*:refs/tags/*",
+                )
+            sha = self._resolve(mirror, commit)
+            if sha is None:
+                raise FileNotFoundError(f"Commit {commit} not found in {repo_url}")
+            # clones of the mirror get the branches of the fetched commits
+            mirror.git.update_ref(f"refs/heads/ilab/{sha}", sha)
+            mirror.git.symbolic_ref("HEAD", f"refs/heads/ilab/{sha}")
+            return sha
+
+    def checkout(self, repo_url: str, commit: str, patterns: Iterable[str]) -> Path:
+        """
+        Directory with the files of a commit of a repository matching the patterns
+
+        Patterns are globs relative to the root of the repository; files that a
+        previous call checked out for other patterns may also be present.
+        """
+        sha = self.fetch(repo_url, commit)
+        key = self._key(repo_url)
+        working_dir = self.root / key / sha
+        patterns_file = self.root / key / f"{sha}.json"
+        with self._lock(repo_url):
+            done: set[str] = set()
+            if patterns_file.is_file():
+                done = set(json.loads(patterns_file.read_text(encoding="utf-8")))
+            missing = [p for p in patterns if p not in done]
+            if not missing:
+                return working_dir
+
+            working_dir.mkdir(parents=True, exist_ok=True)
+            index_file = self.root / key / f"{sha}.index"
+            env = {"GIT_INDEX_FILE": str(index_file), "GIT_WORK_TREE": str(working_dir)}
+            mirror = git.Repo(self.mirror_path(repo_url))
+            try:
+                mirror.git.read_tree(sha, env=env)
+                paths = mirror.git.ls_files(
+                    "-z", "--", *(f":(glob){p}" for p in missing), env=env
+                ).split("\0")
+                paths = [p for p in paths if p]
+                if paths:
+                    mirror.git.checkout_index("-f", "--", *paths, env=env)
+            finally:
+                index_file.unlink(missing_ok=True)
+            logger.debug(f"Checked out {len(paths)} files of {repo_url} at {sha}")
+
+            tmp_file = patterns_file.with_suffix(f".{os.getpid()}.tmp")
+            tmp_file.write_text(
+                json.dumps(sorted(done | set(missing))), encoding="utf-8"
+            )
+            os.replace(tmp_file, patterns_file)
+        return working_dir
+
+    @contextlib.contextmanager
+    def redirect_clones(self, repo_urls: Iterable[str]) -> Iterator[None]:
+        """
+        Serves the git clones of the repositories from their mirrors
+
+        The rewrite is passed to the git commands started by this process through
+        the GIT_CONFIG_COUNT environment variables.
+        """
+        count = int(os.environ.get("GIT_CONFIG_COUNT", "0"))
+        saved = {"GIT_CONFIG_COUNT": os.environ.get("GIT_CONFIG_COUNT")}
+        for repo_url in repo_urls:
+            for name, value in (
+                (
+                    f"GIT_CONFIG_KEY_{count}",
+                    f"url.{self.mirror_path(repo_url)}.insteadOf",
+                ),
+                (f"GIT_CONFIG_VALUE_{count}", repo_url),
+            ):
+                saved[name] = os.environ.get(name)
+                os.environ[name] = value
+            count += 1
+        os.environ["GIT_CONFIG_COUNT"] = str(count)
+        try:
+            yield
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+
+def taxonomy_document_sources(
+    taxonomy_path: str | Path, taxonomy_base: str
+) -> list[tuple[str, str]]:
+    """(repository URL, commit) of the documents of the new or changed knowledge files"""
+    # Third Party
+    from instructlab.schema.taxonomy import TaxonomyReadingException
+
+    # Local
+    from .utils import get_taxonomy, get_taxonomy_diff
+
+    if os.path.isfile(taxonomy_path):
+        files = [Path(taxonomy_path)]
+    else:
+        try:
+            names = (
+                get_taxonomy(taxonomy_path)
+                if taxonomy_base == "empty"
+                else get_taxonomy_diff(taxonomy_path, taxonomy_base)
+            )
+        except (TaxonomyReadingException, git.exc.GitError) as e:
+            # reported by the code reading the taxonomy after us
+            logger.debug(f"Not caching the documents of {taxonomy_path}: {e}")
+            return []
+        files = [Path(taxonomy_path) / name for name in names]
+
+    sources = set()
+    for file_path in files:
+        try:
+            contents = yaml.safe_load(file_path.read_text(encoding="utf-8"))
+        except (OSError, yaml.YAMLError):
+            # reported by the validation
+            continue
+        document = contents.get("document") if isinstance(contents, dict) else None
+        if (
+            isinstance(document, dict)
+            and isinstance(document.get("repo"), str)
+            and isinstance(document.get("commit"), str)
+        ):
+            sources.add((document["repo"], document["commit"]))
+    return sorted(sources)
+
+
+@contextlib.contextmanager
+def taxonomy_document_clones(
+    taxonomy_path: str | Path,
+    taxonomy_base: str,
+    cache: Optional[DocumentCache] = None,
+) -> Iterator[None]:
+    """
+    Fetches the documents of a taxonomy into the cache and serves their clones from it
+
+    Repositories that cannot be fetched are left to the cloning code, which reports
+    the error.
+    """
+    cache = cache or DocumentCache()
+    sources = taxonomy_document_sources(taxonomy_path, taxonomy_base)
+
+    def fetch(source: tuple[str, str]) -> bool:
+        repo_url, commit = source
+        try:
+            cache.fetch(repo_url, commit)
+            return True
+        except (git.exc.GitError, OSError) as e:
+            logger.warning(f"Failed to cache the documents of {repo_url}: {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+        fetched = list(executor.map(fetch, sources))
+    # a mirror serves every commit of its repository or none
+    failed = {url for (url, _), ok in zip(sources, fetched, strict=True) if not ok}
+    with cache.redirect_clones(sorted({url for url, _ in sources} - failed)):
+        yield
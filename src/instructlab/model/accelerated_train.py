@@ -1,10 +1,13 @@
 # Standard
+from concurrent.futures import Future, ThreadPoolExecutor
 import enum
 import functools
+import json
 import logging
 import os
 import pathlib
 import pprint
+import threading
 import typing
 
 # Third Party
@@ -16,8 +19,15 @@ import click
 from instructlab import utils
 from instructlab.configuration import _serve
 from instructlab.model.backends import backends
+from instructlab.train.telemetry import (
+    TelemetryOptions,
+    TrainingLibraryMetricsFollower,
+    TrainingTelemetry,
+)
 
 # Local
+from .dataset_cache import ProcessedDatasetCache
+from .mmlu_cache import MMLURequestCache
 from .phased_training import (
     EvalPhaseModel,
     EvalResult,
@@ -63,6 +73,8 @@ def accelerated_train(
     eval_serve: _serve,
     eval_gpus: int,
     training_journal: pathlib.Path | None,
+    phased_pipelined_eval: bool = False,
+    telemetry: TelemetryOptions | None = None,
 ):
     # run_training is a dynamic attribute, pylint is not clever enough
     # to detect it.
@@ -222,15 +234,14 @@ def accelerated_train(
             eval_serve=eval_serve,
             eval_gpus=eval_gpus,
             strategy=strategy,
+            pipelined_eval=phased_pipelined_eval,
+            telemetry=telemetry,
         )
     else:
-        # Third Party
-        from instructlab.training import (
-            run_training,  # pylint: disable=no-name-in-module
-        )
-
         try:
-            run_training(train_args=train_args, torch_args=torch_args)
+            _run_training(
+                train_args=train_args, torch_args=torch_args, telemetry=telemetry
+            )
         except (RuntimeError, KeyboardInterrupt, Exception) as e:
             if not isinstance(e, KeyboardInterrupt):
                 logger.error("Failed during training loop: %s", e, exc_info=True)
@@ -250,6 +261,7 @@ def _run_phase(
     phase_model: TrainPhaseModel | EvalPhaseModel,
     next_phase: TrainingPhases,
     model_override: pathlib.Path | None = None,
+    telemetry: TelemetryOptions | None = None,
 ):
     """Runs a single phase of the multi-phase training pipeline and capture any errors.
 
@@ -268,6 +280,7 @@ def _run_phase(
             learning_rate=learning_rate,
             effective_batch_size=effective_batch_size,
             model_override=model_override,
+            telemetry=telemetry,
             # model override not necessary because we expect model to come from ctx.params.model_path.
         )
     # pylint: disable=broad-except # training library emits a general Exception in lieu of a more specific one.
@@ -313,6 +326,8 @@ def _run_phased_training(
     journal: TrainingJournal,
     eval_serve: _serve,
     eval_gpus: int,
+    pipelined_eval: bool = False,
+    telemetry: TelemetryOptions | None = None,
 ) -> None:
     if journal.current_phase == TrainingPhases.DONE:
         click.secho(
@@ -351,6 +366,7 @@ def _run_phased_training(
             journal=journal,
             phase_model=phase_model,
             next_phase=TrainingPhases.TRAIN2,
+            telemetry=telemetry,
         )
 
         logger.debug("Finished training #1\n%s", journal.print_model_rich())
@@ -429,7 +445,8 @@ def _run_phased_training(
                 )
 
             next_checkpoint = phase1_checkpoints[0]
-        _run_phase(
+        run_phase2 = functools.partial(
+            _run_phase,
             train_args=train_args,
             torch_args=torch_args,
             data_path=phase2_data,
@@ -442,7 +459,41 @@ def _run_phased_training(
             phase_model=phase_model,
             next_phase=TrainingPhases.EVAL2,
             model_override=next_checkpoint,
+            telemetry=telemetry,
         )
+
+        spare_gpus = _get_spare_gpus(torch_args) if pipelined_eval else []
+        if spare_gpus:
+            click.secho(
+                f"Evaluating Phase 2 checkpoints on GPUs {spare_gpus} while training continues...",
+                fg="cyan",
+            )
+            eval_model = journal.journal.eval_2
+            if eval_model is None:
+                eval_model = EvalPhaseModel(checkpoints=[])
+                journal.journal.eval_2 = eval_model
+                journal.commit()
+            _run_pipelined_phase(
+                run_phase=run_phase2,
+                checkpoints_dir=phase2_checkpoints_dir / "hf_format",
+                eval_func=functools.partial(
+                    _mtbench,
+                    eval_serve=eval_serve,
+                    eval_gpus=len(spare_gpus),
+                    eval_cache=phase2_eval_cache,
+                    mtbench_judge=mtbench_judge,
+                    enable_serving_output=enable_serving_output,
+                ),
+                phase_model=eval_model,
+                journal=journal,
+                gpus=spare_gpus,
+            )
+        else:
+            if pipelined_eval:
+                logger.warning(
+                    "Training uses every GPU, Phase 2 checkpoints will be evaluated after training"
+                )
+            run_phase2()
         logger.debug("Finished training #2\n%s", journal.print_model_rich())
     else:
         click.secho("SKIPPING: Training Phase 2/2; already in Journal", fg="cyan")
@@ -459,6 +510,12 @@ def _run_phased_training(
                 checkpoints=_get_checkpoints(phase2_checkpoints_dir)
             )
             journal.journal.eval_2 = phase_model
+        else:
+            # some checkpoints may already have been evaluated while training was running
+            phase_model.checkpoints = sorted(
+                set(phase_model.checkpoints)
+                | set(_get_checkpoints(phase2_checkpoints_dir))
+            )
         journal.commit()
 
         best_checkpoint = _evaluate_dir_of_checkpoints(
@@ -510,12 +567,10 @@ def _training_phase(
     learning_rate: float | None = None,
     checkpoint_dir: pathlib.Path | None = None,
     effective_batch_size: int | None = None,
+    telemetry: TelemetryOptions | None = None,
 ) -> None:
     """A single step of phased training that supports key param overriding."""
 
-    # Third Party
-    from instructlab.training import run_training  # pylint: disable=no-name-in-module
-
     logger.debug(
         f"Phased Training -- training phase -- Overriding data_path: {train_args.data_path} with {data_path}"
     )
@@ -560,7 +615,58 @@ def _training_phase(
         f"TrainingArgs for current phase: {pprint.pformat(train_args)}", fg="cyan"
     )
 
-    run_training(train_args=train_args, torch_args=torch_args)
+    _run_training(train_args=train_args, torch_args=torch_args, telemetry=telemetry)
+
+
+def _run_training(
+    train_args: TrainingArgs,
+    torch_args: TorchrunArgs,
+    telemetry: TelemetryOptions | None = None,
+) -> None:
+    """Runs the training library, reusing its processed dataset from the cache when possible.
+
+    With telemetry, the step metrics written by the training library are forwarded
+    to telemetry.jsonl in the checkpoint dir while training runs.
+    """
+    # Third Party
+    from instructlab.training import run_training  # pylint: disable=no-name-in-module
+
+    dataset_cache = None
+    if train_args.process_data:
+        dataset_cache = ProcessedDatasetCache(
+            data_path=train_args.data_path,
+            model_path=train_args.model_path,
+            chat_tmpl_path=train_args.chat_tmpl_path,
+            max_seq_len=train_args.max_seq_len,
+            use_legacy_tmpl=train_args.use_legacy_tmpl,
+        )
+    if dataset_cache is not None and dataset_cache.exists():
+        click.secho(
+            f"Using processed dataset from cache: {dataset_cache.path}", fg="cyan"
+        )
+        dataset_cache.restore(train_args.data_output_dir)
+        train_args.process_data = False
+        dataset_cache = None
+
+    if telemetry is None:
+        run_training(train_args=train_args, torch_args=torch_args)
+    else:
+        with TrainingTelemetry(
+            train_args.ckpt_output_dir, "accelerated", telemetry
+        ) as step_telemetry:
+            follower = TrainingLibraryMetricsFollower(
+                step_telemetry, train_args.ckpt_output_dir
+            )
+            follower.start()
+            try:
+                run_training(train_args=train_args, torch_args=torch_args)
+            finally:
+                follower.stop()
+
+    if dataset_cache is not None:
+        data_jsonl = pathlib.Path(train_args.data_output_dir) / "data.jsonl"
+        if data_jsonl.is_file():
+            dataset_cache.store(data_jsonl)
 
 
 def _prepare_phased_base_dir(
@@ -599,7 +705,7 @@ def _setup_phase_dirs(path: pathlib.Path) -> None:
     os.makedirs(eval_cache_path, exist_ok=True)
 
 
-def _mmlu(model: pathlib.Path) -> float:
+def _mmlu(model: pathlib.Path, mmlu_cache: MMLURequestCache | None = None) -> float:
     # Third Party
     from instructlab.eval.mmlu import MMLU_TASKS, MMLUEvaluator
     import torch
@@ -613,7 +719,11 @@ def _mmlu(model: pathlib.Path) -> float:
 
     # type the variable because MyPy doesn't seem to honor the types of the spread tuple
     ckpt_score: float
-    ckpt_score, _ = evaluator.run()
+    # the few-shot requests are the same for every checkpoint of a run, the
+    # on-disk cache lets only the forward passes be redone
+    if mmlu_cache is None:
+        mmlu_cache = MMLURequestCache()
+    ckpt_score, _ = mmlu_cache.run(evaluator)
 
     logging.debug("Phased Training -- MMLU eval phase -- Clearing PyTorch cache")
     torch.cuda.empty_cache()
@@ -628,6 +738,7 @@ def _mtbench(
     eval_cache: pathlib.Path,
     mtbench_judge: pathlib.Path,
     enable_serving_output: bool,
+    env: dict[str, str] | None = None,
 ) -> float:
     # TODO: optimization: run all generations in serial and then do all judgments at once to save time loading/unloading prometheus.
     # Third Party
@@ -677,6 +788,7 @@ def _mtbench(
             max_workers="auto",
             enable_serving_output=enable_serving_output,
             backend=backends.VLLM,
+            env=env,
         )
         logger.debug("Generating mt-bench answers")
         evaluator.gen_answers(
@@ -700,6 +812,7 @@ def _mtbench(
             max_workers="auto",
             backend=backends.VLLM,
             enable_serving_output=enable_serving_output,
+            env=env,
         )
         logger.debug("Judging mt-bench answers")
         mt_bench_results: tuple = evaluator.judge_answers(
@@ -726,30 +839,177 @@ def _evaluate_dir_of_checkpoints(
         set(phase_model.checkpoints) - set(phase_model.finished_checkpoints)
     )
 
-    if len(checkpoints_todo) == 0:
+    if len(checkpoints_todo) == 0 and len(phase_model.results) == 0:
         raise RuntimeError(
             "No checkpoints were evaluated, 'checkpoints_todo' was empty in journal."
         )
 
     for checkpoint in checkpoints_todo:
-        logger.debug(str(checkpoint))
-        checkpoint_score = eval_func(model=checkpoint)
-
-        phase_model.results.append(
-            EvalResult(
-                score=checkpoint_score,
-                checkpoint=checkpoint,
-                ended_at_utc=TrainingJournal.now_utc(),
-            )
-        )
+        _evaluate_checkpoint(eval_func, checkpoint, phase_model, journal)
 
-        phase_model.finished_checkpoints.append(checkpoint)
-        journal.commit()
+    return TrainingJournal.best_checkpoint(phase_model=phase_model)
 
-        click.secho(
-            f"CHECKPOINT EVALUATION: {str(checkpoint)} SCORED {checkpoint_score}",
-            fg="red",
-            bg="cyan",
+
+def _evaluate_checkpoint(
+    eval_func: typing.Callable[..., float],
+    checkpoint: pathlib.Path,
+    phase_model: EvalPhaseModel,
+    journal: TrainingJournal,
+) -> None:
+    """Run eval_func on a single checkpoint and record its score in the journal."""
+    logger.debug(str(checkpoint))
+    checkpoint_score = eval_func(model=checkpoint)
+
+    phase_model.results.append(
+        EvalResult(
+            score=checkpoint_score,
+            checkpoint=checkpoint,
+            ended_at_utc=TrainingJournal.now_utc(),
         )
+    )
 
-    return TrainingJournal.best_checkpoint(phase_model=phase_model)
+    phase_model.finished_checkpoints.append(checkpoint)
+    journal.commit()
+
+    click.secho(
+        f"CHECKPOINT EVALUATION: {str(checkpoint)} SCORED {checkpoint_score}",
+        fg="red",
+        bg="cyan",
+    )
+
+
+def _get_spare_gpus(torch_args: TorchrunArgs) -> list[int]:
+    """GPUs of this node that aren't used by training."""
+    # Third Party
+    import torch
+
+    if torch_args.nproc_per_node == "gpu":
+        return []
+    return list(range(int(torch_args.nproc_per_node), torch.cuda.device_count()))
+
+
+def _visible_gpus_env(gpus: list[int]) -> dict[str, str]:
+    """Copy of the environment of this process for serving backends that only see gpus"""
+    # os.environ itself is left alone, other threads may start processes meanwhile
+    env = os.environ.copy()
+    env["CUDA_VISIBLE_DEVICES"] = ",".join(str(gpu) for gpu in gpus)
+    return env
+
+
+def _checkpoint_signature(checkpoint: pathlib.Path) -> tuple | None:
+    """Names, sizes and mtimes of a checkpoint's files, None while it is incomplete."""
+    files = {f.name: f.stat() for f in checkpoint.iterdir() if f.is_file()}
+    if "config.json" not in files:
+        return None
+    if not any(name.endswith((".safetensors", ".bin")) for name in files):
+        return None
+    index = files.get("model.safetensors.index.json")
+    if index is not None:
+        with open(checkpoint / "model.safetensors.index.json", encoding="utf-8") as f:
+            try:
+                shards = set(json.load(f)["weight_map"].values())
+            except (ValueError, KeyError):
+                return None
+        if not shards.issubset(files):
+            return None
+    return tuple(
+        sorted((name, st.st_size, st.st_mtime_ns) for name, st in files.items())
+    )
+
+
+class _CheckpointWatcher(threading.Thread):
+    """Polls a checkpoint directory and reports every checkpoint once it is fully written.
+
+    A checkpoint is considered complete when it has a config and weights, and
+    none of its files changed between two polls.
+    """
+
+    def __init__(
+        self,
+        checkpoints_dir: pathlib.Path,
+        on_ready: typing.Callable[[pathlib.Path], None],
+        poll_interval: float = 30.0,
+    ):
+        super().__init__(name="checkpoint-watcher", daemon=True)
+        self.checkpoints_dir = checkpoints_dir
+        self.on_ready = on_ready
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+        self._signatures: dict[pathlib.Path, tuple] = {}
+        self._reported: set[pathlib.Path] = set()
+
+    def scan(self, final: bool = False) -> None:
+        if not self.checkpoints_dir.is_dir():
+            return
+        for checkpoint in sorted(self.checkpoints_dir.iterdir()):
+            if checkpoint in self._reported or not checkpoint.is_dir():
+                continue
+            signature = _checkpoint_signature(checkpoint)
+            if signature is None:
+                continue
+            # once training has exited, every checkpoint on disk is complete
+            if final or self._signatures.get(checkpoint) == signature:
+                self._reported.add(checkpoint)
+                self.on_ready(checkpoint)
+            else:
+                self._signatures[checkpoint] = signature
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.poll_interval):
+            self.scan()
+
+    def stop(self, final_scan: bool = True) -> None:
+        self._stop_event.set()
+        self.join()
+        if final_scan:
+            self.scan(final=True)
+
+
+def _run_pipelined_phase(
+    run_phase: typing.Callable[[], None],
+    checkpoints_dir: pathlib.Path,
+    eval_func: typing.Callable[..., float],
+    phase_model: EvalPhaseModel,
+    journal: TrainingJournal,
+    gpus: list[int],
+    poll_interval: float = 30.0,
+) -> None:
+    """Run a training phase while evaluating each of its checkpoints as soon as it is saved.
+
+    Evaluations run one at a time on `gpus`, and their results are committed to
+    the journal as they come in. eval_func gets the environment of the servers it
+    launches as its `env` argument. Returns once training and every evaluation are done.
+    """
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint-eval")
+    futures: list[Future] = []
+
+    eval_on_gpus = functools.partial(eval_func, env=_visible_gpus_env(gpus))
+
+    def evaluate(checkpoint: pathlib.Path) -> None:
+        _evaluate_checkpoint(eval_on_gpus, checkpoint, phase_model, journal)
+
+    def schedule(checkpoint: pathlib.Path) -> None:
+        if checkpoint in phase_model.finished_checkpoints:
+            return
+        if checkpoint not in phase_model.checkpoints:
+            phase_model.checkpoints.append(checkpoint)
+            journal.commit()
+        logger.debug("Scheduling evaluation of %s", checkpoint)
+        futures.append(executor.submit(evaluate, checkpoint))
+
+    watcher = _CheckpointWatcher(
+        checkpoints_dir, on_ready=schedule, poll_interval=poll_interval
+    )
+    watcher.start()
+    try:
+        run_phase()
+    except BaseException:
+        watcher.stop(final_scan=False)
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+
+    watcher.stop()
+    executor.shutdown(wait=True)
+    for future in futures:
+        # surface evaluation failures
+        future.result()
@@ -123,6 +123,7 @@ def get_backend_from_values(
     model_family,
     vllm_model_family,
     log_file,
+    parallel=1,
 ) -> BackendServer:
     # Local
     from .llama_cpp import Server as llama_cpp_server
@@ -152,6 +153,7 @@ def get_backend_from_values(
             port=port,
             log_file=log_file,
             num_threads=None,  # exists only as a flag not a config
+            parallel=parallel,
         )
     if backend == VLLM:
         # Instantiate the vllm server
@@ -192,4 +194,5 @@ def select_backend(
         vllm_model_family=cfg.vllm.llm_family,
         model_family=cfg.llama_cpp.llm_family,
         log_file=log_file,
+        parallel=cfg.llama_cpp.parallel,
     )
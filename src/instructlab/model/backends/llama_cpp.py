@@ -15,8 +15,9 @@ import signal
 from llama_cpp import llama_chat_format, llama_token_get_text
 from llama_cpp.server.app import create_app
 from llama_cpp.server.model import LlamaProxy
-from llama_cpp.server.settings import Settings
+from llama_cpp.server.settings import ModelSettings, Settings
 from uvicorn import Config
+import anyio
 import fastapi
 import httpx
 import llama_cpp.server.app as llama_app
@@ -54,6 +55,7 @@ class Server(BackendServer):
         max_ctx_size: int,
         num_threads: Optional[int],
         log_file: Optional[pathlib.Path] = None,
+        parallel: int = 1,
     ):
         sc = ServerConfig(api_base, log_file)
         super().__init__(
@@ -67,6 +69,7 @@ class Server(BackendServer):
         self.gpu_layers = gpu_layers
         self.max_ctx_size = max_ctx_size
         self.num_threads = num_threads
+        self.parallel = parallel
         self.queue: Optional[multiprocessing.Queue] = None
         self.process: multiprocessing.Process | None = None
 
@@ -80,6 +83,7 @@ class Server(BackendServer):
                 max_ctx_size=self.max_ctx_size,
                 model_family=self.model_family,
                 threads=self.num_threads,
+                parallel=self.parallel,
                 host=self.host,
                 port=self.port,
                 log_file=self.config.log_file,
@@ -106,6 +110,7 @@ class Server(BackendServer):
                 "gpu_layers": self.gpu_layers,
                 "max_ctx_size": self.max_ctx_size,
                 "model_family": self.model_family,
+                "parallel": self.parallel,
                 "port": port,
                 "host": self.host,
                 "queue": self.queue,
@@ -180,6 +185,7 @@ def server(
     max_ctx_size: int,
     model_family: str,
     threads=None,
+    parallel: int = 1,
     host: str = "localhost",
     port: int = 8000,
     queue: Optional[multiprocessing.Queue] = None,
@@ -199,6 +205,10 @@ def server(
 
     if threads is not None:
         settings.n_threads = threads
+    if parallel > 1:
+        # every copy of the model decodes with its share of the threads
+        settings.n_threads = max(settings.n_threads // parallel, 1)
+        settings.n_threads_batch = max(settings.n_threads_batch // parallel, 1)
     try:
         # When we run a logger with DEBUG, verbose mode is activated, create_app will initialize the Llama class which
         # will print the model configuration to stderr. We need to redirect stderr to the log_file
@@ -213,8 +223,10 @@ def server(
                 redirect_stderr(f),
             ):
                 app = create_app(settings=settings)
+                set_llama_proxy_pool(settings, parallel)
         else:
             app = create_app(settings=settings)
+            set_llama_proxy_pool(settings, parallel)
 
         @app.get("/")
         def read_root():
@@ -240,6 +252,7 @@ def server(
         app=app,
         host=host,
         port=port,
+        parallel=parallel,
     )
     s = UvicornServer(config)
 
@@ -260,17 +273,70 @@ def server(
         queue.join_thread()
 
 
-def get_uvicorn_config(app: fastapi.FastAPI, host: str, port: int) -> Config:
+def get_uvicorn_config(
+    app: fastapi.FastAPI, host: str, port: int, parallel: int = 1
+) -> Config:
     return Config(
         app,
         host=host,
         port=port,
         log_level=logging.ERROR,
-        limit_concurrency=2,  # Make sure we only serve a single client at a time
-        timeout_keep_alive=0,  # prevent clients holding connections open (we only have 1)
+        limit_concurrency=parallel
+        + 1,  # Make sure we only serve one client per model copy
+        timeout_keep_alive=0,  # prevent clients holding connections open
     )
 
 
+class LlamaProxyPool:
+    """
+    Copies of the served model, each one answering a single request at a time
+
+    llama-cpp runs one completion at a time on a model, concurrent requests are
+    spread over the copies instead. The weights are memory-mapped, so the copies
+    share them and only add their own context.
+    """
+
+    def __init__(self, proxies: list[LlamaProxy]) -> None:
+        self.proxies = proxies
+        self._idle = list(proxies)
+        self._available = anyio.Semaphore(len(proxies))
+
+    async def get_llama_proxy(self):
+        async with self._available:
+            proxy = self._idle.pop()
+            try:
+                yield proxy
+            finally:
+                self._idle.append(proxy)
+
+
+_llama_proxy_pool: Optional[LlamaProxyPool] = None
+
+
+def set_llama_proxy_pool(settings: Settings, parallel: int) -> None:
+    """Serves completions on parallel copies of the model loaded by create_app"""
+    global _llama_proxy_pool  # pylint: disable=global-statement
+    if parallel <= 1:
+        _llama_proxy_pool = None
+        return
+
+    logger.info(f"Loading {parallel} copies of the model to serve requests in parallel")
+    model_settings = [ModelSettings.model_validate(settings)]
+    # pylint: disable=protected-access
+    proxies = [cast(LlamaProxy, llama_app._llama_proxy)] + [
+        LlamaProxy(models=model_settings) for _ in range(parallel - 1)
+    ]
+    _llama_proxy_pool = LlamaProxyPool(proxies)
+    # the completion routes look the function up on every request
+    llama_app.get_llama_proxy = _llama_proxy_pool.get_llama_proxy
+
+
+async def served_llama_proxies() -> list[LlamaProxy]:
+    if _llama_proxy_pool is not None:
+        return _llama_proxy_pool.proxies
+    return [proxy async for proxy in llama_app.get_llama_proxy()]
+
+
 class UvicornServer(uvicorn.Server):
     """Override uvicorn.Server to handle SIGINT."""
 
@@ -305,7 +371,7 @@ async def augment_chat_template(
 
         logger.info("Replacing chat template:\n %s", template)
 
-        async for proxy in llama_app.get_llama_proxy():
+        for proxy in await served_llama_proxies():
             proxy().chat_handler = llama_chat_format.Jinja2ChatFormatter(
                 template=template,
                 # Use the model defined eos and bos if either is not
@@ -64,6 +64,8 @@ class Server(BackendServer):
         self.vllm_args = list(vllm_args) if vllm_args is not None else []
         self.process: subprocess.Popen | None = None
         self.max_startup_attempts = max_startup_attempts
+        # environment of the vLLM process, the one of this process if None
+        self.env: dict[str, str] | None = None
 
     def run(self):
         self.process, files = run_vllm(
@@ -75,6 +77,7 @@ class Server(BackendServer):
             self.vllm_args,
             self.background,
             log_file=self.config.log_file,
+            env=self.env,
         )
         self.register_resources(files)
 
@@ -99,6 +102,7 @@ class Server(BackendServer):
             self.vllm_args,
             background=background,
             log_file=self.config.log_file,
+            env=self.env,
         )
         self.register_resources(files)
         return server_process
@@ -261,6 +265,7 @@ def run_vllm(
     vllm_args: list[str],
     background: bool,
     log_file: pathlib.Path | None = None,
+    env: dict[str, str] | None = None,
 ) -> typing.Tuple[subprocess.Popen, list[Closeable]]:
     """
     Start an OpenAI-compatible server with vLLM.
@@ -280,6 +285,8 @@ def run_vllm(
         background (bool):            Whether the stdout and stderr vLLM should be sent to /dev/null (True)
                                       or stay in the foreground(False).
         log_file (Path):              File to write stdout and stderr
+        env (dict):                   Environment of the vLLM process, a copy of the
+                                      environment of this process if None
     Returns:
         tuple: A tuple containing two values:
             vllm_process (subprocess.Popen): process of the vllm server
@@ -293,7 +300,7 @@ def run_vllm(
 
     logger.debug(f"vLLM serving command is: {vllm_cmd}")
 
-    vllm_env = os.environ.copy()
+    vllm_env = dict(env) if env is not None else os.environ.copy()
     # Reset vllm logging to the default (enabled)
     vllm_env.pop("VLLM_CONFIGURE_LOGGING", None)
 
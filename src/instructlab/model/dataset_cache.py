@@ -0,0 +1,212 @@
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Content-addressed cache of training datasets processed by instructlab-training.
+
+Processing turns the SDG output into tokenized samples (`data.jsonl`). It only
+depends on the data file, the tokenizer and chat template, and `max_seq_len`,
+so re-running training with a different learning rate or number of epochs
+can reuse it. Cached datasets are stored both as the `data.jsonl` consumed by
+the accelerated training library and as flat token arrays that the CPU/MPS
+training loop memory-maps, together with the packing parameters computed
+for them.
+"""
+
+# Standard
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+from typing import Callable, Optional
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+# Third Party
+import numpy as np
+
+# First Party
+from instructlab.configuration import DEFAULTS
+
+# Local
+from .mmlu_cache import tokenizer_hash
+
+logger = logging.getLogger(__name__)
+
+DATA_FILE = "data.jsonl"
+INPUT_IDS_FILE = "input_ids.npy"
+LABELS_FILE = "labels.npy"
+OFFSETS_FILE = "offsets.npy"
+PACKING_FILE = "packing.json"
+
+
+def _hash_file(digest, path: Path) -> None:
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+
+
+def processed_dataset_key(
+    data_path: str,
+    model_path: str,
+    chat_tmpl_path: Optional[str],
+    max_seq_len: int,
+    use_legacy_tmpl: bool = False,
+) -> Optional[str]:
+    """Key of a processed dataset, None if its inputs can't be fingerprinted"""
+    if not os.path.isfile(data_path):
+        return None
+    tok_hash = tokenizer_hash(model_path)
+    if tok_hash is None:
+        return None
+
+    digest = hashlib.sha256()
+    _hash_file(digest, Path(data_path))
+    digest.update(tok_hash.encode("utf-8"))
+    if chat_tmpl_path and os.path.isfile(chat_tmpl_path):
+        _hash_file(digest, Path(chat_tmpl_path))
+    try:
+        training_version = version("instructlab-training")
+    except PackageNotFoundError:
+        training_version = "unknown"
+    digest.update(
+        json.dumps(
+            {
+                "max_seq_len": max_seq_len,
+                "use_legacy_tmpl": use_legacy_tmpl,
+                "instructlab-training": training_version,
+            },
+            sort_keys=True,
+        ).encode("utf-8")
+    )
+    return digest.hexdigest()
+
+
+class TokenArrayDataset:
+    """
+    Tokenized samples backed by memory-mapped flat token arrays.
+
+    Returns the same items as instructlab-training's TokenDataset. The arrays
+    are opened lazily so that spawned dataloader workers map the files
+    instead of receiving a pickled copy.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._offsets = np.load(path / OFFSETS_FILE)
+        self._input_ids = None
+        self._labels = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_input_ids"] = None
+        state["_labels"] = None
+        return state
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, idx):
+        # Third Party
+        import torch
+
+        if self._input_ids is None:
+            self._input_ids = np.load(self.path / INPUT_IDS_FILE, mmap_mode="r")
+            self._labels = np.load(self.path / LABELS_FILE, mmap_mode="r")
+        start, end = self._offsets[int(idx)], self._offsets[int(idx) + 1]
+        input_ids = torch.tensor(self._input_ids[start:end], dtype=torch.long)
+        labels = torch.tensor(self._labels[start:end], dtype=torch.long)
+        return {
+            "input_ids": input_ids,
+            "labels": labels,
+            "attention_mask": torch.ones_like(input_ids),
+        }
+
+    def get_lengths(self) -> np.ndarray:
+        return np.diff(self._offsets)
+
+
+class ProcessedDatasetCache:
+    """
+    A processed dataset in the cache.
+
+    Attributes:
+        key     content hash of the processing inputs, None when caching isn't possible
+        path    directory of the cached dataset
+    """
+
+    def __init__(
+        self,
+        data_path: str,
+        model_path: str,
+        chat_tmpl_path: Optional[str],
+        max_seq_len: int,
+        use_legacy_tmpl: bool = False,
+        cache_dir: str | Path | None = None,
+    ) -> None:
+        self.key = processed_dataset_key(
+            data_path, model_path, chat_tmpl_path, max_seq_len, use_legacy_tmpl
+        )
+        self.path = Path(cache_dir or DEFAULTS.PROCESSED_DATASETS_DIR) / str(self.key)
+
+    def exists(self) -> bool:
+        return self.key is not None and (self.path / OFFSETS_FILE).is_file()
+
+    def store(self, data_jsonl: str | Path) -> None:
+        """Adds a data.jsonl written by instructlab-training's data processing"""
+        if self.key is None or self.exists():
+            return
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp_path.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(data_jsonl, tmp_path / DATA_FILE)
+
+        lengths, input_ids, labels = [], [], []
+        with open(data_jsonl, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                sample = json.loads(line)
+                lengths.append(len(sample["input_ids"]))
+                input_ids.append(np.asarray(sample["input_ids"], dtype=np.int32))
+                labels.append(np.asarray(sample["labels"], dtype=np.int32))
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        empty = np.zeros(0, dtype=np.int32)
+        np.save(tmp_path / INPUT_IDS_FILE, np.concatenate(input_ids or [empty]))
+        np.save(tmp_path / LABELS_FILE, np.concatenate(labels or [empty]))
+        # the offsets are written last, they mark the entry as complete
+        np.save(tmp_path / OFFSETS_FILE, offsets)
+        try:
+            os.replace(tmp_path, self.path)
+        except OSError:
+            # another run stored the same dataset concurrently
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        logger.debug("Stored processed dataset in %s", self.path)
+
+    def restore(self, data_output_dir: str | Path) -> None:
+        """Places the cached data.jsonl where instructlab-training expects it"""
+        os.makedirs(data_output_dir, exist_ok=True)
+        shutil.copyfile(self.path / DATA_FILE, Path(data_output_dir) / DATA_FILE)
+
+    def load(self) -> TokenArrayDataset:
+        return TokenArrayDataset(self.path)
+
+    def packing_params(
+        self,
+        effective_batch_size: int,
+        max_batch_len: int,
+        compute: Callable[[], tuple[int, int]],
+    ) -> tuple[int, int]:
+        """Packing max batch length and gradient accumulation, computed once per batch settings"""
+        packing_file = self.path / PACKING_FILE
+        params = {}
+        if packing_file.is_file():
+            params = json.loads(packing_file.read_text(encoding="utf-8"))
+        settings = f"{effective_batch_size}:{max_batch_len}"
+        if settings not in params:
+            params[settings] = list(compute())
+            tmp_file = packing_file.with_suffix(f".{os.getpid()}.tmp")
+            tmp_file.write_text(json.dumps(params), encoding="utf-8")
+            os.replace(tmp_file, packing_file)
+        packing_max_batch_len, accum = params[settings]
+        return packing_max_batch_len, accum
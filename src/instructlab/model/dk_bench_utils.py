@@ -5,6 +5,8 @@
 from datetime import datetime
 from typing import List
 import enum
+import hashlib
+import json
 import logging
 import os
 import pathlib
@@ -16,7 +18,6 @@ from instructlab.eval.mt_bench_common import (
 )
 from instructlab.eval.ragas import ModelConfig, RagasEvaluator
 from openai import OpenAI, OpenAIError
-from openpyxl import load_workbook  # type: ignore
 from openpyxl.styles import Border, Font, Side  # type: ignore
 from ragas.evaluation import EvaluationResult  # type: ignore
 import pandas as pd
@@ -133,18 +134,33 @@ def print_results(
     Returns:
         None
     """
+    scores = [score["domain_specific_rubrics"] for score in result.scores]
+    print_scores(scores, results_files, model_name)
+
+
+def print_scores(scores: List[int], results_files: List[str], model_name: str) -> None:
+    """
+    Prints a scoring report for DK-Bench from a list of per-question scores
+    Args:
+        scores (List[int]):        Judge score for each question, in input order.
+        results_files (List[str]): List of files with scores and responses
+        model_name (str):          Name of model that generated responses for
+                                   DK-Bench to evaluate againist reference answer.
+    Returns:
+        None
+    """
     print("\n")
     print("# DK-BENCH REPORT")
     print(f"\n## MODEL: {model_name}\n")
     total_score = 0
-    for i, score in enumerate(result.scores):
-        print(f"Question #{i+1}:     {score['domain_specific_rubrics']}/5")
-        total_score += score["domain_specific_rubrics"]
+    for i, score in enumerate(scores):
+        print(f"Question #{i+1}:     {score}/5")
+        total_score += score
 
-    average = total_score / len(result.scores)
+    average = total_score / len(scores)
     print("----------------------------")
     print(f"Average Score:   {average:.2f}/5")
-    print(f"Total Score:     {total_score}/{len(result.scores)*5}\n")
+    print(f"Total Score:     {total_score}/{len(scores)*5}\n")
 
     print("Responses and scores written to:")
     for file in results_files:
@@ -171,7 +187,30 @@ def create_excel_results_file(excel_file: str, result: EvaluationResult) -> None
     Returns:
         None
     """
-    scores = [score["domain_specific_rubrics"] for score in result.scores]
+    response_df = result.dataset.to_pandas()
+    response_df["scores"] = [
+        score["domain_specific_rubrics"] for score in result.scores
+    ]
+    write_excel_results_file(excel_file, response_df)
+
+
+def write_excel_results_file(excel_file: str, response_df: pd.DataFrame) -> None:
+    """
+    Writes the DK-Bench excel results file from a DataFrame of responses that
+    already has a 'scores' column. See create_excel_results_file for the
+    layout of the workbook.
+
+    The summary sheet is styled while the workbook is still open in the
+    writer, so the file is only written once.
+
+    Args:
+        excel_file (str):           Name of excel file to be created the summary
+                                    and dataset sheets.
+        response_df (DataFrame):    Questions, references, responses and scores.
+    Returns:
+        None
+    """
+    scores = list(response_df["scores"])
     question_indices = [f"Q{i + 1}" for i in range(len(scores))]
 
     col1 = ["Average", "Total Score", "Median", "Question"] + question_indices
@@ -184,27 +223,21 @@ def create_excel_results_file(excel_file: str, result: EvaluationResult) -> None
 
     summary_df = pd.DataFrame(summary_data)
 
-    response_df = result.dataset.to_pandas()
-    response_df["scores"] = scores
-
     with pd.ExcelWriter(excel_file, engine="openpyxl") as writer:
         # df with contents similar to those in the .jsonl and .csv output files
         response_df.to_excel(writer, sheet_name="dataset", index=False)
         summary_df.to_excel(writer, sheet_name="Summary", index=False)
 
-    # Add a visual separation for row 5 on the summary sheet before question number and scores are output.
-    wb = load_workbook(excel_file)
-    summary_sheet = wb["Summary"]
-    for cell in summary_sheet[5]:  # Row 5 (Question, Score)
-        cell.font = Font(bold=True)
-        cell.border = Border(
-            left=Side(style="thin"),
-            right=Side(style="thin"),
-            top=Side(style="thin"),
-            bottom=Side(style="thin"),
-        )
-
-    wb.save(excel_file)
+        # Add a visual separation for row 5 on the summary sheet before question number and scores are output.
+        summary_sheet = writer.sheets["Summary"]
+        for cell in summary_sheet[5]:  # Row 5 (Question, Score)
+            cell.font = Font(bold=True)
+            cell.border = Border(
+                left=Side(style="thin"),
+                right=Side(style="thin"),
+                top=Side(style="thin"),
+                bottom=Side(style="thin"),
+            )
 
 
 def write_results(
@@ -248,7 +281,7 @@ def write_results(
         elif IOFileType.CSV.value == fmt:
             response_df.to_csv(f"{results_file}", index=False)
         elif IOFileType.XLSX.value == fmt:
-            create_excel_results_file(results_file, result)
+            write_excel_results_file(results_file, response_df)
 
         results_files.append(results_file)
         logger.debug("DK-Bench responses and results written to %s", results_file)
@@ -410,3 +443,316 @@ def run_dk_bench(
         model_name = "no-model-provided"
 
     return result, model_name
+
+
+def get_partial_results_file(
+    output_dir: str, model_name: str, input_questions: pathlib.Path
+) -> pathlib.Path:
+    """
+    Returns the path of the JSONL file a streaming DK-Bench run appends scored
+    rows to. The name only depends on the model and the input questions file
+    so that an interrupted run for the same pair picks up where it stopped.
+
+    Args:
+        output_dir (str):               Output directory for results
+        model_name (str):               Name of model responses are collected from.
+        input_questions (Path):         Path to file with input questions.
+    Returns:
+        Path:                           Path of the partial results file.
+    """
+    model_results_dir = pathlib.Path(os.path.normpath(output_dir)) / model_name
+    model_results_dir.mkdir(parents=True, exist_ok=True)
+    return model_results_dir / f"partial_{input_questions.stem}.jsonl"
+
+
+def count_completed_rows(partial_results_file: pathlib.Path) -> int:
+    """
+    Counts the scored rows already present in a partial results file. A
+    trailing line that was cut off by a crash is truncated so that appending
+    can safely continue after the last complete row.
+
+    Args:
+        partial_results_file (Path):    Partial results JSONL file.
+    Returns:
+        int:                            Number of complete rows in the file.
+    """
+    if not partial_results_file.exists():
+        return 0
+
+    with open(partial_results_file, "rb+") as f:
+        content = f.read()
+        complete_length = content.rfind(b"\n") + 1
+        if complete_length != len(content):
+            logger.debug(
+                "Truncating incomplete row at the end of %s", partial_results_file
+            )
+            f.truncate(complete_length)
+
+    return content[:complete_length].count(b"\n")
+
+
+def hash_input_questions(input_questions: pathlib.Path) -> str:
+    """
+    Returns the SHA-256 of the input questions file.
+
+    Args:
+        input_questions (Path):         Path to file with input questions.
+    Returns:
+        str:                            Hex digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(input_questions, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def check_partial_results_input(
+    partial_results_file: pathlib.Path, input_questions: pathlib.Path
+) -> None:
+    """
+    Records the hash of the input questions next to the partial results file
+    and refuses to resume a partial file written for different questions,
+    since its rows are matched to the questions by position.
+
+    Args:
+        partial_results_file (Path):    Partial results JSONL file.
+        input_questions (Path):         Path to file with input questions.
+    Raises:
+        ValueError:                     The partial file was written for
+                                        another version of the questions.
+    """
+    input_hash = hash_input_questions(input_questions)
+    hash_file = partial_results_file.with_suffix(".sha256")
+    if partial_results_file.exists() and hash_file.exists():
+        recorded_hash = hash_file.read_text(encoding="utf-8").strip()
+        if recorded_hash != input_hash:
+            raise ValueError(
+                f"{partial_results_file} was written for a different version of {input_questions}. Remove it to start over."
+            )
+    hash_file.write_text(input_hash + "\n", encoding="utf-8")
+
+
+def read_input_questions(input_questions: pathlib.Path):
+    """
+    Yields the records in the input questions file one at a time.
+
+    Args:
+        input_questions (Path):         Path to file with input questions.
+    Yields:
+        dict:                           One question record.
+    """
+    with open(input_questions, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as exc:
+                raise ValueError(
+                    f"Line {line_number} of {input_questions} cannot be loaded as JSON. Please ensure it is a valid '.jsonl' file."
+                ) from exc
+
+
+def write_results_from_jsonl(
+    partial_results_file: pathlib.Path,
+    file_formats: List[str],
+    output_dir: str,
+    model_name: str,
+) -> tuple[List[str], List[int]]:
+    """
+    Turns the JSONL file written by a streaming DK-Bench run into the final
+    results files. The JSONL is parsed once and every requested format is
+    generated from that single DataFrame. The partial file is moved to the
+    final JSONL location if 'jsonl' was requested and removed otherwise.
+
+    Args:
+        partial_results_file (Path):    Partial results JSONL file.
+        file_formats (List[str]):       List of file formats of files to write results to.
+        output_dir (str):               Directory for results to be written out to
+        model_name (str):               Model name to be used in the results file name.
+    Returns:
+        List[str]:                      File names of the results files.
+        List[int]:                      Score of each question in input order.
+    """
+    response_df = pd.read_json(partial_results_file, orient="records", lines=True)
+    timestamp = datetime.now().isoformat()
+
+    results_files = []
+    for fmt in file_formats:
+        results_file = create_results_file_name(fmt, output_dir, timestamp, model_name)
+
+        if IOFileType.JSONL.value == fmt:
+            os.replace(partial_results_file, results_file)
+        elif IOFileType.CSV.value == fmt:
+            response_df.to_csv(f"{results_file}", index=False)
+        elif IOFileType.XLSX.value == fmt:
+            write_excel_results_file(results_file, response_df)
+
+        results_files.append(results_file)
+        logger.debug("DK-Bench responses and results written to %s", results_file)
+
+    partial_results_file.unlink(missing_ok=True)
+    partial_results_file.with_suffix(".sha256").unlink(missing_ok=True)
+
+    return results_files, list(response_df["scores"])
+
+
+def run_dk_bench_streaming(
+    serve_config: _serve,
+    tls_insecure: bool,
+    tls_client_cert: str,
+    tls_client_key: str,
+    tls_client_passwd: str,
+    model: str,
+    max_workers: str | int | None,
+    gpus: int | None,
+    backend: str | None,
+    enable_serving_output: bool,
+    input_questions: str,
+    system_prompt: str,
+    temperature: float,
+    judge_model_name: str,
+    output_dir: str,
+) -> tuple[pathlib.Path, str]:
+    """
+    Runs DK-Bench one question at a time. Each question is answered (when the
+    input has no responses) and judged on its own, and the scored row is
+    appended to a partial JSONL file as soon as it is available. If the
+    partial file already exists from an interrupted run, the questions it
+    already covers are skipped.
+
+    Args:
+        See run_dk_bench for the shared arguments.
+        output_dir (str):                Directory the partial results file
+                                         is written to.
+    Returns:
+        partial_results_file (Path):     JSONL file with one scored row per
+                                         question.
+        model_name (str):                Model name of model responses were collected
+                                         from.
+    """
+    if "OPENAI_API_KEY" not in os.environ:
+        raise EnvironmentError(
+            "Environment variable 'OPENAI_API_KEY' must be set to run the Judge model in DK-Bench."
+        )
+    judge_openai_api_key = os.environ["OPENAI_API_KEY"]
+
+    if not is_judge_model_name_valid(judge_model_name, judge_openai_api_key):
+        raise ValueError("Judge model name must be a valid OpenAI GPT model")
+
+    input_questions_path = pathlib.Path(input_questions).resolve()
+    validate_input_questions(input_questions_path)
+
+    # mirror run_dk_bench: responses are only collected when no record has one
+    get_responses_from_model = not any(
+        "response" in question
+        for question in read_input_questions(input_questions_path)
+    )
+    if get_responses_from_model:
+        validate_model(model)
+        model_name = get_local_model_name(model)
+    else:
+        logger.info(
+            "Input file %s already contains responses for evaluation. Responses from %s will not be collected for this file.",
+            input_questions_path,
+            model,
+        )
+        model_name = "no-model-provided"
+
+    partial_results_file = get_partial_results_file(
+        output_dir, model_name, input_questions_path
+    )
+    check_partial_results_input(partial_results_file, input_questions_path)
+    completed = count_completed_rows(partial_results_file)
+    if completed:
+        logger.info(
+            "Resuming DK-Bench from %s: %d questions already scored",
+            partial_results_file,
+            completed,
+        )
+
+    evaluator = RagasEvaluator(
+        judge_model_name=judge_model_name, judge_openai_api_key=judge_openai_api_key
+    )
+    server = None
+    try:
+        if get_responses_from_model:
+            server, api_base, _ = launch_server(
+                eval_serve=serve_config,
+                tls_insecure=tls_insecure,
+                tls_client_cert=tls_client_cert,
+                tls_client_key=tls_client_key,
+                tls_client_passwd=tls_client_passwd,
+                model=model,
+                model_name=model_name,
+                max_workers=max_workers,
+                gpus=gpus,
+                backend=backend,
+                enable_serving_output=enable_serving_output,
+            )
+            evaluator.student_openai_client = get_local_openai_client(
+                model_api_base=api_base, api_key=None
+            )
+            evaluator.student_model = ModelConfig(
+                model_name=model_name,
+                temperature=temperature,
+                system_prompt=system_prompt,
+            )
+
+        with open(partial_results_file, "a", encoding="utf-8") as f:
+            for i, question in enumerate(read_input_questions(input_questions_path)):
+                if i < completed:
+                    continue
+                result = evaluator.run(dataset=[question])
+                row_df = result.dataset.to_pandas()
+                row_df["model_name"] = model_name
+                row_df["scores"] = [
+                    score["domain_specific_rubrics"] for score in result.scores
+                ]
+                row_df["timestamp"] = datetime.now().isoformat()
+                f.write(
+                    row_df.to_json(orient="records", lines=True).rstrip("\n") + "\n"
+                )
+                f.flush()
+                os.fsync(f.fileno())
+                logger.debug(
+                    "DK-Bench question #%d scored %s", i + 1, row_df["scores"][0]
+                )
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    return partial_results_file, model_name
+
+
+def generate_responses(
+    openai_client: OpenAI, model_config: ModelConfig, questions: List[dict]
+) -> List[dict]:
+    """
+    Collects a response from the student model for each question, the same
+    way RagasEvaluator does, so that answer generation can be decoupled from
+    judging.
+
+    Args:
+        openai_client (OpenAI):         Client for the served student model.
+        model_config (ModelConfig):     Student model name, system prompt
+                                        and sampling settings.
+        questions (List[dict]):         Records with 'user_input' and 'reference'.
+    Returns:
+        List[dict]:                     Copies of the records with a 'response'.
+    """
+    samples = []
+    for question in questions:
+        response = openai_client.chat.completions.create(
+            messages=[
+                {"role": "system", "content": model_config.system_prompt},
+                {"role": "user", "content": question["user_input"]},
+            ],
+            model=model_config.model_name,
+            seed=model_config.seed,
+            max_tokens=model_config.max_tokens,
+            temperature=model_config.temperature,
+        )
+        samples.append({**question, "response": response.choices[0].message.content})
+    return samples
@@ -17,6 +17,7 @@ from instructlab.utils import get_model_arch, get_sysprompt
 # Local
 from ..client_utils import http_client
 from ..utils import is_model_gguf, is_model_safetensors
+from .mmlu_cache import MMLURequestCache
 
 logger = logging.getLogger(__name__)
 
@@ -58,6 +59,7 @@ def evaluate_model(
     output_file_formats,
     system_prompt,
     temperature,
+    streaming: bool = False,
 ):
     """Evaluates a trained model"""
 
@@ -109,10 +111,10 @@ def evaluate_model(
             api_base, max_workers=max_workers, serving_gpus=effective_gpus
         )
 
+    mmlu_cache = MMLURequestCache()
+
     def evaluator_run(evaluator, api_base):
-        if api_base is None:
-            return evaluator.run()
-        return evaluator.run(api_base)
+        return mmlu_cache.run(evaluator, api_base)
 
     try:
         # get appropriate evaluator class from Eval lib
@@ -136,9 +138,12 @@ def evaluate_model(
             # First Party
             from instructlab.model.dk_bench_utils import (
                 print_results,
+                print_scores,
                 run_dk_bench,
+                run_dk_bench_streaming,
                 validate_output_file_formats,
                 write_results,
+                write_results_from_jsonl,
             )
 
             # turn output_file_formats into a list to be passed into write_results
@@ -151,7 +156,7 @@ def evaluate_model(
                 model_path = pathlib.Path(model)
                 system_prompt = get_sysprompt(get_model_arch(model_path))
 
-            result, model_name = run_dk_bench(
+            dk_bench_args = (
                 serve_config,
                 tls_insecure,
                 tls_client_cert,
@@ -170,8 +175,18 @@ def evaluate_model(
 
             # default for output_dir is set by Click in src/instructlab/cli/model/evaluate.py
             # it is a string not a pathlib.Path
-            files = write_results(result, file_formats, output_dir, model_name)
-            print_results(result, files, model_name)
+            if streaming:
+                partial_results_file, model_name = run_dk_bench_streaming(
+                    *dk_bench_args, output_dir
+                )
+                files, scores = write_results_from_jsonl(
+                    partial_results_file, file_formats, output_dir, model_name
+                )
+                print_scores(scores, files, model_name)
+            else:
+                result, model_name = run_dk_bench(*dk_bench_args)
+                files = write_results(result, file_formats, output_dir, model_name)
+                print_results(result, files, model_name)
 
             logger.info("ᕦ(òᴗóˇ)ᕤ Model Evaluation with DK-Bench completed! ᕦ(òᴗóˇ)ᕤ")
 
@@ -445,6 +460,8 @@ def evaluate_model(
             display_branch_eval_summary(
                 Benchmark.MMLU_BRANCH, improvements, regressions, no_changes
             )
+            if mmlu_cache.hits:
+                logger.info(mmlu_cache.report())
             logger.info("\nᕦ(òᴗóˇ)ᕤ Model evaluate with MMLUBranch completed! ᕦ(òᴗóˇ)ᕤ")
     except EvalError as ee:
         print(ee.message)
@@ -756,13 +773,17 @@ def launch_server(
     gpus: int | None,
     backend: str | None,
     enable_serving_output: bool,
+    served_model_aliases: tuple[str, ...] = (),
+    env: dict[str, str] | None = None,
 ) -> tuple:
     eval_serve.backend = backend = get_backend(backend, model)
 
     effective_gpus = 0
     if backend == backends.VLLM:
         eval_serve.vllm.vllm_args = eval_serve.vllm.vllm_args or []
-        eval_serve.vllm.vllm_args.extend(["--served-model-name", model_name])
+        eval_serve.vllm.vllm_args.extend(
+            ["--served-model-name", model_name, *served_model_aliases]
+        )
 
         # First Party
         from instructlab.model.backends.vllm import contains_argument
@@ -814,6 +835,12 @@ def launch_server(
     eval_serve.model_path = model
 
     backend_instance = backends.select_backend(eval_serve, backend)
+    if env is not None:
+        if backend == backends.VLLM:
+            # the server process gets this environment instead of ours
+            backend_instance.env = env
+        else:
+            logger.debug(f"Ignoring the server environment for {backend} serving")
     try:
         # http_client is handling tls params
         api_base = backend_instance.run_detached(
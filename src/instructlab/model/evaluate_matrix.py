@@ -0,0 +1,549 @@
+# SPDX-License-Identifier: Apache-2.0
+
+# pylint: disable=ungrouped-imports
+# Standard
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+import contextlib
+import json
+import logging
+import os
+import pathlib
+import threading
+import time
+
+# First Party
+from instructlab.configuration import _serve
+from instructlab.utils import get_model_arch, get_sysprompt, print_table
+
+# Local
+from .evaluate import (
+    Benchmark,
+    get_benchmark_max_score,
+    get_model_name,
+    launch_server,
+    validate_model,
+    validate_output_dir,
+)
+from .mmlu_cache import MMLURequestCache
+
+logger = logging.getLogger(__name__)
+
+# benchmarks that score a single model; the *_branch benchmarks compare a
+# model against a base model and are run with `ilab model evaluate`
+MATRIX_BENCHMARKS = (Benchmark.MMLU, Benchmark.MT_BENCH, Benchmark.DK_BENCH)
+
+
+@dataclass
+class MatrixResult:
+    model: str
+    benchmark: str
+    score: float | None = None
+    max_score: str = ""
+    error: str | None = None
+    results_files: list[str] = field(default_factory=list)
+
+
+@dataclass
+class ModelTiming:
+    model: str
+    load_seconds: float = 0.0
+    generate_seconds: float = 0.0
+    judge_seconds: float = 0.0
+
+    @property
+    def total_seconds(self) -> float:
+        return self.load_seconds + self.generate_seconds + self.judge_seconds
+
+
+def plan_model_runs(models: list[str]) -> list[str]:
+    """Returns the models in the order their servers are launched.
+
+    Every benchmark that needs a model served runs against one launch of that
+    model, so each distinct model is loaded exactly once.
+    """
+    planned: list[str] = []
+    for model in models:
+        if model not in planned:
+            planned.append(model)
+    return planned
+
+
+def evaluate_matrix(
+    serve_config: _serve,
+    models: list[str],
+    benchmarks: list[str],
+    output_dir: str,
+    judge_model: str | None,
+    judge_endpoint: str | None,
+    judge_backend: str | None,
+    dk_bench_judge_model: str,
+    dk_bench_output_dir: str,
+    mt_bench_output_dir: str,
+    max_workers: str | int,
+    judge_workers: int,
+    few_shots: int,
+    batch_size: str | int,
+    input_questions: str | None,
+    output_file_formats: str,
+    temperature: float,
+    merge_system_user_message: bool,
+    gpus: int | None,
+    backend: str | None,
+    tls_insecure: bool,
+    tls_client_cert: str,
+    tls_client_key: str,
+    tls_client_passwd: str,
+    enable_serving_output: bool,
+) -> pathlib.Path:
+    """Evaluates every model against every benchmark and writes one report
+
+    Each model is served once and all of its answers are generated against
+    that server. Judging does not need the model any more, so it is handed to
+    a pool of judge workers and overlaps with answer generation of the next
+    model whenever the judge does not compete with it for the serving
+    hardware: always for DK-Bench (remote OpenAI judge) and for MT-Bench when
+    --judge-endpoint points at an already running judge. Without an endpoint
+    the local MT-Bench judge is launched once after all answers exist.
+
+    Returns the path of the consolidated JSON report.
+    """
+    # Third Party
+    from instructlab.eval.exceptions import EvalError
+
+    with contextlib.suppress(ValueError):
+        max_workers = int(max_workers)
+    with contextlib.suppress(ValueError):
+        batch_size = int(batch_size)
+
+    selected = [Benchmark(b) for b in benchmarks]
+    planned_models = plan_model_runs(models)
+    validate_matrix_options(
+        planned_models, selected, judge_model, judge_endpoint, input_questions
+    )
+    validate_output_dir(output_dir)
+
+    # resolved once per model, not once per (model, benchmark)
+    system_prompts = {
+        model: get_sysprompt(get_model_arch(pathlib.Path(model)))
+        for model in planned_models
+    }
+
+    questions: list[dict] = []
+    file_formats: list[str] = []
+    if Benchmark.DK_BENCH in selected:
+        # First Party
+        from instructlab.model.dk_bench_utils import (
+            read_input_questions,
+            validate_input_questions,
+            validate_output_file_formats,
+        )
+
+        if "OPENAI_API_KEY" not in os.environ:
+            raise EnvironmentError(
+                "Environment variable 'OPENAI_API_KEY' must be set to run the Judge model in DK-Bench."
+            )
+        file_formats = output_file_formats.split(",")
+        validate_output_file_formats(file_formats)
+        assert input_questions is not None
+        input_questions_path = pathlib.Path(input_questions).resolve()
+        validate_input_questions(input_questions_path)
+        # the benchmark data is read once and shared by every model
+        questions = list(read_input_questions(input_questions_path))
+
+    timings = {model: ModelTiming(model) for model in planned_models}
+    results: list[MatrixResult] = []
+    judge_jobs: list[tuple[MatrixResult, Future]] = []
+    deferred_mt_bench = []
+
+    # judge times of a model are added by the judge pool and the local judge
+    timings_lock = threading.Lock()
+
+    def timed_judge(model, func, *args, **kwargs):
+        start = time.monotonic()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.monotonic() - start
+            with timings_lock:
+                timings[model].judge_seconds += elapsed
+
+    with ThreadPoolExecutor(max_workers=judge_workers) as judge_pool:
+        for model in planned_models:
+            model_name = get_model_name(model)
+            logger.info("Evaluating %s on %s", model, ", ".join(selected))
+
+            start = time.monotonic()
+            try:
+                server, api_base, effective_gpus = launch_server(
+                    # launch_server modifies the serve config it is given
+                    eval_serve=serve_config.model_copy(deep=True),
+                    tls_insecure=tls_insecure,
+                    tls_client_cert=tls_client_cert,
+                    tls_client_key=tls_client_key,
+                    tls_client_passwd=tls_client_passwd,
+                    model=model,
+                    model_name=model_name,
+                    max_workers=max_workers,
+                    gpus=gpus,
+                    backend=backend,
+                    enable_serving_output=enable_serving_output,
+                    # MMLU addresses the served model by its path
+                    served_model_aliases=(model,),
+                )
+            except RuntimeError as exc:
+                # keep going so one broken candidate does not void the matrix
+                results.extend(
+                    MatrixResult(
+                        model,
+                        benchmark.value,
+                        max_score=get_max_score(benchmark),
+                        error=str(exc),
+                    )
+                    for benchmark in selected
+                )
+                continue
+            finally:
+                timings[model].load_seconds = time.monotonic() - start
+
+            start = time.monotonic()
+            try:
+                for benchmark in selected:
+                    result = MatrixResult(
+                        model, benchmark.value, max_score=get_max_score(benchmark)
+                    )
+                    results.append(result)
+                    try:
+                        if benchmark == Benchmark.MMLU:
+                            result.score = run_mmlu(
+                                model,
+                                api_base,
+                                few_shots,
+                                batch_size,
+                                system_prompts[model],
+                            )
+                        elif benchmark == Benchmark.MT_BENCH:
+                            # Third Party
+                            from instructlab.eval.mt_bench import MTBenchEvaluator
+
+                            assert judge_model is not None
+                            evaluator = MTBenchEvaluator(
+                                model_name,
+                                get_model_name(judge_model),
+                                mt_bench_output_dir,
+                                merge_system_user_message=merge_system_user_message,
+                            )
+                            evaluator.gen_answers(
+                                api_base,
+                                max_workers=max_workers,
+                                serving_gpus=effective_gpus,
+                            )
+                            if judge_endpoint is not None:
+                                judge_jobs.append(
+                                    (
+                                        result,
+                                        judge_pool.submit(
+                                            timed_judge,
+                                            model,
+                                            judge_mt_bench,
+                                            evaluator,
+                                            judge_endpoint,
+                                            max_workers,
+                                        ),
+                                    )
+                                )
+                            else:
+                                deferred_mt_bench.append((result, evaluator))
+                        elif benchmark == Benchmark.DK_BENCH:
+                            samples = generate_dk_bench_responses(
+                                api_base,
+                                model_name,
+                                questions,
+                                system_prompts[model],
+                                temperature,
+                            )
+                            judge_jobs.append(
+                                (
+                                    result,
+                                    judge_pool.submit(
+                                        timed_judge,
+                                        model,
+                                        judge_dk_bench,
+                                        samples,
+                                        dk_bench_judge_model,
+                                        file_formats,
+                                        dk_bench_output_dir,
+                                        model_name,
+                                    ),
+                                )
+                            )
+                    except EvalError as ee:
+                        result.error = ee.message
+                        logger.debug("Traceback", exc_info=True)
+                    except Exception as exc:  # pylint: disable=broad-exception-caught
+                        # one failing benchmark must not lose the rest of the matrix
+                        result.error = str(exc)
+                        logger.debug("Traceback", exc_info=True)
+            finally:
+                server.shutdown()
+                timings[model].generate_seconds = time.monotonic() - start
+
+        if deferred_mt_bench:
+            assert judge_model is not None
+            judge_mt_bench_locally(
+                deferred_mt_bench,
+                timings,
+                timings_lock,
+                serve_config,
+                judge_model,
+                judge_backend,
+                max_workers,
+                gpus,
+                tls_insecure,
+                tls_client_cert,
+                tls_client_key,
+                tls_client_passwd,
+                enable_serving_output,
+            )
+
+        for result, future in judge_jobs:
+            try:
+                result.score, result.results_files = future.result()
+            except EvalError as ee:
+                result.error = ee.message
+            except Exception as exc:  # pylint: disable=broad-exception-caught
+                # a judge failure for one model must not lose the other results
+                logger.debug("Traceback", exc_info=True)
+                result.error = str(exc)
+
+    report_file = write_matrix_report(output_dir, results, list(timings.values()))
+    print_matrix_report(results, list(timings.values()), report_file)
+    return report_file
+
+
+def validate_matrix_options(
+    models: list[str],
+    benchmarks: list[Benchmark],
+    judge_model: str | None,
+    judge_endpoint: str | None,
+    input_questions: str | None,
+) -> None:
+    """Validates the models and the options the selected benchmarks require"""
+    if not models:
+        raise ValueError("At least one model must be passed with --models")
+    if not benchmarks:
+        raise ValueError("At least one benchmark must be passed with --benchmarks")
+
+    if Benchmark.MT_BENCH in benchmarks and judge_model is None:
+        raise ValueError(
+            f"Benchmark {Benchmark.MT_BENCH.value} requires the following args to be set: ['judge-model']"
+        )
+    if Benchmark.DK_BENCH in benchmarks and input_questions is None:
+        raise ValueError(
+            f"Benchmark {Benchmark.DK_BENCH.value} requires the following args to be set: ['input-questions']"
+        )
+
+    for model in models:
+        validate_model(model, allow_gguf=Benchmark.MMLU not in benchmarks)
+    if Benchmark.MT_BENCH in benchmarks and judge_endpoint is None:
+        assert judge_model is not None
+        validate_model(judge_model, "--judge-model")
+
+
+def get_max_score(benchmark: Benchmark) -> str:
+    if benchmark == Benchmark.DK_BENCH:
+        return "5.0"
+    return get_benchmark_max_score(benchmark)
+
+
+def run_mmlu(
+    model: str,
+    api_base: str,
+    few_shots: int,
+    batch_size: str | int,
+    system_prompt: str | None,
+) -> float:
+    # Third Party
+    from instructlab.eval.mmlu import MMLU_TASKS, MMLUEvaluator
+
+    tasks = MMLU_TASKS
+    if os.environ.get("INSTRUCTLAB_EVAL_MMLU_MIN_TASKS") is not None:
+        tasks = tasks[:4]
+
+    evaluator = MMLUEvaluator(
+        model,
+        tasks=tasks,
+        few_shots=few_shots,
+        batch_size=batch_size,
+        system_prompt=system_prompt,
+    )
+    overall_score, _ = MMLURequestCache().run(evaluator, api_base)
+    return overall_score
+
+
+def judge_mt_bench(evaluator, judge_api_base: str, max_workers: str | int):
+    overall_score, _, _, _ = evaluator.judge_answers(
+        judge_api_base, max_workers=max_workers
+    )
+    return overall_score, []
+
+
+def judge_mt_bench_locally(
+    deferred: list,
+    timings: dict[str, ModelTiming],
+    timings_lock: threading.Lock,
+    serve_config: _serve,
+    judge_model: str,
+    judge_backend: str | None,
+    max_workers: str | int,
+    gpus: int | None,
+    tls_insecure: bool,
+    tls_client_cert: str,
+    tls_client_key: str,
+    tls_client_passwd: str,
+    enable_serving_output: bool,
+) -> None:
+    """Launches the local judge once and judges every model's MT-Bench answers"""
+    # Third Party
+    from instructlab.eval.exceptions import EvalError
+
+    server, judge_api_base, effective_gpus = launch_server(
+        eval_serve=serve_config.model_copy(deep=True),
+        tls_insecure=tls_insecure,
+        tls_client_cert=tls_client_cert,
+        tls_client_key=tls_client_key,
+        tls_client_passwd=tls_client_passwd,
+        model=judge_model,
+        model_name=get_model_name(judge_model),
+        max_workers=max_workers,
+        gpus=gpus,
+        backend=judge_backend,
+        enable_serving_output=enable_serving_output,
+    )
+    try:
+        for result, evaluator in deferred:
+            start = time.monotonic()
+            try:
+                result.score, _, _, _ = evaluator.judge_answers(
+                    judge_api_base,
+                    max_workers=max_workers,
+                    serving_gpus=effective_gpus,
+                )
+            except EvalError as ee:
+                result.error = ee.message
+            except Exception as exc:  # pylint: disable=broad-exception-caught
+                logger.debug("Traceback", exc_info=True)
+                result.error = str(exc)
+            finally:
+                elapsed = time.monotonic() - start
+                with timings_lock:
+                    timings[result.model].judge_seconds += elapsed
+    finally:
+        server.shutdown()
+
+
+def generate_dk_bench_responses(
+    api_base: str,
+    model_name: str,
+    questions: list[dict],
+    system_prompt: str,
+    temperature: float,
+) -> list[dict]:
+    # Third Party
+    from instructlab.eval.mt_bench_common import (
+        get_openai_client as get_local_openai_client,
+    )
+    from instructlab.eval.ragas import ModelConfig
+
+    # First Party
+    from instructlab.model.dk_bench_utils import generate_responses
+
+    openai_client = get_local_openai_client(model_api_base=api_base, api_key=None)
+    model_config = ModelConfig(
+        model_name=model_name,
+        temperature=temperature,
+        system_prompt=system_prompt,
+    )
+    return generate_responses(openai_client, model_config, questions)
+
+
+def judge_dk_bench(
+    samples: list[dict],
+    judge_model_name: str,
+    file_formats: list[str],
+    output_dir: str,
+    model_name: str,
+) -> tuple[float, list[str]]:
+    # Third Party
+    from instructlab.eval.ragas import RagasEvaluator
+
+    # First Party
+    from instructlab.model.dk_bench_utils import write_results
+
+    result = RagasEvaluator().run(
+        dataset=samples,
+        judge_model_name=judge_model_name,
+        judge_openai_api_key=os.environ["OPENAI_API_KEY"],
+    )
+    scores = [score["domain_specific_rubrics"] for score in result.scores]
+    results_files = write_results(result, file_formats, output_dir, model_name)
+    return sum(scores) / len(scores), results_files
+
+
+def write_matrix_report(
+    output_dir: str, results: list[MatrixResult], timings: list[ModelTiming]
+) -> pathlib.Path:
+    report_file = pathlib.Path(output_dir) / f"matrix_{datetime.now().isoformat()}.json"
+    report = {
+        "results": [asdict(result) for result in results],
+        "timings": [
+            {**asdict(timing), "total_seconds": timing.total_seconds}
+            for timing in timings
+        ],
+    }
+    with open(report_file, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    return report_file
+
+
+def print_matrix_report(
+    results: list[MatrixResult], timings: list[ModelTiming], report_file: pathlib.Path
+) -> None:
+    print("# EVALUATION MATRIX REPORT\n")
+    benchmarks = list(dict.fromkeys(result.benchmark for result in results))
+    rows = []
+    for timing in timings:
+        row = [timing.model]
+        for benchmark in benchmarks:
+            cell = "-"
+            for result in results:
+                if result.model != timing.model or result.benchmark != benchmark:
+                    continue
+                if result.error is not None:
+                    cell = "error"
+                elif result.score is not None:
+                    cell = f"{round(result.score, 2)}/{result.max_score}"
+            row.append(cell)
+        rows.append(row)
+    print_table(["Model"] + benchmarks, rows)
+
+    print("\n## TIMING (seconds)\n")
+    print_table(
+        ["Model", "Load", "Generate", "Judge", "Total"],
+        [
+            [
+                timing.model,
+                f"{timing.load_seconds:.1f}",
+                f"{timing.generate_seconds:.1f}",
+                f"{timing.judge_seconds:.1f}",
+                f"{timing.total_seconds:.1f}",
+            ]
+            for timing in timings
+        ],
+    )
+
+    for result in results:
+        if result.error is not None:
+            print(f"\n{result.model} / {result.benchmark}: {result.error}")
+    print(f"\nReport written to {report_file}")
@@ -1,30 +1,74 @@
 # Standard
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from copy import copy
 from functools import partial
 from pathlib import Path
+import contextlib
+import itertools
+import json
 import logging
 import math
+import multiprocessing
 import os
+import random
+import shutil
+import time
 
 # Third Party
 from instructlab_quantize import run_quantize
 from tqdm import tqdm
 from transformers import Adafactor, AutoConfig, AutoModelForCausalLM
-import numpy as np
 import psutil
 
 # First Party
 from instructlab.llamacpp import llamacpp_convert_to_gguf
+from instructlab.train.autotune import CPUAutoTuner, tuning_key
+from instructlab.train.telemetry import TelemetryOptions, TrainingTelemetry
 from instructlab.utils import is_macos_with_m_chip
 
-logger = logging.getLogger(__name__)
+# Local
+from .dataset_cache import ProcessedDatasetCache
 
+logger = logging.getLogger(__name__)
 
-def train(train_args, device, optimize_memory):
+# timed training steps and loaded batches per auto-tune trial
+AUTOTUNE_TRIAL_STEPS = 2
+AUTOTUNE_LOADER_BATCHES = 8
+# timed training steps comparing the CPU performance mode to eager float32
+PERFORMANCE_PROBE_STEPS = 2
+
+
+def train(
+    train_args,
+    device,
+    optimize_memory,
+    async_checkpointing=False,
+    padding_free=False,
+    telemetry: TelemetryOptions | None = None,
+    autotune=False,
+    cpu_performance=False,
+    checkpoint_interval=0,
+    keep_checkpoints=2,
+    resume=False,
+):
     """
     train runs a CPU and MacOS optimized version of full fine tuning.
     Adafactor is the optimizer of choice and the multiprocessing method is set to spawn.
     Dataloading functions imported from the training library.
+    With async_checkpointing, checkpoints are written as safetensors and their GGUF
+    conversion and quantization run in a background process while training continues.
+    With padding_free, the samples of a batch are packed into a single sequence
+    instead of being padded to the longest one.
+    With telemetry, the data wait, forward, backward and optimizer time, tokens/sec
+    and memory of every step are written to telemetry.jsonl in the checkpoint dir.
+    With autotune, the intra-op threads, micro-batch length and dataloader workers
+    are picked by short timed trials, or taken from the profile saved for this host and model.
+    With cpu_performance on CPU, batches are padded to a few fixed lengths, the model is
+    wrapped with torch.compile and runs under bf16 autocast where the CPU supports it.
+    With checkpoint_interval, the model, optimizer, RNG and data position are saved every
+    that many optimizer steps, keeping the last keep_checkpoints, and resume continues
+    from the latest of them.
     """
 
     # pylint: disable=no-name-in-module
@@ -40,15 +84,25 @@ def train(train_args, device, optimize_memory):
     from torch.utils.data import DataLoader
     import torch
 
-    dp.main(
-        config.DataProcessArgs(
-            data_output_path=train_args.data_output_dir,
-            model_path=train_args.model_path,
-            data_path=train_args.data_path,
-            max_seq_len=train_args.max_seq_len,
-            chat_tmpl_path=train_args.chat_tmpl_path,
-        )
+    dataset_cache = ProcessedDatasetCache(
+        data_path=train_args.data_path,
+        model_path=train_args.model_path,
+        chat_tmpl_path=train_args.chat_tmpl_path,
+        max_seq_len=train_args.max_seq_len,
     )
+    if dataset_cache.exists():
+        logger.info(f"Using processed dataset from cache: {dataset_cache.path}")
+    else:
+        dp.main(
+            config.DataProcessArgs(
+                data_output_path=train_args.data_output_dir,
+                model_path=train_args.model_path,
+                data_path=train_args.data_path,
+                max_seq_len=train_args.max_seq_len,
+                chat_tmpl_path=train_args.chat_tmpl_path,
+            )
+        )
+        dataset_cache.store(os.path.join(train_args.data_output_dir, "data.jsonl"))
 
     # load chat template based on path in the args
     CHAT_TEMPLATE, SPECIAL_TOKENS = utils.retrieve_chat_template(
@@ -60,49 +114,13 @@ def train(train_args, device, optimize_memory):
     )
 
     # setup the dataset and place it in data.jsonl, this needs to be used for training NOT the jsonl produced by sdg
-    dataset = token_dataset.setup_dataset(
-        os.path.join(train_args.data_output_dir, "data.jsonl"),
-    )
-
-    # based on the length of the dataset, figure out the max batch len
-    packing_max_batch_len, accum = (
-        multipack_sampler.find_packing_max_batch_len_and_grad_accum(
-            num_gpus=1,
-            avg_sample_len=dataset.get_lengths().mean(),
-            effective_batch_size=train_args.effective_batch_size,
-            max_batch_len_per_gpu=train_args.max_batch_len,
-            is_padding=False,
-            dataset=dataset,
-            seed=47,
+    if dataset_cache.exists():
+        dataset = dataset_cache.load()
+    else:
+        dataset = token_dataset.setup_dataset(
+            os.path.join(train_args.data_output_dir, "data.jsonl"),
         )
-    )
-
-    collate_fn = partial(pad_collate_fn, pad_token_id=tokenizer.pad_token_id)
-
-    # use a multipack sampler since this is a non-dist. scenario, training library defaults to this as well
-    sampler = multipack_sampler.MultipackDistributedBatchSampler(
-        batch_max_length=packing_max_batch_len,
-        lengths=dataset.get_lengths(),
-        num_replicas=1,
-        rank=0,
-        seed=47,
-        padding=True,
-    )
-    sampler = {"batch_sampler": sampler}
 
-    # 4 workers for the dataloader as compared to the original 8 to optimize performance
-    # this dataloader needs a spawn multiproc method to optimize memory and to work on Apple Silicon.
-    dataloader = DataLoader(
-        dataset,
-        **sampler,
-        num_workers=4,
-        collate_fn=collate_fn,
-    )
-    dataloader.multiprocessing_context = "spawn"
-
-    logger.info(
-        f"avg_sample_len: {dataset.get_lengths().mean()}\n effective_batch_size: {train_args.effective_batch_size}\n max_batch_len: {train_args.max_batch_len}\n packing_max_batch_len: {packing_max_batch_len} \n grad_accum: {accum}\n  num_batches: {len(dataloader)}\n avg_samples_per_batch: {len(dataset) / len(dataloader)}"
-    )
     # set device based off argument given
     dev = torch.device(device)
 
@@ -178,6 +196,203 @@ def train(train_args, device, optimize_memory):
 
     model.train()
 
+    def packing_params(max_batch_len):
+        # based on the length of the dataset, figure out the max batch len
+        find_packing_params = partial(
+            multipack_sampler.find_packing_max_batch_len_and_grad_accum,
+            num_gpus=1,
+            avg_sample_len=dataset.get_lengths().mean(),
+            effective_batch_size=train_args.effective_batch_size,
+            max_batch_len_per_gpu=max_batch_len,
+            is_padding=False,
+            dataset=dataset,
+            seed=47,
+        )
+        if dataset_cache.exists():
+            return dataset_cache.packing_params(
+                train_args.effective_batch_size,
+                max_batch_len,
+                find_packing_params,
+            )
+        return find_packing_params()
+
+    def make_dataloader(
+        max_batch_len, num_workers, bucket_lengths=None, bucket_rows=None
+    ):
+        packing_max_batch_len, accum = packing_params(max_batch_len)
+        if padding_free:
+            collate_fn = partial(
+                packed_collate_fn,
+                bucket_lengths=bucket_lengths,
+                pad_token_id=tokenizer.pad_token_id or 0,
+            )
+        else:
+            collate_fn = partial(
+                pad_collate_fn,
+                pad_token_id=tokenizer.pad_token_id,
+                bucket_lengths=bucket_lengths,
+                bucket_rows=bucket_rows,
+            )
+        # use a multipack sampler since this is a non-dist. scenario, training library defaults to this as well
+        sampler = multipack_sampler.MultipackDistributedBatchSampler(
+            batch_max_length=packing_max_batch_len,
+            lengths=dataset.get_lengths(),
+            num_replicas=1,
+            rank=0,
+            seed=47,
+            padding=not padding_free,
+        )
+        dataloader = DataLoader(
+            dataset,
+            batch_sampler=ResumableBatchSampler(sampler),
+            num_workers=num_workers,
+            collate_fn=collate_fn,
+        )
+        if num_workers > 0:
+            # this dataloader needs a spawn multiproc method to optimize memory and to work on Apple Silicon.
+            dataloader.multiprocessing_context = "spawn"
+        return dataloader, packing_max_batch_len, accum
+
+    # 4 workers for the dataloader as compared to the original 8 to optimize performance
+    max_batch_len, num_workers = train_args.max_batch_len, 4
+    if autotune:
+        if dev.type == "cpu":
+            profile = _autotune(train_args, model, dev, make_dataloader, padding_free)
+            max_batch_len, num_workers = profile.micro_batch, profile.num_workers
+        else:
+            logger.warning(f"Auto-tuning is only supported on CPU, not {dev.type}")
+
+    bucket_lengths, bucket_rows = None, None
+    if cpu_performance:
+        if dev.type == "cpu":
+            # batches are padded to a few fixed lengths so that the compiled
+            # model isn't recompiled for every new batch shape
+            bucket_lengths = length_buckets(
+                packing_params(max_batch_len)[0]
+                if padding_free
+                else train_args.max_seq_len
+            )
+            if not padding_free:
+                # the multipack sampler fits more short samples than long ones
+                # into a padded batch, so its number of rows is bucketed too
+                bucket_rows = row_buckets(
+                    packing_params(max_batch_len)[0] // int(dataset.get_lengths().min())
+                )
+        else:
+            logger.warning(
+                f"The CPU performance mode is only supported on CPU, not {dev.type}"
+            )
+    dataloader, packing_max_batch_len, accum = make_dataloader(
+        max_batch_len, num_workers, bucket_lengths, bucket_rows
+    )
+
+    step_checkpoints, resume_state = None, None
+    if checkpoint_interval or resume:
+        step_checkpoints = StepCheckpoints(
+            train_args.ckpt_output_dir,
+            keep=keep_checkpoints,
+            # batch offsets only mean something for the same batches
+            layout={
+                "packing_max_batch_len": int(packing_max_batch_len),
+                "grad_accum": int(accum),
+                "num_batches": len(dataloader),
+                "padding_free": padding_free,
+                "bucket_lengths": bucket_lengths,
+            },
+        )
+        latest = step_checkpoints.latest()
+        if resume and latest is not None:
+            resume_state = step_checkpoints.load(latest, model, optimizer)
+            logger.info(
+                f"Resuming from {latest}: epoch {resume_state['epoch']}, batch {resume_state['batch']}"
+            )
+        elif resume:
+            logger.info(
+                f"No step checkpoint found in {step_checkpoints.dir}, training from the beginning"
+            )
+        else:
+            # checkpoints of an earlier run must not be mistaken for this one's
+            step_checkpoints.clear()
+
+    step_model, autocast_dtype, baseline_tokens_per_sec = model, None, None
+    if bucket_lengths:
+        probe_batches = list(
+            itertools.islice(
+                make_dataloader(max_batch_len, 0, bucket_lengths, bucket_rows)[0],
+                PERFORMANCE_PROBE_STEPS + 1,
+            )
+        )
+        step_model, autocast_dtype, baseline_tokens_per_sec = _enable_cpu_performance(
+            model, probe_batches, dev, len(bucket_lengths) * len(bucket_rows or [1])
+        )
+
+    logger.info(
+        f"avg_sample_len: {dataset.get_lengths().mean()}\n effective_batch_size: {train_args.effective_batch_size}\n max_batch_len: {max_batch_len}\n packing_max_batch_len: {packing_max_batch_len} \n grad_accum: {accum}\n  num_batches: {len(dataloader)}\n avg_samples_per_batch: {len(dataset) / len(dataloader)}\n num_workers: {num_workers}\n num_threads: {torch.get_num_threads()}"
+    )
+
+    exporter = CheckpointExporter() if async_checkpointing else None
+    try:
+        with (
+            TrainingTelemetry(train_args.ckpt_output_dir, "full", telemetry)
+            if telemetry is not None
+            else contextlib.nullcontext()
+        ) as step_telemetry:
+            _train_epochs(
+                train_args,
+                model,
+                tokenizer,
+                optimizer,
+                dataloader,
+                accum,
+                dev,
+                exporter,
+                step_telemetry,
+                step_model=step_model,
+                autocast_dtype=autocast_dtype,
+                baseline_tokens_per_sec=baseline_tokens_per_sec,
+                step_checkpoints=step_checkpoints,
+                checkpoint_interval=checkpoint_interval,
+                resume_state=resume_state,
+            )
+    except BaseException:
+        if exporter is not None:
+            # finish the exports of the checkpoints saved so far, without an
+            # export error replacing the training error
+            exporter.wait(raise_errors=False)
+        raise
+    if exporter is not None:
+        # every checkpoint artifact must be complete before training returns
+        exporter.wait()
+
+
+def _train_epochs(
+    train_args,
+    model,
+    tokenizer,
+    optimizer,
+    dataloader,
+    accum,
+    dev,
+    exporter,
+    telemetry=None,
+    step_model=None,
+    autocast_dtype=None,
+    baseline_tokens_per_sec=None,
+    step_checkpoints=None,
+    checkpoint_interval=0,
+    resume_state=None,
+):
+    # Third Party
+    import torch
+
+    if step_model is None:
+        step_model = model
+
+    def phase(name):
+        if telemetry is None:
+            return contextlib.nullcontext()
+        return telemetry.phase(name)
+
     # For each epoch do the following:
     # 1. Incremement Loading Bar
     # 2. put zeros onto the proper device so we can store some values we need
@@ -189,20 +404,39 @@ def train(train_args, device, optimize_memory):
     # 8. clear out some caches if on MPS
     # 9. Incrememnt loading bar
     # 10. at the end og the epoch, save the checpoint to a samples folder and convert to GGUF as well
-    for epoch in range(train_args.num_epochs):
+    start_epoch, start_batch, global_step = 0, 0, 0
+    if resume_state is not None:
+        start_epoch = resume_state["epoch"]
+        start_batch = resume_state["batch"]
+        global_step = resume_state["global_step"]
+
+    for epoch in range(start_epoch, train_args.num_epochs):
         dataloader.batch_sampler.set_epoch(epoch)
-        inner_pb = tqdm(range(len(dataloader)), desc=f"Epoch {epoch}")
+        # a resumed epoch skips the batches trained on before the checkpoint
+        first_batch = start_batch if epoch == start_epoch else 0
+        dataloader.batch_sampler.skip = first_batch
+        inner_pb = tqdm(
+            range(len(dataloader)), desc=f"Epoch {epoch}", initial=first_batch
+        )
         aggregated_values = torch.zeros(3, dtype=torch.float32).to(dev)
 
-        for step, batch in enumerate(dataloader):
+        epoch_tokens, epoch_seconds = 0, 0.0
+        # tokens, padding tokens and step seconds of the epoch
+        epoch_totals = [0, 0, 0.0]
+        batch_requested = time.perf_counter()
+        for step, batch in enumerate(dataloader, start=first_batch):
+            step_start = time.perf_counter()
+            if telemetry is not None:
+                telemetry.add_phase("data_wait", step_start - batch_requested)
             aggregated_values[0] = batch.pop("num_loss_counted_tokens")
             aggregated_values[1] = len(batch["input_ids"])
+            num_padding_tokens = int(batch.pop("num_padding_tokens"))
+            num_tokens = batch["input_ids"].numel()
+            batch = _model_inputs(batch, model, dev)
 
-            # Move and cast batch data to device
-            for k in batch:
-                batch[k] = batch[k].to(device=dev)
-
-            output = model(**batch, use_cache=False, return_dict=True)
+            compute_start = time.perf_counter()
+            with phase("forward"), _autocast(autocast_dtype):
+                output = step_model(**batch, use_cache=False, return_dict=True)
             loss = output.loss
             aggregated_values[2] = loss.item()
 
@@ -214,7 +448,9 @@ def train(train_args, device, optimize_memory):
             logger.info(f"\nEpoch: {epoch}, Step: {step + 1}, Rank: 0, loss = {loss}")
 
             # Gradient accumulation
-            loss.backward()  # Backward pass
+            with phase("backward"):
+                loss.backward()  # Backward pass
+            compute_seconds = time.perf_counter() - compute_start
 
             # Clear cache before optimizer step
             # below we clear the MPS cache quite a bit. MPS caching is different from CPU.
@@ -225,14 +461,63 @@ def train(train_args, device, optimize_memory):
 
             # if we are on a step which is divisible by 4, step and zero gradients
             if (step + 1) % accum == 0:
-                optimizer.step()  # Optimizer step
-                optimizer.zero_grad()  # Zero gradients
+                with phase("optimizer"):
+                    optimizer.step()  # Optimizer step
+                    optimizer.zero_grad()  # Zero gradients
+                global_step += 1
+
+                # checkpoints are only taken right after an optimizer step,
+                # so there are no accumulated gradients to save
+                if (
+                    step_checkpoints is not None
+                    and checkpoint_interval
+                    and global_step % checkpoint_interval == 0
+                ):
+                    step_checkpoints.save(
+                        model, optimizer, epoch, step + 1, global_step
+                    )
 
                 # Clear cache after optimizer step
                 if dev.type == "mps":
                     torch.mps.empty_cache()
 
+            step_seconds = time.perf_counter() - step_start
+            inner_pb.set_postfix(
+                loss=aggregated_values[2].item(),
+                tokens_per_sec=f"{num_tokens / step_seconds:.1f}",
+                padding=f"{num_padding_tokens / num_tokens:.1%}",
+            )
             inner_pb.update(1)
+            logger.debug(
+                f"Epoch: {epoch}, Step: {step + 1}, tokens: {num_tokens}, tokens/sec: {num_tokens / step_seconds:.1f}, padding: {num_padding_tokens / num_tokens:.1%}"
+            )
+            epoch_totals[0] += num_tokens
+            epoch_totals[1] += num_padding_tokens
+            epoch_totals[2] += step_seconds
+            if epoch == 0:
+                epoch_tokens += num_tokens
+                epoch_seconds += compute_seconds
+            if telemetry is not None:
+                telemetry.record_step(
+                    epoch=epoch,
+                    step=step + 1,
+                    tokens=num_tokens,
+                    loss=aggregated_values[2].item(),
+                    step_seconds=time.perf_counter() - batch_requested,
+                    padding_tokens=num_padding_tokens,
+                )
+            batch_requested = time.perf_counter()
+
+        if epoch_totals[2]:
+            logger.info(
+                f"Epoch {epoch}: {epoch_totals[0]} tokens, {epoch_totals[1] / epoch_totals[0]:.1%} padding, {epoch_totals[0] / epoch_totals[2]:.1f} tokens/sec"
+            )
+        if epoch == 0 and baseline_tokens_per_sec and epoch_seconds:
+            epoch_tokens_per_sec = epoch_tokens / epoch_seconds
+            logger.info(
+                f"CPU performance mode, first epoch forward/backward including compilation: {epoch_tokens_per_sec:.1f} tokens/sec, "
+                f"{epoch_tokens_per_sec / baseline_tokens_per_sec:.2f}x eager float32 ({baseline_tokens_per_sec:.1f} tokens/sec)"
+            )
 
         # Clear cache at the end of the epoch if needed
         if dev.type == "mps":
@@ -243,82 +528,464 @@ def train(train_args, device, optimize_memory):
         )
 
         logger.info(f"Saving Model to: {output_dir}")
-        model_state = model.state_dict()
         output_dir.mkdir(parents=True, exist_ok=True)
-        output_model_file = output_dir / "pytorch_model.bin"
-        output_config_file = output_dir / "config.json"
 
-        tmp_conf = copy(model.config)
+        if exporter is not None:
+            # snapshot the weights and let the next epoch start right away
+            model.save_pretrained(str(output_dir), safe_serialization=True)
+            tokenizer.save_pretrained(str(output_dir))
+            exporter.submit(output_dir)
+        else:
+            model_state = model.state_dict()
+            output_model_file = output_dir / "pytorch_model.bin"
+            output_config_file = output_dir / "config.json"
+
+            tmp_conf = copy(model.config)
+
+            torch.save(model_state, str(output_model_file))
+            tmp_conf.to_json_file(str(output_config_file))
+            tokenizer.save_pretrained(str(output_dir))
+
+            export_gguf(output_dir)
+
+    if step_checkpoints is not None:
+        # training finished, nothing is left to resume
+        step_checkpoints.clear()
+
 
-        torch.save(model_state, str(output_model_file))
-        tmp_conf.to_json_file(str(output_config_file))
-        tokenizer.save_pretrained(str(output_dir))
+def _model_inputs(batch, model, dev):
+    # First Party
+    from instructlab.train.packing import packed_attention_mask, uses_position_ids
 
-        # convert to GGUF at the end so llamacpp can serve the model originally in .bin
-        llamacpp_convert_to_gguf.convert_llama_to_gguf(
-            model=output_dir,
-            pad_vocab=True,
-            skip_unknown=True,
-            outfile=os.path.join(output_dir, "pytorch_model.gguf"),
+    # Move and cast batch data to device
+    for k in batch:
+        batch[k] = batch[k].to(device=dev)
+
+    if "attention_mask" not in batch and not uses_position_ids(model):
+        # packed batch: only attention implementations that cannot find the
+        # samples from the position ids get a block-diagonal mask, built on
+        # the device right before the forward pass
+        batch["attention_mask"] = packed_attention_mask(batch["position_ids"], model)
+    return batch
+
+
+def _autocast(dtype):
+    # Third Party
+    import torch
+
+    if dtype is None:
+        return contextlib.nullcontext()
+    return torch.autocast("cpu", dtype=dtype)
+
+
+def _time_steps(step_model, model, batches, dev, autocast_dtype=None):
+    """Times forward and backward passes over batches, the first one warms up"""
+    tokens, seconds = 0, 0.0
+    for i, batch in enumerate(batches):
+        inputs = _model_inputs(
+            {k: v for k, v in batch.items() if not k.startswith("num_")}, model, dev
         )
+        start = time.perf_counter()
+        with _autocast(autocast_dtype):
+            output = step_model(**inputs, use_cache=False, return_dict=True)
+        output.loss.backward()
+        model.zero_grad(set_to_none=True)
+        if i > 0:
+            seconds += time.perf_counter() - start
+            tokens += inputs["input_ids"].numel()
+    return tokens, seconds
+
+
+def cpu_supports_bf16():
+    """Whether the CPU has native bfloat16 instructions that torch can use"""
+    # Third Party
+    import torch
 
-        # quantize the model so everyone can run it
-        gguf_model_dir = os.path.join(output_dir, "pytorch_model.gguf")
-        gguf_model_q_dir = os.path.join(output_dir, "pytorch_model-Q4_K_M.gguf")
-        run_quantize(gguf_model_dir, gguf_model_q_dir, "Q4_K_M")
+    if not torch.backends.mkldnn.is_available():
+        return False
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            flags = set(f.read().split())
+    except OSError:
+        return False
+    # x86 AVX-512/AMX bfloat16, or the Arm bfloat16 extension
+    return bool(flags & {"avx512_bf16", "amx_bf16", "bf16"})
 
 
-def pad_collate_fn(batch, pad_token_id):
-    lens = np.array([len(item["input_ids"]) for item in batch])
-    max_len = max(lens)
+def _enable_cpu_performance(model, probe_batches, dev, num_shapes):
+    """
+    Compiles the model and picks bf16 autocast where the CPU supports it.
+
+    Batches come in at most num_shapes bucketed shapes, each compiled once.
+    Returns the model to step with, the autocast dtype and the eager float32
+    tokens/sec measured on the probe batches, which the first epoch is compared to.
+    """
     # Third Party
     import torch
-    import torch.nn.functional as F
-
-    input_ids = torch.stack(
-        [
-            F.pad(
-                item["input_ids"],
-                (max_len - len(item["input_ids"]), 0),
-                mode="constant",
-                value=pad_token_id,
-            )
-            for item in batch
-        ]
+
+    tokens, seconds = _time_steps(model, model, probe_batches, dev)
+    baseline_tokens_per_sec = tokens / seconds if seconds else None
+
+    autocast_dtype = torch.bfloat16 if cpu_supports_bf16() else None
+    if autocast_dtype is None:
+        logger.info("This CPU has no native bfloat16 support, keeping float32")
+
+    # every bucketed shape gets its own static graph instead of a recompile
+    # with dynamic shapes once the cache of compiled graphs is full
+    torch._dynamo.config.cache_size_limit = max(
+        torch._dynamo.config.cache_size_limit, 4 * num_shapes
     )
-    labels = torch.stack(
-        [
-            F.pad(
-                item["labels"],
-                (max_len - len(item["labels"]), 0),
-                mode="constant",
-                value=-100,
+    step_model = torch.compile(model, dynamic=False)
+    try:
+        # compiles the first shapes, the probe results are thrown away
+        tokens, seconds = _time_steps(
+            step_model, model, probe_batches, dev, autocast_dtype
+        )
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        logger.warning(f"torch.compile is not usable here, training eagerly: {e}")
+        step_model = model
+        try:
+            tokens, seconds = _time_steps(
+                model, model, probe_batches, dev, autocast_dtype
             )
-            for item in batch
-        ]
+        except RuntimeError as e:
+            logger.warning(
+                f"bfloat16 autocast is not usable here, keeping float32: {e}"
+            )
+            autocast_dtype = None
+            tokens, seconds = 0, 0.0
+    if baseline_tokens_per_sec and seconds:
+        logger.info(
+            f"CPU performance mode probe: {tokens / seconds:.1f} tokens/sec after warm-up, "
+            f"{tokens / seconds / baseline_tokens_per_sec:.2f}x eager float32"
+        )
+    return step_model, autocast_dtype, baseline_tokens_per_sec
+
+
+def _autotune(train_args, model, dev, make_dataloader, padding_free):
+    """Picks the threads, micro-batch length and dataloader workers of the training step"""
+    key = tuning_key(
+        train_args.model_path,
+        pipeline="full",
+        device=dev.type,
+        padding_free=padding_free,
+        max_seq_len=train_args.max_seq_len,
+        max_batch_len=train_args.max_batch_len,
     )
-    num_loss_counted_tokens = (labels != -100).sum()
+    trial_batches = {}
 
-    attention_mask = torch.stack(
-        [
-            F.pad(
-                item["attention_mask"],
-                (max_len - len(item["attention_mask"]), 0),
-                mode="constant",
-                value=0,
+    def batches(max_batch_len):
+        if max_batch_len not in trial_batches:
+            dataloader = make_dataloader(max_batch_len, 0)[0]
+            trial_batches[max_batch_len] = list(
+                itertools.islice(dataloader, AUTOTUNE_TRIAL_STEPS + 1)
             )
-            for item in batch
-        ]
+        return trial_batches[max_batch_len]
+
+    def compute_trial(max_batch_len):
+        return _time_steps(model, model, batches(max_batch_len), dev)
+
+    def loader_trial(num_workers, max_batch_len):
+        batch_iter = iter(make_dataloader(max_batch_len, num_workers)[0])
+        # the first batch waits for the workers to start
+        next(batch_iter, None)
+        tokens, start = 0, time.perf_counter()
+        for batch in itertools.islice(batch_iter, AUTOTUNE_LOADER_BATCHES):
+            tokens += batch["input_ids"].numel()
+        seconds = time.perf_counter() - start
+        del batch_iter
+        return tokens, seconds
+
+    base = train_args.max_batch_len
+    micro_batches = sorted(
+        {m for m in (base // 2, base * 2, base * 4) if m >= train_args.max_seq_len}
+        | {base}
     )
-    logger.info(
-        f"\033[96m total tokens: {max_len * len(batch)} num samples: {len(batch)} num padding tokens: {max_len * len(batch) - lens.sum()} - rank: {0} "
-        f"max len: {max_len} min len: {min(lens)} avg len: {lens.mean()} "
-        f"num_loss_counted_tokens: {num_loss_counted_tokens}\033[0m"
+    return CPUAutoTuner(key).tune(
+        compute_trial, micro_batches, base, loader_trial=loader_trial
+    )
+
+
+def export_gguf(output_dir):
+    """Converts a checkpoint to GGUF and quantizes it to Q4_K_M."""
+    # convert to GGUF at the end so llamacpp can serve the model originally in .bin
+    llamacpp_convert_to_gguf.convert_llama_to_gguf(
+        model=Path(output_dir),
+        pad_vocab=True,
+        skip_unknown=True,
+        outfile=os.path.join(output_dir, "pytorch_model.gguf"),
     )
 
+    # quantize the model so everyone can run it
+    gguf_model_dir = os.path.join(output_dir, "pytorch_model.gguf")
+    gguf_model_q_dir = os.path.join(output_dir, "pytorch_model-Q4_K_M.gguf")
+    run_quantize(gguf_model_dir, gguf_model_q_dir, "Q4_K_M")
+
+
+class ResumableBatchSampler:
+    """Batch sampler that can skip the batches of an epoch trained on before a resume"""
+
+    def __init__(self, batch_sampler):
+        self.batch_sampler = batch_sampler
+        # batches to skip at the start of the next iteration only
+        self.skip = 0
+
+    def set_epoch(self, epoch):
+        self.batch_sampler.set_epoch(epoch)
+
+    def __len__(self):
+        return len(self.batch_sampler)
+
+    def __iter__(self):
+        skip, self.skip = self.skip, 0
+        return itertools.islice(iter(self.batch_sampler), skip, None)
+
+
+class StepCheckpoints:
+    """
+    Step checkpoints that let an interrupted training run resume where it stopped.
+
+    Each checkpoint holds the model weights, the Adafactor state, the RNG states
+    and the position in the data: the epoch and the number of its batches done.
+    Only the last `keep` checkpoints are kept.
+    """
+
+    STATE_FILE = "training_state.json"
+
+    def __init__(self, ckpt_output_dir, keep=2, layout=None):
+        self.dir = Path(ckpt_output_dir) / "step_checkpoints"
+        self.keep = keep
+        self.layout = layout or {}
+
+    def checkpoints(self):
+        """Complete checkpoints, oldest first"""
+        complete = [
+            path
+            for path in self.dir.glob("step_*")
+            if (path / self.STATE_FILE).is_file()
+        ]
+        return sorted(complete, key=lambda path: int(path.name.split("_")[1]))
+
+    def latest(self):
+        checkpoints = self.checkpoints()
+        return checkpoints[-1] if checkpoints else None
+
+    def save(self, model, optimizer, epoch, batch, global_step):
+        # Third Party
+        import torch
+
+        path = self.dir / f"step_{global_step}"
+        tmp_path = self.dir / f".step_{global_step}.{os.getpid()}.tmp"
+        tmp_path.mkdir(parents=True, exist_ok=True)
+        torch.save(model.state_dict(), tmp_path / "model.pt")
+        torch.save(optimizer.state_dict(), tmp_path / "optimizer.pt")
+        torch.save(_rng_state(), tmp_path / "rng_state.pt")
+        state = {
+            "epoch": epoch,
+            "batch": batch,
+            "global_step": global_step,
+            "layout": self.layout,
+        }
+        # the state file is written last, it marks the checkpoint as complete
+        (tmp_path / self.STATE_FILE).write_text(json.dumps(state), encoding="utf-8")
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        logger.info(f"Saved step checkpoint {path}")
+
+        for old in self.checkpoints()[: -self.keep]:
+            shutil.rmtree(old, ignore_errors=True)
+
+    def load(self, path, model, optimizer):
+        """Restores a checkpoint into model and optimizer, returns its position in the data"""
+        # Third Party
+        import torch
+
+        state = json.loads((path / self.STATE_FILE).read_text(encoding="utf-8"))
+        if state["layout"] != self.layout:
+            raise ValueError(
+                f"Cannot resume from {path}: it was saved with batches {state['layout']}, "
+                f"this run has {self.layout}. Resume with the same data and batch settings."
+            )
+        model.load_state_dict(
+            torch.load(path / "model.pt", map_location="cpu", weights_only=True)
+        )
+        optimizer.load_state_dict(
+            torch.load(path / "optimizer.pt", map_location="cpu", weights_only=True)
+        )
+        # holds python and numpy RNG states, which aren't plain tensors
+        _set_rng_state(torch.load(path / "rng_state.pt", weights_only=False))
+        return state
+
+    def clear(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def _rng_state():
+    # Third Party
+    import numpy as np
+    import torch
+
+    return {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+    }
+
+
+def _set_rng_state(state):
+    # Third Party
+    import numpy as np
+    import torch
+
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+
+
+class CheckpointExporter:
+    """
+    Runs export_gguf for saved checkpoints in a background process.
+
+    At most max_pending exports are queued or running; submitting another one
+    waits for the oldest to finish, so disk usage and memory stay bounded when
+    epochs are shorter than an export.
+    """
+
+    def __init__(self, max_pending=2):
+        self.max_pending = max_pending
+        self._executor = ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        )
+        self._pending: deque[tuple[Path, Future]] = deque()
+
+    def submit(self, output_dir):
+        while len(self._pending) >= self.max_pending:
+            self._wait_oldest()
+        logger.info(f"Exporting {output_dir} to GGUF in the background")
+        self._pending.append(
+            (output_dir, self._executor.submit(export_gguf, str(output_dir)))
+        )
+
+    def wait(self, raise_errors=True):
+        """Waits for every queued export, with raise_errors=False failures are only logged"""
+        try:
+            while self._pending:
+                self._wait_oldest(raise_errors)
+        finally:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _wait_oldest(self, raise_errors=True):
+        output_dir, future = self._pending.popleft()
+        try:
+            future.result()
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            if raise_errors:
+                raise
+            logger.error(f"GGUF export of {output_dir} failed: {e}")
+            return
+        logger.info(f"GGUF export of {output_dir} completed")
+
+
+def length_buckets(max_len, count=6, multiple=64):
+    """A small fixed set of sequence lengths, halving from max_len, that batches are padded to"""
+    return sorted(
+        {
+            max(multiple, math.ceil(max_len / 2**k / multiple) * multiple)
+            for k in range(count)
+        }
+    )
+
+
+def row_buckets(max_rows):
+    """Numbers of rows, powers of two up to max_rows, that padded batches are padded to"""
+    return [2**k for k in range((max(1, max_rows) - 1).bit_length() + 1)]
+
+
+def _bucket_length(length, bucket_lengths):
+    if not bucket_lengths:
+        return length
+    return next((b for b in bucket_lengths if b >= length), length)
+
+
+def pad_collate_fn(batch, pad_token_id, bucket_lengths=None, bucket_rows=None):
+    # Third Party
+    import torch
+
+    lens = [len(item["input_ids"]) for item in batch]
+    max_len = _bucket_length(max(lens), bucket_lengths)
+    rows = _bucket_length(len(batch), bucket_rows)
+
+    # fill preallocated, left-padded tensors instead of padding every sample
+    input_ids = torch.full((rows, max_len), pad_token_id, dtype=torch.long)
+    labels = torch.full((rows, max_len), -100, dtype=torch.long)
+    attention_mask = torch.zeros((rows, max_len), dtype=torch.long)
+    # rows of padding attend to a single padding token, never to nothing
+    attention_mask[len(batch) :, -1] = 1
+    for i, item in enumerate(batch):
+        start = max_len - lens[i]
+        input_ids[i, start:] = item["input_ids"]
+        labels[i, start:] = item["labels"]
+        attention_mask[i, start:] = item["attention_mask"]
+    num_loss_counted_tokens = (labels != -100).sum()
+
     return {
         "input_ids": input_ids,
         "labels": labels,
         "num_loss_counted_tokens": num_loss_counted_tokens,
+        "num_padding_tokens": max_len * rows - sum(lens),
         "attention_mask": attention_mask,
     }
+
+
+def packed_collate_fn(batch, bucket_lengths=None, pad_token_id=0):
+    """
+    Packs a batch into a single sequence without padding.
+
+    Position ids restart at every sample and no attention mask is built;
+    _model_inputs derives the block-diagonal mask from the position ids when
+    the attention implementation needs one. With bucket_lengths, the sequence
+    ends with padding up to the next bucket length, whose tokens only attend
+    to themselves.
+    """
+    # Third Party
+    import torch
+
+    lens = [len(item["input_ids"]) for item in batch]
+    num_sample_tokens = sum(lens)
+    total_len = _bucket_length(num_sample_tokens, bucket_lengths)
+    if total_len > num_sample_tokens:
+        padding = torch.full(
+            (total_len - num_sample_tokens,), pad_token_id, dtype=torch.long
+        )
+        batch = [
+            *batch,
+            {
+                "input_ids": padding,
+                "labels": torch.full_like(padding, -100),
+                # stays within the model's positions however long the padding is
+                "position_ids": torch.zeros_like(padding),
+            },
+        ]
+        lens.append(len(padding))
+
+    input_ids = torch.empty((1, total_len), dtype=torch.long)
+    labels = torch.empty((1, total_len), dtype=torch.long)
+    position_ids = torch.empty((1, total_len), dtype=torch.long)
+    start = 0
+    for item, length in zip(batch, lens, strict=True):
+        end = start + length
+        input_ids[0, start:end] = item["input_ids"]
+        labels[0, start:end] = item["labels"]
+        # the first token of a sample must not be predicted from the previous sample
+        labels[0, start] = -100
+        position_ids[0, start:end] = item.get("position_ids", torch.arange(length))
+        start = end
+    num_loss_counted_tokens = (labels != -100).sum()
+
+    return {
+        "input_ids": input_ids,
+        "labels": labels,
+        "position_ids": position_ids,
+        "num_loss_counted_tokens": num_loss_counted_tokens,
+        "num_padding_tokens": total_len - num_sample_tokens,
+    }
@@ -1,24 +1,28 @@
 # SPDX-License-Identifier: Apache-2.0
 
 # Standard
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
 from time import time
 from typing import Any, Dict
+import contextlib
 import logging
-import os
+import threading
 
 # Third Party
-from datasets import load_dataset
 from openai import OpenAI, Stream
 import click
 
 # First Party
 from instructlab.configuration import DEFAULTS
+from instructlab.data.columnar import load_dataset_file
 
 # Local
 from ..client_utils import http_client
 from ..utils import get_sysprompt
 from .backends import backends
+from .backends.server import BackendServer
 
 logger = logging.getLogger(__name__)
 
@@ -49,34 +53,82 @@ def response(client, user: str, create_params: dict):
     return c
 
 
-def test_model(ctx, res, ds, model: Path, create_params: dict):
-    logger.debug("%s", model)
-    create_params["model"] = str(model)  # mandatory, but not used
-    # TODO: this code block is replicated again. Refactor to a common function.
-    backend_instance = None
+@dataclass
+class ModelTestTiming:
+    model: str
+    total_seconds: float = 0.0
+    # questions of the test file, repeated ones included
+    questions: list[str] = field(default_factory=list)
+    # elapsed time of the request for each of the questions
+    request_seconds: list[float] = field(default_factory=list)
+
+
+def start_model_server(ctx, model: Path) -> tuple[BackendServer, OpenAI]:
+    """Starts a temporary server for model and returns it with a client for it"""
+    ctx.obj.config.serve.llama_cpp.llm_family = ctx.params["model_family"]
+    backend_instance = backends.select_backend(
+        cfg=ctx.obj.config.serve, model_path=model
+    )
     try:
-        ctx.obj.config.serve.llama_cpp.llm_family = ctx.params["model_family"]
-        backend_instance = backends.select_backend(
-            cfg=ctx.obj.config.serve, model_path=model
-        )
-        try:
-            api_base = backend_instance.run_detached(http_client(ctx.params))
-        except Exception as exc:
-            click.secho(f"Failed to start server: {exc}", fg="red")
-            raise click.exceptions.Exit(1)
-        api_base = api_base or ctx.obj.config.serve.api_base()
-        logger.debug("api_base=%s", api_base)
-        client = OpenAI(
-            base_url=api_base,
-            api_key=ctx.params["api_key"],
-        )
-        for d in ds:
-            res[d["user"]][str(model)] = response(client, d["user"], create_params)
+        api_base = backend_instance.run_detached(http_client(ctx.params))
     except Exception as exc:
-        raise exc
-    finally:
-        if backend_instance:
-            backend_instance.shutdown()
+        click.secho(f"Failed to start server: {exc}", fg="red")
+        raise click.exceptions.Exit(1)
+    api_base = api_base or ctx.obj.config.serve.api_base()
+    logger.debug("api_base=%s", api_base)
+    client = OpenAI(
+        base_url=api_base,
+        api_key=ctx.params["api_key"],
+    )
+    return backend_instance, client
+
+
+def query_model(
+    client,
+    res,
+    ds,
+    model: Path,
+    create_params: dict,
+    max_workers: int = 1,
+    all_started: threading.Event | None = None,
+) -> ModelTestTiming:
+    """Sends every question in ds to the served model
+
+    At most max_workers requests are in flight at a time. Answers are stored
+    in res under the question, so the test file order is kept no matter in
+    which order the requests complete. all_started is set once the last
+    request has been sent, which lets the caller start loading the next model
+    while the remaining requests finish.
+    """
+    create_params = {**create_params, "model": str(model)}  # mandatory, but not used
+    questions = [d["user"] for d in ds]
+    elapsed = [0.0] * len(questions)
+    started = 0
+    lock = threading.Lock()
+
+    def timed_response(idx: int, user: str) -> str:
+        nonlocal started
+        with lock:
+            started += 1
+            if started == len(questions) and all_started is not None:
+                all_started.set()
+        start_time = time()
+        try:
+            return response(client, user, create_params)
+        finally:
+            elapsed[idx] = time() - start_time
+
+    start_time = time()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        answers = pool.map(timed_response, range(len(questions)), questions)
+        for user, answer in zip(questions, answers, strict=True):
+            res[user][str(model)] = answer
+    return ModelTestTiming(
+        str(model),
+        total_seconds=time() - start_time,
+        questions=questions,
+        request_seconds=elapsed,
+    )
 
 
 def linux_test(
@@ -84,7 +136,8 @@ def linux_test(
     test_file: Path,
     models=None,
     create_params=None,
-) -> Dict[str, Any]:
+    max_workers: int = 1,
+) -> tuple[Dict[str, Any], list[ModelTestTiming]]:
     # linux_test
     logger.debug("test_file=%s", test_file)
     if not models:
@@ -96,11 +149,44 @@ def linux_test(
     create_params["temperature"] = 0  # for more reproducible results
     # create_params["stream"] = True  # optional, useful for interactive debugging
 
-    ds = load_dataset("json", data_files=os.fspath(test_file), split="train")
+    ds = load_dataset_file(test_file)
     res: dict[str, Any] = {}
     # intentionally not using collections.defaultdict to avoid dependency
     for d in ds:
         res[d["user"]] = {}
-    for m in models:
-        test_model(ctx, res, ds, m, create_params)
-    return res
+
+    timings = []
+    # the next model's server is loaded while the current model's last
+    # requests are still in flight
+    with ThreadPoolExecutor(max_workers=1) as loader:
+        next_server = loader.submit(start_model_server, ctx, models[0])
+        for idx, m in enumerate(models):
+            logger.debug("%s", m)
+            backend_instance, client = next_server.result()
+            all_started = threading.Event()
+            if idx + 1 < len(models):
+                next_server = loader.submit(
+                    _start_when_set, all_started, ctx, models[idx + 1]
+                )
+            try:
+                timings.append(
+                    query_model(
+                        client, res, ds, m, create_params, max_workers, all_started
+                    )
+                )
+            except Exception:
+                # unblock and tear down a next server that may be loading
+                all_started.set()
+                if idx + 1 < len(models):
+                    with contextlib.suppress(BaseException):
+                        next_server.result()[0].shutdown()
+                raise
+            finally:
+                all_started.set()
+                backend_instance.shutdown()
+    return res, timings
+
+
+def _start_when_set(event: threading.Event, ctx, model: Path):
+    event.wait()
+    return start_model_server(ctx, model)
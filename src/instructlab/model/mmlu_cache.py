@@ -0,0 +1,248 @@
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Cache of MMLU / MMLU-Branch few-shot requests shared between evaluations.
+
+Before any forward pass, lm_eval builds a request (an Instance) for every
+MMLU question: its few-shot context and the answer choices to score. Those
+requests only depend on the tokenizer, the task list, the number of
+few-shots and the system prompt, so they are identical for every checkpoint
+of one training run. This module keys lm_eval's request cache on exactly
+those inputs so that building the requests is skipped for later checkpoints.
+Tokenization still happens in the model when the requests are scored.
+
+The cache is passed to lm_eval through MMLUEvaluator._run_mmlu, a private
+method of instructlab-eval; evaluators without a compatible one run uncached.
+"""
+
+# Standard
+from pathlib import Path
+from typing import Any, Dict, Optional
+import hashlib
+import inspect
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+# First Party
+from instructlab.configuration import DEFAULTS
+
+logger = logging.getLogger(__name__)
+
+# lm_eval.caching.cache.PATH is process wide, one cached evaluation sets it at a time
+_lm_eval_cache_path_lock = threading.Lock()
+
+# files that make up a Hugging Face tokenizer and its chat template
+TOKENIZER_FILES = (
+    "tokenizer.json",
+    "tokenizer.model",
+    "tokenizer_config.json",
+    "special_tokens_map.json",
+    "added_tokens.json",
+    "vocab.json",
+    "merges.txt",
+)
+
+
+def _hash_files(files: list[Path], root: Path) -> str:
+    digest = hashlib.sha256()
+    for f in files:
+        digest.update(str(f.relative_to(root)).encode("utf-8"))
+        digest.update(f.read_bytes())
+    return digest.hexdigest()
+
+
+def tokenizer_hash(model_path: str | Path) -> Optional[str]:
+    """Hash of the tokenizer files of a model directory, None if it has none"""
+    model_dir = Path(model_path)
+    files = [model_dir / name for name in TOKENIZER_FILES]
+    files = [f for f in files if f.is_file()]
+    if not files:
+        return None
+    return _hash_files(files, model_dir)
+
+
+def supports_extra_args(evaluator) -> bool:
+    """Whether the private _run_mmlu of an evaluator takes the lm_eval extra_args"""
+    run_mmlu = getattr(evaluator, "_run_mmlu", None)
+    if run_mmlu is None:
+        return False
+    try:
+        return "extra_args" in inspect.signature(run_mmlu).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def tasks_dir_hash(tasks_dir: Optional[str]) -> Optional[str]:
+    """Hash of the task definitions and data of an MMLU-Branch tasks dir"""
+    if tasks_dir is None:
+        return None
+    root = Path(tasks_dir)
+    return _hash_files(sorted(f for f in root.rglob("*") if f.is_file()), root)
+
+
+class MMLURequestCache:
+    """
+    Shares the lm_eval requests built for MMLU evaluations.
+
+    Attributes:
+        cache_dir       directory holding the tokenizers, requests and timings of all cache keys
+        saved_seconds   estimated evaluation time saved by cache hits since creation
+    """
+
+    def __init__(self, cache_dir: str | Path | None = None) -> None:
+        self.cache_dir = Path(cache_dir or DEFAULTS.MMLU_CACHE_DIR)
+        self.saved_seconds = 0.0
+        self.hits = 0
+        self.misses = 0
+        self._task_managers: Dict[Optional[str], Any] = {}
+
+    def key(self, evaluator) -> Optional[str]:
+        """Cache key of an MMLU evaluator, None if its requests can't be cached"""
+        tok_hash = tokenizer_hash(evaluator.model_path)
+        if tok_hash is None:
+            return None
+        fingerprint = {
+            "tokenizer": tok_hash,
+            "tasks": sorted(evaluator.tasks),
+            "tasks_dir": tasks_dir_hash(evaluator.tasks_dir),
+            "few_shots": evaluator.few_shots,
+            "system_prompt": evaluator.system_prompt,
+        }
+        return hashlib.sha256(
+            json.dumps(fingerprint, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+    def run(self, evaluator, server_url: str | None = None) -> tuple:
+        """
+        Runs an MMLU or MMLU-Branch evaluator, reusing cached requests when possible
+
+        Returns:
+            overall_score       Average score for the task group
+            individual_scores   Individual scores for each task in the task group
+        """
+        if not supports_extra_args(evaluator):
+            logger.warning(
+                "This version of instructlab-eval cannot pass a request cache to lm_eval, running MMLU without it"
+            )
+            return evaluator.run(server_url)
+        key = self.key(evaluator)
+        if key is None:
+            logger.debug(
+                "No tokenizer files found in %s, running MMLU without request cache",
+                evaluator.model_path,
+            )
+            return evaluator.run(server_url)
+
+        key_dir = self.cache_dir / key
+        timing_file = key_dir / "timing.json"
+        # every checkpoint loads the same canonical tokenizer, so that lm_eval
+        # fingerprints the requests of all checkpoints identically
+        tokenizer_dir = key_dir / "tokenizer"
+        if not tokenizer_dir.is_dir():
+            tmp_dir = key_dir / f"tokenizer.{os.getpid()}"
+            tmp_dir.mkdir(parents=True, exist_ok=True)
+            model_dir = Path(evaluator.model_path)
+            for name in (*TOKENIZER_FILES, "config.json"):
+                if (model_dir / name).is_file():
+                    shutil.copy2(model_dir / name, tmp_dir / name)
+            os.replace(tmp_dir, tokenizer_dir)
+        requests_dir = key_dir / "requests"
+        requests_dir.mkdir(parents=True, exist_ok=True)
+
+        cold_seconds = None
+        if timing_file.is_file():
+            cold_seconds = json.loads(timing_file.read_text(encoding="utf-8"))[
+                "cold_seconds"
+            ]
+
+        start = time.monotonic()
+        overall_score, individual_scores = self._run_cached(
+            evaluator, server_url, tokenizer_dir, requests_dir
+        )
+        elapsed = time.monotonic() - start
+
+        if cold_seconds is None:
+            self.misses += 1
+            timing_file.write_text(
+                json.dumps({"cold_seconds": elapsed}), encoding="utf-8"
+            )
+            logger.info(
+                "MMLU request cache miss for %s, took %.1fs",
+                evaluator.model_path,
+                elapsed,
+            )
+        else:
+            self.hits += 1
+            saved = max(0.0, cold_seconds - elapsed)
+            self.saved_seconds += saved
+            logger.info(
+                "MMLU request cache hit for %s, took %.1fs (saved ~%.1fs)",
+                evaluator.model_path,
+                elapsed,
+                saved,
+            )
+        return overall_score, individual_scores
+
+    def report(self) -> str:
+        """Summary of the cache usage and the time it saved"""
+        return (
+            f"MMLU request cache: {self.hits} hit(s), {self.misses} miss(es), "
+            f"saved ~{self.saved_seconds:.1f}s of evaluation time"
+        )
+
+    def _task_manager(self, tasks_dir: Optional[str]):
+        # indexing the lm_eval tasks takes seconds, do it once per tasks dir
+        if tasks_dir not in self._task_managers:
+            # Third Party
+            from lm_eval.tasks import TaskManager
+
+            if tasks_dir is None:
+                self._task_managers[tasks_dir] = TaskManager()
+            else:
+                self._task_managers[tasks_dir] = TaskManager(include_path=tasks_dir)
+        return self._task_managers[tasks_dir]
+
+    def _run_cached(
+        self, evaluator, server_url: str | None, tokenizer_dir: Path, requests_dir: Path
+    ) -> tuple:
+        # Third Party
+        import lm_eval.caching.cache
+
+        if server_url is not None:
+            model_args = f"base_url={server_url}/completions,model={evaluator.model_path},tokenizer_backend=huggingface,tokenizer={tokenizer_dir}"
+        else:
+            model_args = f"pretrained={evaluator.model_path},dtype={evaluator.model_dtype},tokenizer={tokenizer_dir}"
+        extra_args = {
+            "model_args": model_args,
+            "cache_requests": True,
+            "task_manager": self._task_manager(evaluator.tasks_dir),
+        }
+
+        os.environ["TOKENIZERS_PARALLELISM"] = "true"
+        with _lm_eval_cache_path_lock:
+            # lm_eval reads LM_HARNESS_CACHE_PATH once at import, point the
+            # already imported module at the directory of this cache key
+            saved_path = lm_eval.caching.cache.PATH
+            lm_eval.caching.cache.PATH = str(requests_dir)
+            try:
+                # MMLUEvaluator.run() doesn't forward extra_args to lm_eval
+                # pylint: disable=protected-access
+                results = evaluator._run_mmlu(server_url, extra_args)
+            finally:
+                lm_eval.caching.cache.PATH = saved_path
+
+        individual_scores = {
+            task: {
+                "score": float(result["acc,none"]),
+                "stderr": float(result["acc_stderr,none"]),
+            }
+            for task, result in results.items()
+        }
+        overall_score = sum(s["score"] for s in individual_scores.values()) / len(
+            individual_scores
+        )
+        return overall_score, individual_scores
@@ -5,6 +5,7 @@ import fcntl
 import logging
 import os
 import pathlib
+import threading
 import typing
 import uuid
 
@@ -122,6 +123,8 @@ class TrainingJournal:
 
         self.was_loaded: bool = False
         self.journalfile = journalfile
+        # pipelined checkpoint evaluation commits from a worker thread
+        self._commit_lock = threading.Lock()
         if journalfile.is_file():
             logger.debug(f"Received journal that is a file: {journalfile}")
             with open(journalfile, "r", encoding="utf-8") as f:
@@ -151,23 +154,24 @@ class TrainingJournal:
         if create_new:
             self.create_empty_journal()
 
-        # try dumping before we open file for writing so yaml parsing can fail before we
-        # destroy file content.
-        _ = yaml.safe_dump(self.journal.model_dump())
+        with self._commit_lock:
+            # try dumping before we open file for writing so yaml parsing can fail before we
+            # destroy file content.
+            _ = yaml.safe_dump(self.journal.model_dump())
 
-        # implementation by @leseb
-        with open(self.journalfile, "w", encoding="utf-8") as f:
-            # Acquire an exclusive lock to prevent other processes from writing
-            fcntl.flock(f, fcntl.LOCK_EX)
+            # implementation by @leseb
+            with open(self.journalfile, "w", encoding="utf-8") as f:
+                # Acquire an exclusive lock to prevent other processes from writing
+                fcntl.flock(f, fcntl.LOCK_EX)
 
-            # Write journal's content
-            yaml.safe_dump(data=self.journal.model_dump(), stream=f)
+                # Write journal's content
+                yaml.safe_dump(data=self.journal.model_dump(), stream=f)
 
-            # Flush the buffer to ensure data is moved to OS buffer
-            f.flush()
+                # Flush the buffer to ensure data is moved to OS buffer
+                f.flush()
 
-            # Call fsync to ensure the data is physically written to disk
-            os.fsync(f.fileno())
+                # Call fsync to ensure the data is physically written to disk
+                os.fsync(f.fileno())
         logger.debug("Model written to disk")
 
     @property
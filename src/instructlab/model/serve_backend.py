@@ -61,6 +61,7 @@ def serve_backend(
     gpus: int | None,
     host: str,
     port: int,
+    parallel: int = 1,
 ) -> None:
     """Core server functionality to be called from the CLI"""
     # Configure logging
@@ -101,6 +102,7 @@ def serve_backend(
             max_ctx_size=max_ctx_size,
             num_threads=num_threads,
             log_file=log_file,
+            parallel=parallel,
         )
     elif backend == backends.VLLM:
         # Third Party
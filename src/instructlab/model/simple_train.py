@@ -8,6 +8,7 @@ import shutil
 # First Party
 from instructlab import utils
 from instructlab.configuration import DEFAULTS
+from instructlab.data.columnar import DATASET_SUFFIXES
 
 # pylint: disable=ungrouped-imports
 
@@ -28,6 +29,14 @@ def simple_train(
     num_epochs,
     device,
     four_bit_quant,
+    telemetry=None,
+    autotune=False,
+    checkpoint_interval=0,
+    keep_checkpoints=2,
+    resume=False,
+    test_batch_size=8,
+    max_test_samples=None,
+    packing=False,
 ):
     effective_data_dir: pathlib.Path = Path(
         data_path if data_path else DEFAULTS.DATASETS_DIR
@@ -52,7 +61,11 @@ def simple_train(
         # generated input files reverse sorted by modification time
         def get_files(directory: str, pattern: str) -> list[str]:
             return sorted(
-                [str(p) for p in Path(directory).glob(pattern)],
+                [
+                    str(p)
+                    for p in Path(directory).glob(pattern)
+                    if p.suffix in DATASET_SUFFIXES
+                ],
                 key=os.path.getmtime,
                 reverse=True,
             )
@@ -64,12 +77,12 @@ def simple_train(
         test_files = [
             f
             for f in get_files(input_dir, "*/test_*") + get_files(input_dir, "test_*")
-            if os.path.basename(f) != os.path.basename(test_file)
+            if Path(f).stem != test_file.stem
         ]
         train_files = [
             f
             for f in get_files(input_dir, "*/train_*") + get_files(input_dir, "train_*")
-            if os.path.basename(f) != os.path.basename(train_file)
+            if Path(f).stem != train_file.stem
         ]
 
         if not train_files or not test_files:
@@ -83,6 +96,9 @@ def simple_train(
         # The first file is latest
         logger.debug("train_file=%s", train_files[0])
         logger.debug("test_file=%s", test_files[0])
+        # a dataset converted with `ilab data convert` keeps its format
+        train_file = train_file.with_suffix(Path(train_files[0]).suffix)
+        test_file = test_file.with_suffix(Path(test_files[0]).suffix)
         shutil.copy(train_files[0], train_file)
         shutil.copy(test_files[0], test_file)
 
@@ -168,6 +184,14 @@ def simple_train(
             num_epochs=num_epochs,
             train_device=device,
             four_bit_quant=four_bit_quant,
+            telemetry=telemetry,
+            autotune=autotune,
+            checkpoint_interval=checkpoint_interval,
+            keep_checkpoints=keep_checkpoints,
+            resume=resume,
+            test_batch_size=test_batch_size,
+            max_test_samples=max_test_samples,
+            packing=packing,
         )
 
         final_results_dir = training_results_dir / "final"
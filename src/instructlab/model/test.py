@@ -3,9 +3,9 @@
 # Standard
 from pathlib import Path
 import itertools
-import json
 import logging
 import os
+import statistics
 
 # Third Party
 import click
@@ -13,6 +13,7 @@ import click
 # First Party
 from instructlab import clickext, utils
 from instructlab.configuration import DEFAULTS
+from instructlab.data.columnar import iter_dataset_file, resolve_dataset_file
 
 logger = logging.getLogger(__name__)
 
@@ -61,6 +62,13 @@ logger = logging.getLogger(__name__)
     "--model-family",
     help="Force model family to use when picking a generation template",
 )
+@click.option(
+    "--max-workers",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="Maximum number of test questions sent to the model server at the same time on Linux.",
+)
 @click.pass_context
 @clickext.display_params
 # pylint: disable=function-redefined
@@ -75,6 +83,7 @@ def test(
     test_file: Path,
     api_key: str,  # pylint: disable=unused-argument
     model_family: str,  # pylint: disable=unused-argument
+    max_workers: int,
 ):
     """Runs basic test to ensure model correctness"""
     if utils.is_macos_with_m_chip():
@@ -95,16 +104,15 @@ def test(
                 f"training only. - {processed_adapter}"
             )
 
-        # Load the JSON Lines file
-        test_data_dir = f"{data_dir}/test.jsonl"
+        # Load the JSON Lines file, or its Parquet/Arrow copy
+        test_data_dir = resolve_dataset_file(f"{data_dir}/test.jsonl")
         if not os.path.exists(test_data_dir):
             click.secho(
                 f"'{test_data_dir}' not such file or directory. Did you run 'ilab model train'?",
                 fg="red",
             )
             raise click.exceptions.Exit(1)
-        with open(test_data_dir, "r", encoding="utf-8") as f:
-            test_data = [json.loads(line) for line in f]
+        test_data = list(iter_dataset_file(test_data_dir))
 
         print(
             "system prompt:",
@@ -156,20 +164,35 @@ def test(
                 click.secho("No test files found", fg="red")
                 raise click.exceptions.Exit(1) from exc
         try:
-            answers = linux_test(
+            answers, timings = linux_test(
                 ctx,
                 test_file,
                 models=[model, Path(DEFAULTS.CHECKPOINTS_DIR) / "ggml-model-f16.gguf"],
                 create_params={"max_tokens": 100},
+                max_workers=max_workers,
             )
+            # answers of repeated questions are the last ones, so are their times
+            question_seconds = [
+                dict(zip(timing.questions, timing.request_seconds, strict=True))
+                for timing in timings
+            ]
             for question, models in answers.items():
                 # print in markdown format
                 print()
                 print("###", question)
-                for mod, answer in models.items():
+                for timing, seconds in zip(timings, question_seconds, strict=True):
                     print()
-                    print(f"{mod}: {answer}")
+                    print(
+                        f"{timing.model} ({seconds[question]:.1f}s): {models[timing.model]}"
+                    )
                 print()
+            for timing in timings:
+                request_seconds = timing.request_seconds or [0.0]
+                print(
+                    f"{timing.model}: {len(request_seconds)} requests in {timing.total_seconds:.1f}s "
+                    f"(per request: mean {statistics.mean(request_seconds):.1f}s, "
+                    f"median {statistics.median(request_seconds):.1f}s, max {max(request_seconds):.1f}s)"
+                )
             click.echo("ᕦ(òᴗóˇ)ᕤ Linux model test completed successfully! ᕦ(òᴗóˇ)ᕤ")
         except Exception as exc:
             click.secho(
@@ -20,6 +20,7 @@ import psutil
 # First Party
 from instructlab.configuration import DEFAULTS
 from instructlab.defaults import ILAB_PROCESS_MODES, ILAB_PROCESS_STATUS
+from instructlab.log import add_file_handler_to_logger
 
 logger = logging.getLogger(__name__)
 
@@ -33,11 +34,13 @@ class Process:
         children: list[int] | None = None,
         start_time: datetime | None = None,
         status: str = ILAB_PROCESS_STATUS.RUNNING.value,
+        telemetry_path: pathlib.Path | None = None,
     ):
         self.pid = pid
         self.ptype = ptype
         self.log_path = log_path
         self.status = status
+        self.telemetry_path = telemetry_path
 
         self._children = children or []
         self._start_time: datetime = start_time or datetime.now()
@@ -80,6 +83,8 @@ class Process:
         }
         if self._end_time:
             res["end_time"] = self._end_time.isoformat()
+        if self.telemetry_path:
+            res["telemetry_file"] = str(self.telemetry_path)
         return res
 
 
@@ -119,6 +124,11 @@ class ProcessRegistry:
                             children=value["children_pids"],
                             start_time=datetime.fromisoformat(value["start_time"]),
                             status=value["status"],
+                            telemetry_path=(
+                                pathlib.Path(value["telemetry_file"])
+                                if "telemetry_file" in value
+                                else None
+                            ),
                         ),
                     )
         return self
@@ -312,6 +322,43 @@ def add_process(
                 sys.stderr = sys.__stderr__
 
 
+def register_process(
+    process_type: str,
+    telemetry_path: pathlib.Path | None = None,
+) -> str:
+    """
+    Registers the current process, which runs in the foreground, so that it shows up in `ilab process list`.
+
+    Until `complete_process`, the records of the root logger are also written to
+    a log file in the logs directory, which `ilab process attach` follows.
+
+    Args:
+        process_type (str): Type of process, ex: Training.
+        telemetry_path (pathlib.Path): JSONL file of per-step telemetry, if any.
+
+    Returns:
+        local_uuid (str): UUID of the registered process, to pass to `complete_process`
+    """
+    local_uuid = str(uuid.uuid1())
+    log_dir = pathlib.Path(DEFAULTS.LOGS_DIR) / process_type.lower()
+    log_dir.mkdir(parents=True, exist_ok=True)
+    log_path = log_dir / f"{process_type.lower()}-{local_uuid}.log"
+    log_path.touch()
+    add_file_handler_to_logger(logging.getLogger(), log_path)
+
+    os.makedirs(DEFAULTS.INTERNAL_DIR, exist_ok=True)
+    ProcessRegistry().load().add(
+        local_uuid,
+        Process(
+            pid=os.getpid(),
+            log_path=log_path,
+            ptype=process_type,
+            telemetry_path=telemetry_path,
+        ),
+    ).persist()
+    return local_uuid
+
+
 def all_processes_running(pids: list[int]) -> bool:
     """
     Returns if a process and all of its children are still running
@@ -362,6 +409,14 @@ def complete_process(local_uuid: str, status):
     process = process_registry.processes.get(local_uuid, None)
     if process:
         process.complete(status)
+        # stop writing to the log file of a process registered by register_process
+        root_logger = logging.getLogger()
+        for handler in root_logger.handlers:
+            if isinstance(handler, logging.FileHandler) and handler.baseFilename == (
+                os.path.abspath(process.log_path)
+            ):
+                root_logger.removeHandler(handler)
+                handler.close()
     process_registry.persist()
 
 
@@ -405,6 +460,66 @@ def filter_processes(state: Optional[str] = None):
     return list_of_processes
 
 
+def latest_telemetry(path: pathlib.Path) -> dict[str, Any] | None:
+    """Returns the last record of a telemetry JSONL file, None if there is none yet."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            # records are small, the last few KiB hold the last complete one
+            f.seek(max(0, f.tell() - 8192))
+            lines = f.read().decode("utf-8", errors="replace").splitlines()
+    except OSError:
+        return None
+    for line in reversed(lines):
+        try:
+            return json.loads(line)
+        except ValueError:
+            continue
+    return None
+
+
+def filter_telemetry(state: Optional[str] = None) -> list[tuple]:
+    """
+    Summarises the latest telemetry of the registered processes that report it
+
+    Args:
+        state (str): only include processes with this status
+
+    Returns:
+        list of (UUID, step, tokens/sec, data wait, forward, backward, optimizer, RSS, VRAM) rows
+    """
+
+    def fmt_seconds(timings: dict, phase: str) -> str:
+        return f"{timings[phase]:.3f}s" if phase in timings else "-"
+
+    def fmt_gib(value) -> str:
+        return f"{value / 1024**3:.1f} GiB" if value is not None else "-"
+
+    rows = []
+    for local_uuid, process in ProcessRegistry().load().processes.items():
+        if (state and process.status != state) or process.telemetry_path is None:
+            continue
+        record = latest_telemetry(process.telemetry_path)
+        if record is None:
+            continue
+        timings = record.get("seconds", {})
+        tokens_per_sec = record.get("tokens_per_sec")
+        rows.append(
+            (
+                local_uuid,
+                f"{record.get('epoch', '-')}/{record.get('step', '-')}",
+                f"{tokens_per_sec:.1f}" if tokens_per_sec is not None else "-",
+                fmt_seconds(timings, "data_wait"),
+                fmt_seconds(timings, "forward"),
+                fmt_seconds(timings, "backward"),
+                fmt_seconds(timings, "optimizer"),
+                fmt_gib(record.get("rss_bytes")),
+                fmt_gib(record.get("vram_bytes")),
+            )
+        )
+    return rows
+
+
 def attach_process(local_uuid: str):
     """
     Attach to a running process and display its output in real-time.
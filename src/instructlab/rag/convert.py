@@ -25,6 +25,7 @@ from xdg_base_dirs import xdg_data_dirs, xdg_data_home
 import yaml
 
 # First Party
+from instructlab.document_cache import taxonomy_document_clones
 from instructlab.rag.taxonomy_utils import lookup_knowledge_files
 from instructlab.utils import clear_directory
 
@@ -41,7 +42,11 @@ def convert_documents_from_taxonomy(taxonomy_path, taxonomy_base, output_dir):
     """
     with tempfile.TemporaryDirectory() as temp_dir:
         logger.info(f"Temporary directory created: {temp_dir}")
-        knowledge_files = lookup_knowledge_files(taxonomy_path, taxonomy_base, temp_dir)
+        # the documents are cloned from the shared document cache
+        with taxonomy_document_clones(taxonomy_path, taxonomy_base):
+            knowledge_files = lookup_knowledge_files(
+                taxonomy_path, taxonomy_base, temp_dir
+            )
         logger.info(f"Found {len(knowledge_files)} knowledge files")
         logger.info(f"{knowledge_files}")
 
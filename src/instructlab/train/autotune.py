@@ -0,0 +1,317 @@
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Auto-tuning of the CPU training step.
+
+Before training, short timed trials pick the number of intra-op threads, the
+micro-batch size and the number of dataloader workers that give the most
+tokens/sec on this host, without going over a memory budget. The search is
+staged: threads are tuned at the default micro-batch, micro-batches with the
+best thread count, and dataloader workers last, since they only have to keep
+up with the training step. The result is saved per host/model pair and reused
+by later runs.
+"""
+
+# Standard
+from dataclasses import asdict, dataclass, field
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+from typing import Any, Callable, Optional
+import hashlib
+import json
+import logging
+import os
+import platform
+import threading
+
+# Third Party
+import psutil
+
+# First Party
+from instructlab.configuration import DEFAULTS
+
+logger = logging.getLogger(__name__)
+
+# fraction of the memory available when tuning starts that trials may use
+DEFAULT_MEMORY_FRACTION = 0.8
+# the data loader must produce tokens this much faster than the step consumes them
+LOADER_HEADROOM = 1.25
+
+
+@dataclass
+class TuningProfile:
+    """
+    Training step configuration chosen by the auto-tuner.
+
+    Attributes:
+        num_threads     intra-op threads of torch
+        num_workers     dataloader worker processes
+        micro_batch     micro-batch size, in the unit of the training pipeline (tokens or samples)
+        tokens_per_sec  training step throughput measured with this configuration
+        trials          every configuration tried while tuning
+    """
+
+    num_threads: int
+    num_workers: int
+    micro_batch: int
+    tokens_per_sec: float
+    trials: list[dict[str, Any]] = field(default_factory=list)
+
+    def apply(self) -> None:
+        # Third Party
+        import torch
+
+        torch.set_num_threads(self.num_threads)
+
+
+def tuning_key(model_path: str, **settings: Any) -> str:
+    """Key of the tuning profile of a model on this host"""
+    try:
+        torch_version = version("torch")
+    except PackageNotFoundError:
+        torch_version = "unknown"
+    config_file = Path(model_path) / "config.json"
+    fingerprint = {
+        "host": platform.node(),
+        "machine": platform.machine(),
+        "logical_cpus": psutil.cpu_count(logical=True),
+        "physical_cpus": psutil.cpu_count(logical=False),
+        "total_memory": psutil.virtual_memory().total,
+        "torch": torch_version,
+        # checkpoints of the same architecture share a profile
+        "model": (
+            hashlib.sha256(config_file.read_bytes()).hexdigest()
+            if config_file.is_file()
+            else str(model_path)
+        ),
+        **settings,
+    }
+    return hashlib.sha256(
+        json.dumps(fingerprint, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def thread_candidates() -> list[int]:
+    logical = psutil.cpu_count(logical=True) or 1
+    physical = psutil.cpu_count(logical=False) or logical
+    return sorted({max(1, physical // 4), max(1, physical // 2), physical, logical})
+
+
+def worker_candidates(num_threads: int) -> list[int]:
+    logical = psutil.cpu_count(logical=True) or 1
+    # leave the cores used by the training step to it
+    spare = max(0, logical - num_threads)
+    return [0] + [n for n in (1, 2, 4, 8, 16) if n <= max(1, spare)]
+
+
+class PeakMemoryMonitor(threading.Thread):
+    """Samples the resident memory of this process until stopped"""
+
+    def __init__(self, interval: float = 0.05) -> None:
+        super().__init__(name="peak-memory-monitor", daemon=True)
+        self.interval = interval
+        self._process = psutil.Process()
+        self.peak = self._process.memory_info().rss
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, self._process.memory_info().rss)
+
+    def __enter__(self) -> "PeakMemoryMonitor":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._stop_event.set()
+        self.join()
+        self.peak = max(self.peak, self._process.memory_info().rss)
+
+
+class CPUAutoTuner:
+    """
+    Tunes the CPU training step of one model on this host, or reuses its saved profile.
+
+    Attributes:
+        path            file of the saved tuning profile
+        memory_budget   resident memory, in bytes, that trials must stay under
+    """
+
+    def __init__(
+        self,
+        key: str,
+        memory_budget: Optional[int] = None,
+        tuning_dir: str | Path | None = None,
+    ) -> None:
+        self.path = Path(tuning_dir or DEFAULTS.TRAINING_TUNING_DIR) / f"{key}.json"
+        if memory_budget is None:
+            memory_budget = psutil.Process().memory_info().rss + int(
+                psutil.virtual_memory().available * DEFAULT_MEMORY_FRACTION
+            )
+        self.memory_budget = memory_budget
+
+    def load(self) -> Optional[TuningProfile]:
+        if not self.path.is_file():
+            return None
+        try:
+            return TuningProfile(**json.loads(self.path.read_text(encoding="utf-8")))
+        except (ValueError, TypeError):
+            logger.warning(f"Ignoring unreadable tuning profile {self.path}")
+            return None
+
+    def save(self, profile: TuningProfile) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_file.write_text(json.dumps(asdict(profile), indent=2), encoding="utf-8")
+        os.replace(tmp_file, self.path)
+
+    def tune(
+        self,
+        compute_trial: Callable[[int], tuple[int, float]],
+        micro_batches: list[int],
+        default_micro_batch: int,
+        loader_trial: Optional[Callable[[int, int], tuple[int, float]]] = None,
+        threads: Optional[list[int]] = None,
+        workers: Optional[list[int]] = None,
+    ) -> TuningProfile:
+        """
+        Returns the saved profile, or runs the trials and saves their best configuration
+
+        Args:
+            compute_trial: runs a few training steps at a micro-batch size, returns (tokens, seconds)
+            micro_batches: micro-batch sizes to try
+            default_micro_batch: micro-batch size used without tuning
+            loader_trial: loads a few batches with a number of workers and a micro-batch size,
+                returns (tokens, seconds)
+            threads: intra-op thread counts to try, all sensible ones by default
+            workers: dataloader worker counts to try, all sensible ones by default
+        """
+        # Third Party
+        import torch
+
+        profile = self.load()
+        if profile is not None:
+            logger.info(
+                f"Using tuning profile {self.path}: {profile.num_threads} threads, "
+                f"{profile.num_workers} dataloader workers, micro-batch {profile.micro_batch} "
+                f"({profile.tokens_per_sec:.1f} tokens/sec when tuned)"
+            )
+            profile.apply()
+            return profile
+
+        default_threads = torch.get_num_threads()
+        threads = threads or thread_candidates()
+        trials: list[dict[str, Any]] = []
+        logger.info(
+            f"Auto-tuning the training step, memory budget {self.memory_budget / 1024**3:.1f} GiB"
+        )
+
+        def run(micro_batch: int, num_threads: int) -> Optional[float]:
+            torch.set_num_threads(num_threads)
+            trial: dict[str, Any] = {"threads": num_threads, "micro_batch": micro_batch}
+            try:
+                with PeakMemoryMonitor() as monitor:
+                    tokens, seconds = compute_trial(micro_batch)
+            except (RuntimeError, MemoryError) as e:
+                # out of memory or an unsupported shape, this configuration is not an option
+                trial["error"] = str(e).splitlines()[0] if str(e) else type(e).__name__
+                trials.append(trial)
+                logger.info(f"Auto-tune trial {trial} failed")
+                return None
+            trial["peak_rss"] = monitor.peak
+            trial["tokens_per_sec"] = tokens / seconds if seconds else 0.0
+            trials.append(trial)
+            logger.info(f"Auto-tune trial {trial}")
+            if monitor.peak > self.memory_budget:
+                return None
+            return trial["tokens_per_sec"]
+
+        # stage 1: intra-op threads at the default micro-batch
+        by_threads = {n: run(default_micro_batch, n) for n in threads}
+        measured_threads = {n: tps for n, tps in by_threads.items() if tps is not None}
+        if not measured_threads:
+            torch.set_num_threads(default_threads)
+            logger.warning(
+                "Auto-tuning failed at the default configuration, training with the defaults"
+            )
+            return TuningProfile(
+                num_threads=default_threads,
+                num_workers=(workers or [0])[0],
+                micro_batch=default_micro_batch,
+                tokens_per_sec=0.0,
+                trials=trials,
+            )
+        best_threads = max(measured_threads, key=measured_threads.__getitem__)
+        default_tps = by_threads.get(default_threads) or measured_threads[best_threads]
+
+        # stage 2: micro-batch sizes, smallest first, stopping before the memory budget
+        by_micro_batch = {default_micro_batch: measured_threads[best_threads]}
+        peaks = [
+            (default_micro_batch, trial["peak_rss"])
+            for trial in trials
+            if trial["threads"] == best_threads and "peak_rss" in trial
+        ]
+        for micro_batch in sorted(micro_batches):
+            if micro_batch in by_micro_batch:
+                continue
+            if _projected_peak(peaks, micro_batch) > self.memory_budget:
+                logger.info(
+                    f"Skipping micro-batch {micro_batch}, projected to exceed the memory budget"
+                )
+                break
+            tps = run(micro_batch, best_threads)
+            if trials[-1].get("peak_rss") is not None:
+                peaks.append((micro_batch, trials[-1]["peak_rss"]))
+            if tps is None:
+                break
+            by_micro_batch[micro_batch] = tps
+        best_micro_batch = max(by_micro_batch, key=by_micro_batch.__getitem__)
+        best_tps = by_micro_batch[best_micro_batch]
+
+        # stage 3: the fewest dataloader workers that keep up with the step
+        workers = workers or worker_candidates(best_threads)
+        best_workers = workers[0]
+        if loader_trial is not None and len(workers) > 1:
+            fastest = 0.0
+            for num_workers in workers:
+                tokens, seconds = loader_trial(num_workers, best_micro_batch)
+                loader_tps = tokens / seconds if seconds else float("inf")
+                trials.append(
+                    {
+                        "workers": num_workers,
+                        "micro_batch": best_micro_batch,
+                        "loader_tokens_per_sec": loader_tps,
+                    }
+                )
+                logger.info(f"Auto-tune trial {trials[-1]}")
+                if loader_tps > fastest:
+                    fastest, best_workers = loader_tps, num_workers
+                if loader_tps >= best_tps * LOADER_HEADROOM:
+                    best_workers = num_workers
+                    break
+
+        profile = TuningProfile(
+            num_threads=best_threads,
+            num_workers=best_workers,
+            micro_batch=best_micro_batch,
+            tokens_per_sec=best_tps,
+            trials=trials,
+        )
+        self.save(profile)
+        profile.apply()
+        logger.info(
+            f"Auto-tuned training step: {best_threads} threads, {best_workers} dataloader workers, "
+            f"micro-batch {best_micro_batch}, {best_tps:.1f} tokens/sec "
+            f"({best_tps / default_tps:.2f}x the default configuration). Saved to {self.path}"
+        )
+        return profile
+
+
+def _projected_peak(peaks: list[tuple[int, int]], micro_batch: int) -> float:
+    """Peak memory at a micro-batch size, extrapolated from the last two trials"""
+    if len(peaks) < 2:
+        return 0.0
+    (m1, p1), (m2, p2) = peaks[-2], peaks[-1]
+    if m2 == m1:
+        return p2
+    return p2 + (p2 - p1) / (m2 - m1) * (micro_batch - m2)
@@ -3,13 +3,10 @@
 # Standard
 from pathlib import Path
 import logging
-import os
+import time
 import typing
 
 # Third Party
-# https://huggingface.co/docs/datasets/en/package_reference/loading_methods#datasets.load_dataset
-from datasets import load_dataset
-
 # Parameter-Efficient Fine-Tuning: https://huggingface.co/docs/peft
 from peft import LoraConfig
 from tqdm import tqdm
@@ -26,7 +23,9 @@ from transformers import (
     BitsAndBytesConfig,
     StoppingCriteria,
     StoppingCriteriaList,
+    TrainerCallback,
 )
+from transformers.trainer_utils import get_last_checkpoint
 
 # Transformer Reinforcement Learning
 # https://huggingface.co/docs/trl/index
@@ -34,12 +33,22 @@ from trl import DataCollatorForCompletionOnlyLM, SFTConfig, SFTTrainer
 import torch
 
 # First Party
+from instructlab.data.columnar import load_dataset_file
+from instructlab.train.autotune import CPUAutoTuner, TuningProfile, tuning_key
+from instructlab.train.packing import (
+    PackedCompletionCollator,
+    add_packed_attention_mask,
+    available_memory,
+    packing_token_budget,
+)
+from instructlab.train.telemetry import TelemetryOptions, TrainingTelemetry
 from instructlab.utils import ensure_legacy_dataset
 
 # Local
 from ..model.chat import CONTEXTS
 
 logger = logging.getLogger(__name__)
+STOP_WORDS = ["<|endoftext|>", "<|assistant|>"]
 # TODO CPU: Look into using these extensions
 # import intel_extension_for_pytorch as ipex
 
@@ -53,13 +62,84 @@ class StoppingCriteriaSub(StoppingCriteria):
 
     def __call__(
         self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs
-    ) -> bool:
-        for seqs in input_ids:
+    ) -> torch.BoolTensor:
+        # one flag per sequence, so that a batch keeps generating the unfinished ones
+        done = torch.zeros(input_ids.shape[0], dtype=torch.bool, device=self.device)
+        for i, seqs in enumerate(input_ids):
             seq = seqs[-1].to(self.device)
             for stop in self.stops:
                 if stop == seq:
-                    return True
-        return False
+                    done[i] = True
+        return done
+
+
+class TelemetrySFTTrainer(SFTTrainer):
+    """SFTTrainer that splits the time of each training step into its forward and backward pass"""
+
+    def __init__(self, *args, telemetry: TrainingTelemetry, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.telemetry = telemetry
+        self.step_tokens = 0
+        self._forward_seconds = 0.0
+
+    def compute_loss(self, model, inputs, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().compute_loss(model, inputs, *args, **kwargs)
+        finally:
+            self._forward_seconds += time.perf_counter() - start
+
+    def training_step(self, model, inputs, *args, **kwargs):
+        # packed batches have no padding, and no attention mask
+        attention_mask = inputs.get("attention_mask")
+        self.step_tokens += int(
+            attention_mask.sum()
+            if attention_mask is not None
+            else inputs["input_ids"].numel()
+        )
+        self._forward_seconds = 0.0
+        start = time.perf_counter()
+        loss = super().training_step(model, inputs, *args, **kwargs)
+        elapsed = time.perf_counter() - start
+        self.telemetry.add_phase("forward", self._forward_seconds)
+        self.telemetry.add_phase("backward", elapsed - self._forward_seconds)
+        return loss
+
+
+class TelemetryCallback(TrainerCallback):
+    """Writes the data wait and optimizer time of each step and the step record itself"""
+
+    def __init__(self, trainer: TelemetrySFTTrainer):
+        self.trainer = trainer
+        self.telemetry = trainer.telemetry
+        self._batch_requested = time.perf_counter()
+        self._optimizer_start = 0.0
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        self._batch_requested = time.perf_counter()
+
+    def on_step_begin(self, args, state, control, **kwargs):
+        self.telemetry.add_phase(
+            "data_wait", time.perf_counter() - self._batch_requested
+        )
+
+    def on_pre_optimizer_step(self, args, state, control, **kwargs):
+        self._optimizer_start = time.perf_counter()
+
+    def on_optimizer_step(self, args, state, control, **kwargs):
+        self.telemetry.add_phase(
+            "optimizer", time.perf_counter() - self._optimizer_start
+        )
+
+    def on_step_end(self, args, state, control, **kwargs):
+        self.telemetry.record_step(
+            epoch=int(state.epoch or 0),
+            step=state.global_step,
+            tokens=self.trainer.step_tokens,
+            step_seconds=time.perf_counter() - self._batch_requested,
+        )
+        self.trainer.step_tokens = 0
+        self._batch_requested = time.perf_counter()
 
 
 def create_prompt(
@@ -75,6 +155,64 @@ def create_prompt(
     """
 
 
+def compared_test_samples(test_dataset, max_test_samples: int | None = None):
+    """The test samples the model is compared on before and after training"""
+    if max_test_samples is not None and max_test_samples < len(test_dataset):
+        return test_dataset.select(range(max_test_samples))
+    return test_dataset
+
+
+def generate_responses(
+    model, tokenizer, users: list[str], batch_size: int = 1, **kwargs
+) -> list[str]:
+    """Generates the responses of the model to user prompts, batch_size prompts at a time"""
+    stop_words_ids = [
+        tokenizer(stop_word, return_tensors="pt", add_special_tokens=False)[
+            "input_ids"
+        ].squeeze()
+        for stop_word in STOP_WORDS
+    ]
+    generate_kwargs: dict[str, typing.Any] = {
+        "max_new_tokens": 256,
+        "pad_token_id": tokenizer.eos_token_id,
+        "temperature": 0.7,
+        "top_p": 0.9,
+        "stopping_criteria": StoppingCriteriaList(
+            [StoppingCriteriaSub(stops=stop_words_ids, device=model.device)]
+        ),
+        "do_sample": True,
+        **kwargs,
+    }
+    system_prompt = CONTEXTS["default"]("default")
+
+    responses: list[str] = []
+    for start in tqdm(range(0, len(users), batch_size)):
+        texts = [
+            create_prompt(user=user, system=system_prompt)
+            for user in users[start : start + batch_size]
+        ]
+        # pad on the left, so that generation continues right after every prompt
+        padding_side = tokenizer.padding_side
+        tokenizer.padding_side = "left"
+        try:
+            inputs = tokenizer(texts, return_tensors="pt", padding=True).to(
+                model.device
+            )
+        finally:
+            tokenizer.padding_side = padding_side
+        outputs = model.generate(
+            input_ids=inputs.input_ids,
+            attention_mask=inputs.attention_mask,
+            **generate_kwargs,
+        )
+        for text in tokenizer.batch_decode(outputs[:, inputs.input_ids.shape[1] :]):
+            # finished responses are padded with EOS up to the longest one of the batch
+            for stop_word in (*STOP_WORDS, tokenizer.eos_token or STOP_WORDS[0]):
+                text = text.split(stop_word)[0]
+            responses.append(text.strip())
+    return responses
+
+
 def formatting_prompts_func(example):
     output_texts = []
     for i in range(len(example["system"])):
@@ -83,6 +221,52 @@ def formatting_prompts_func(example):
     return output_texts
 
 
+def autotune_threads(
+    model, tokenizer, collator, train_dataset, max_seq_length: int
+) -> TuningProfile:
+    """Picks the intra-op thread count of LoRA training on CPU
+
+    Only threads are tuned: the micro-batch size is the effective batch size
+    here, so changing it would change training, not only its speed.
+    """
+    key = tuning_key(
+        model.name_or_path,
+        pipeline="simple",
+        dtype=str(model.dtype),
+        max_seq_length=max_seq_length,
+    )
+    samples = train_dataset.select(range(min(len(train_dataset), 3)))
+    features = [
+        tokenizer(text, truncation=True, max_length=max_seq_length)
+        for text in formatting_prompts_func(samples[:])
+    ]
+
+    def compute_trial(micro_batch: int) -> tuple[int, float]:
+        tokens, seconds = 0, 0.0
+        # with frozen weights, backward runs through the activations like it
+        # does for LoRA adapters, without allocating gradients for every weight
+        requires_grad = {n: p.requires_grad for n, p in model.named_parameters()}
+        model.requires_grad_(False)
+        model.enable_input_require_grads()
+        try:
+            for i in range(0, len(features), micro_batch):
+                batch = collator(features[i : i + micro_batch])
+                batch = {k: v.to(model.device) for k, v in batch.items()}
+                start = time.perf_counter()
+                model(**batch).loss.backward()
+                # the first step warms up
+                if i > 0:
+                    seconds += time.perf_counter() - start
+                    tokens += batch["input_ids"].numel()
+        finally:
+            model.disable_input_require_grads()
+            for name, param in model.named_parameters():
+                param.requires_grad_(requires_grad[name])
+        return tokens, seconds
+
+    return CPUAutoTuner(key).tune(compute_trial, [1], 1, workers=[0])
+
+
 def report_cuda_device(args_device: torch.device, min_vram: int = 0) -> None:
     """Report CUDA/ROCm device properties"""
     print(f"  NVidia CUDA version: {torch.version.cuda or 'n/a'}")
@@ -127,8 +311,30 @@ def linux_train(
     train_device: str = "cpu",
     four_bit_quant: bool = False,
     output_dir: Path = Path("training_results"),
+    telemetry: TelemetryOptions | None = None,
+    autotune: bool = False,
+    checkpoint_interval: int = 0,
+    keep_checkpoints: int = 2,
+    resume: bool = False,
+    test_batch_size: int = 8,
+    max_test_samples: int | None = None,
+    packing: bool = False,
 ) -> Path:
-    """Lab Train for Linux!"""
+    """Lab Train for Linux!
+
+    With telemetry, the data wait, forward, backward and optimizer time, tokens/sec
+    and memory of every step are written to telemetry.jsonl in output_dir.
+    With autotune on CPU, the number of intra-op threads is picked by short timed
+    trials, or taken from the profile saved for this host and model.
+    With checkpoint_interval, a checkpoint with the optimizer, scheduler and RNG state
+    is saved every that many steps, keeping the last keep_checkpoints, and resume
+    continues from the latest checkpoint in output_dir.
+    The responses of the model before and after training are generated test_batch_size
+    test samples at a time, for the first max_test_samples test samples (all by default).
+    With packing, the samples of a step are concatenated into one sequence, keeping
+    the loss on the responses only, and the number of samples per step is picked
+    from the memory available.
+    """
 
     try:
         device = torch.device(train_device)
@@ -169,11 +375,9 @@ def linux_train(
 
     print("LINUX_TRAIN.PY: LOADING DATASETS")
     # Get the file name
-    train_dataset = load_dataset(
-        "json", data_files=os.fspath(train_file), split="train"
-    )
-
-    test_dataset = load_dataset("json", data_files=os.fspath(test_file), split="train")
+    # JSONL, or its Parquet/Arrow copy from `ilab data convert`
+    train_dataset = load_dataset_file(train_file)
+    test_dataset = load_dataset_file(test_file)
     try:
         train_dataset = ensure_legacy_dataset(train_dataset)
         test_dataset = ensure_legacy_dataset(test_dataset)
@@ -231,38 +435,10 @@ def linux_train(
         print(torch.cuda.memory_summary())
 
     print("LINUX_TRAIN.PY: SANITY CHECKING THE BASE MODEL")
-    stop_words = ["<|endoftext|>", "<|assistant|>"]
-    stop_words_ids = [
-        tokenizer(stop_word, return_tensors="pt", add_special_tokens=False)[
-            "input_ids"
-        ].squeeze()
-        for stop_word in stop_words
-    ]
-    stopping_criteria = StoppingCriteriaList(
-        [StoppingCriteriaSub(stops=stop_words_ids, device=model.device)]
+    compared_dataset = compared_test_samples(test_dataset, max_test_samples)
+    assistant_old_lst = generate_responses(
+        model, tokenizer, compared_dataset["user"], batch_size=test_batch_size
     )
-
-    def model_generate(user, **kwargs):
-        system_prompt = CONTEXTS["default"]("default")
-        text = create_prompt(user=user, system=system_prompt)
-
-        input_ids = tokenizer(text, return_tensors="pt").input_ids.to(model.device)
-        outputs = model.generate(
-            input_ids=input_ids,
-            max_new_tokens=256,
-            pad_token_id=tokenizer.eos_token_id,
-            temperature=0.7,
-            top_p=0.9,
-            stopping_criteria=stopping_criteria,
-            do_sample=True,
-            **kwargs,
-        )
-        return tokenizer.batch_decode([o[:-1] for o in outputs])[0]
-
-    assistant_old_lst = [
-        model_generate(d["user"]).split(response_template.strip())[-1].strip()
-        for d in tqdm(test_dataset)
-    ]
     attention_layers = [
         module for module in model.modules() if "attention" in str(type(module)).lower()
     ]
@@ -298,6 +474,36 @@ def linux_train(
     max_seq_length = 300
     generate_kwargs: dict[str, typing.Any]
 
+    if autotune:
+        if model.device.type == "cpu":
+            autotune_threads(model, tokenizer, collator, train_dataset, max_seq_length)
+        else:
+            logger.warning(
+                f"Auto-tuning is only supported on CPU, not {model.device.type}"
+            )
+
+    # number of tokens of every sample, as the trainer tokenizes them
+    sample_lengths = [
+        len(input_ids)
+        for input_ids in tokenizer(
+            formatting_prompts_func(train_dataset[:]),
+            truncation=True,
+            max_length=max_seq_length,
+        )["input_ids"]
+    ]
+    mean_sample_length = sum(sample_lengths) / max(1, len(sample_lengths))
+    data_collator: typing.Any = collator
+    if packing:
+        token_budget = packing_token_budget(
+            model, max_seq_length, available_memory(model.device)
+        )
+        per_device_train_batch_size = max(1, int(token_budget // mean_sample_length))
+        data_collator = PackedCompletionCollator(collator)
+        print(
+            f"LINUX_TRAIN.PY: PACKING {per_device_train_batch_size} SAMPLES PER STEP "
+            f"({mean_sample_length:.0f} TOKENS PER SAMPLE ON AVERAGE)"
+        )
+
     training_arguments = SFTConfig(
         output_dir=output_dir,
         num_train_epochs=num_epochs,
@@ -306,7 +512,9 @@ def linux_train(
         bf16=not use_fp16,
         # use_ipex=True, # TODO CPU test this possible optimization
         use_cpu=model.device.type == "cpu",
-        save_strategy="epoch",
+        save_strategy="steps" if checkpoint_interval else "epoch",
+        save_steps=checkpoint_interval or 500,
+        save_total_limit=keep_checkpoints if checkpoint_interval else None,
         report_to="none",
         max_seq_length=max_seq_length,
         # options to reduce GPU memory usage and improve performance
@@ -321,30 +529,66 @@ def linux_train(
     )
 
     # https://huggingface.co/docs/trl/main/en/sft_trainer#trl.SFTTrainer
-    trainer = SFTTrainer(
-        model=model,
-        train_dataset=train_dataset,
-        eval_dataset=test_dataset,
-        peft_config=peft_config,
-        formatting_func=formatting_prompts_func,
-        data_collator=collator,
-        processing_class=tokenizer,
-        args=training_arguments,
-    )
+    trainer_kwargs: dict[str, typing.Any] = {
+        "model": model,
+        "train_dataset": train_dataset,
+        "eval_dataset": test_dataset,
+        "peft_config": peft_config,
+        "formatting_func": formatting_prompts_func,
+        "data_collator": data_collator,
+        "processing_class": tokenizer,
+        "args": training_arguments,
+    }
     generate_kwargs = {}
 
+    resume_checkpoint = None
+    if resume:
+        resume_checkpoint = (
+            get_last_checkpoint(str(output_dir)) if output_dir.is_dir() else None
+        )
+        if resume_checkpoint is None:
+            print(f"LINUX_TRAIN.PY: NO CHECKPOINT TO RESUME FROM IN {output_dir}")
+        else:
+            print(f"LINUX_TRAIN.PY: RESUMING FROM {resume_checkpoint}")
+
     print("LINUX_TRAIN.PY: TRAINING")
-    trainer.train()
+    packed_mask_hook = add_packed_attention_mask(model) if packing else None
+    try:
+        if telemetry is not None:
+            with TrainingTelemetry(output_dir, "simple", telemetry) as step_telemetry:
+                trainer = TelemetrySFTTrainer(
+                    **trainer_kwargs, telemetry=step_telemetry
+                )
+                trainer.add_callback(TelemetryCallback(trainer))
+                train_output = trainer.train(resume_from_checkpoint=resume_checkpoint)
+        else:
+            trainer = SFTTrainer(**trainer_kwargs)
+            train_output = trainer.train(resume_from_checkpoint=resume_checkpoint)
+    finally:
+        if packed_mask_hook is not None:
+            packed_mask_hook.remove()
+
+    samples_per_second = train_output.metrics.get("train_samples_per_second")
+    if samples_per_second:
+        print(
+            f"LINUX_TRAIN.PY: TRAINED {samples_per_second:.2f} SAMPLES/SEC, "
+            f"{samples_per_second * mean_sample_length:.1f} TOKENS/SEC"
+        )
 
     model.config.use_cache = True
 
     print("LINUX_TRAIN.PY: RUNNING INFERENCE ON THE OUTPUT MODEL")
 
-    for i, (d, assistant_old) in enumerate(
-        zip(test_dataset, assistant_old_lst, strict=False)
+    assistant_new_lst = generate_responses(
+        model,
+        tokenizer,
+        compared_dataset["user"],
+        batch_size=test_batch_size,
+        **generate_kwargs,
+    )
+    for i, (d, assistant_old, assistant_new) in enumerate(
+        zip(compared_dataset, assistant_old_lst, assistant_new_lst, strict=False)
     ):
-        output = model_generate(d["user"], **generate_kwargs)
-        assistant_new = output.split(response_template.strip())[-1].strip()
         assistant_expected = d["assistant"]
 
         print(f"\n===\ntest {i}\n===\n")
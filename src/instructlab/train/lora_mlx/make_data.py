@@ -1,11 +1,19 @@
 # SPDX-License-Identifier: MIT
 
 # Standard
+from collections import deque
+from typing import Iterable, Iterator, Optional
+import contextlib
+import hashlib
 import json
+import logging
 
 # Local
+from ...data.columnar import iter_dataset_file
 from ...utils import get_sysprompt
 
+logger = logging.getLogger(__name__)
+
 
 def format_text(obj):
     return f"""\
@@ -18,66 +26,126 @@ def format_text(obj):
 """
 
 
-def make_data(data_dir: str, is_shiv: bool = False):
+# share of the samples of every split, train_gen samples are split in train and valid
+GEN_SPLIT_RATIOS = {"train": 0.8, "valid": 0.2}
+# the Shiv generated data has no test file of its own
+SHIV_SPLIT_RATIOS = {"train": 0.7, "valid": 0.2, "test": 0.1}
+
+
+def split_of(key: str, ratios: dict[str, float], salt: str = "") -> str:
+    """
+    Split a sample belongs to, from a stable hash of its text
+
+    The assignment does not depend on the order or the number of samples, so it is
+    the same on every run and identical samples always land in the same split.
+    """
+    digest = hashlib.blake2b(f"{salt}{key}".encode("utf-8"), digest_size=8).digest()
+    position = int.from_bytes(digest, "big") / 2**64 * sum(ratios.values())
+    for split, ratio in ratios.items():
+        if position < ratio:
+            return split
+        position -= ratio
+    # rounding of the ratios
+    return list(ratios)[-1]
+
+
+def write_splits(
+    samples: Iterable[dict[str, str]],
+    data_dir: str,
+    ratios: dict[str, float],
+    salt: str = "",
+) -> dict[str, int]:
+    """
+    Writes the samples to `<split>.jsonl` files of data_dir one at a time
+
+    Small datasets can hash every sample into the first split. Every other split
+    that ends up empty then gets one of the last samples of the first split, since
+    MLX training fails on an empty validation set. Returns the number of samples
+    written to every split.
+    """
+    counts = dict.fromkeys(ratios, 0)
+    first, *others = ratios
+    # offsets of the last samples of the first split, enough to fill every other split
+    last_offsets: deque[int] = deque(maxlen=len(others))
+    with contextlib.ExitStack() as stack:
+        files = {
+            split: stack.enter_context(
+                open(f"{data_dir}/{split}.jsonl", "w", encoding="utf-8")
+            )
+            for split in ratios
+        }
+        for obj in samples:
+            split = split_of(obj["user"] + obj["assistant"], ratios, salt)
+            if split == first:
+                last_offsets.append(files[split].tell())
+            files[split].write(json.dumps(obj | {"text": format_text(obj)}) + "\n")
+            counts[split] += 1
+
+        empty = [split for split in others if not counts[split]]
+        if empty and counts[first] <= len(empty):
+            raise ValueError(
+                f"{sum(counts.values())} samples cannot fill the {', '.join(ratios)} splits, at least {len(ratios)} are needed"
+            )
+        for split in empty:
+            offset = last_offsets.pop()
+            files[first].flush()
+            with open(f"{data_dir}/{first}.jsonl", "rb+") as f:
+                f.seek(offset)
+                line = f.readline()
+                f.truncate(offset)
+            files[first].seek(offset)
+            files[split].write(line.decode("utf-8"))
+            counts[first] -= 1
+            counts[split] += 1
+            logger.debug(f"Moved a sample from {first} to the empty {split} split")
+    return counts
+
+
+def _samples(filename: str, user_key: str, assistant_key: str) -> Iterator[dict]:
+    system = get_sysprompt("default")
+    for obj in iter_dataset_file(filename):
+        yield {
+            "system": system,
+            "user": obj[user_key],
+            "assistant": obj[assistant_key],
+        }
+
+
+def make_data(
+    data_dir: str,
+    is_shiv: bool = False,
+    ratios: Optional[dict[str, float]] = None,
+    salt: str = "",
+):
+    """
+    Writes the train, valid and test files of MLX training with a "text" field
+
+    The samples are streamed from the generated files and assigned to a split by a
+    stable hash of their text, in the given ratios. Changing the salt draws another
+    split of the same samples.
+    """
     if not is_shiv:
         # This branch uses data from `lab generate`
-        # train_gen.jsonl and test_gen.jsonl are the two files produced by `lab generate`
-        for filename in [f"{data_dir}/train_gen.jsonl", f"{data_dir}/test_gen.jsonl"]:
-            # Load the JSON Lines file
-            with open(filename, "r", encoding="utf-8") as f:
-                data = [json.loads(line) for line in f]
-
-            # Add the "text" field with value "x" to each object
-            data_new = []
-            for obj in data:
-                obj_new = {
-                    "system": get_sysprompt("default"),
-                    "user": obj["user"],
-                    "assistant": obj["assistant"],
-                }
-                data_new.append(obj_new | {"text": format_text(obj_new)})
-
-            # Save the modified objects back to the JSON Lines file
-            if "train_gen" in filename:
-                n = len(data_new) * 8 // 10
-                with open(f"{data_dir}/train.jsonl", "w", encoding="utf-8") as f:
-                    for obj in data_new[:n]:
-                        f.write(json.dumps(obj) + "\n")
-                with open(f"{data_dir}/valid.jsonl", "w", encoding="utf-8") as f:
-                    for obj in data_new[n:]:
-                        f.write(json.dumps(obj) + "\n")
-            if "test_gen" in filename:
-                with open(f"{data_dir}/test.jsonl", "w", encoding="utf-8") as f:
-                    for obj in data_new:
-                        f.write(json.dumps(obj) + "\n")
+        # train_gen.jsonl and test_gen.jsonl are the two files produced by `lab generate`,
+        # or their Parquet/Arrow copies
+        counts = write_splits(
+            _samples(f"{data_dir}/train_gen.jsonl", "user", "assistant"),
+            data_dir,
+            ratios or GEN_SPLIT_RATIOS,
+            salt,
+        )
+        counts |= write_splits(
+            _samples(f"{data_dir}/test_gen.jsonl", "user", "assistant"),
+            data_dir,
+            {"test": 1.0},
+        )
     else:
         # This branch is to use Shiv generated data
         # You can ignore for now
-        filename = f"{data_dir}/raw.jsonl"
-
-        # Load the JSON Lines file
-        with open(filename, "r", encoding="utf-8") as f:
-            data = [json.loads(line) for line in f]
-
-        # Add the "text" field with value "x" to each object
-        data_new = []
-        for obj in data:
-            obj_new = {
-                "system": get_sysprompt("default"),
-                "user": obj["inputs"],
-                "assistant": obj["targets"],
-            }
-            data_new.append(obj_new | {"text": format_text(obj_new)})
-
-        # Save the modified objects back to the JSON Lines file
-        n = len(data_new) // 10 * 7
-        m = len(data_new) // 10 * 2 + n
-        with open(f"{data_dir}/train.jsonl", "w", encoding="utf-8") as f:
-            for obj in data_new[:n]:
-                f.write(json.dumps(obj) + "\n")
-        with open(f"{data_dir}/valid.jsonl", "w", encoding="utf-8") as f:
-            for obj in data_new[n:m]:
-                f.write(json.dumps(obj) + "\n")
-        with open(f"{data_dir}/test.jsonl", "w", encoding="utf-8") as f:
-            for obj in data_new[:m]:
-                f.write(json.dumps(obj) + "\n")
+        counts = write_splits(
+            _samples(f"{data_dir}/raw.jsonl", "inputs", "targets"),
+            data_dir,
+            ratios or SHIV_SPLIT_RATIOS,
+            salt,
+        )
+    logger.debug(f"Samples per split: {counts}")
@@ -0,0 +1,165 @@
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Sequence packing for training.
+
+Several samples are concatenated into one sequence, with position ids that
+restart at every sample. Flash attention finds the sample boundaries from the
+position ids; other attention implementations are given a block-diagonal
+mask, built from the position ids right before the forward pass, so that
+samples never attend to each other.
+"""
+
+# Standard
+from typing import Any, Optional
+import logging
+
+# Third Party
+import psutil
+import torch
+
+logger = logging.getLogger(__name__)
+
+# share of the available memory that packed activations may use
+PACKING_MEMORY_FRACTION = 0.5
+# packed sequences are at most this many times the maximum sample length
+MAX_PACKING_FACTOR = 16
+
+
+def uses_position_ids(model) -> bool:
+    """Whether the attention of the model separates packed samples by their position ids"""
+    return getattr(model.config, "_attn_implementation", None) == "flash_attention_2"
+
+
+def sample_spans(position_ids: torch.Tensor) -> list[tuple[int, int]]:
+    """(start, end) of every sample of a packed row, where its position ids restart at 0"""
+    starts = (position_ids == 0).nonzero().flatten().tolist()
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    return list(zip(starts, [*starts[1:], len(position_ids)], strict=True))
+
+
+def packed_attention_mask(position_ids: torch.Tensor, model) -> torch.Tensor:
+    """
+    Block-diagonal causal mask of packed rows, shape (batch, 1, length, length)
+
+    SDPA takes a boolean mask, one byte per element; eager attention adds the mask
+    to its scores, so it gets an additive mask in the model's dtype. The mask is
+    allocated once and every sample's block is filled in place.
+    """
+    batch_size, length = position_ids.shape
+    if getattr(model.config, "_attn_implementation", None) == "sdpa":
+        mask = torch.zeros(
+            (batch_size, 1, length, length),
+            dtype=torch.bool,
+            device=position_ids.device,
+        )
+        for row in range(batch_size):
+            for start, end in sample_spans(position_ids[row]):
+                mask[row, 0, start:end, start:end] = True
+                mask[row, 0, start:end, start:end].tril_()
+        return mask
+
+    mask = torch.full(
+        (batch_size, 1, length, length),
+        torch.finfo(model.dtype).min,
+        dtype=model.dtype,
+        device=position_ids.device,
+    )
+    for row in range(batch_size):
+        for start, end in sample_spans(position_ids[row]):
+            # zero on and below the diagonal, the minimum above it
+            mask[row, 0, start:end, start:end].triu_(1)
+    return mask
+
+
+def add_packed_attention_mask(model) -> Optional[torch.utils.hooks.RemovableHandle]:
+    """
+    Makes the decoder of the model build the mask of packed batches itself
+
+    Packed batches carry position ids and no attention mask. Returns the hook handle,
+    or None when the attention implementation needs no mask.
+    """
+    if uses_position_ids(model):
+        return None
+
+    def hook(module, args, kwargs: dict[str, Any]):
+        position_ids = kwargs.get("position_ids")
+        if kwargs.get("attention_mask") is None and position_ids is not None:
+            kwargs["attention_mask"] = packed_attention_mask(position_ids, model)
+        return args, kwargs
+
+    # the PEFT wrappers call the forward of the causal LM model directly,
+    # the decoder below it goes through __call__ and its hooks
+    return model.base_model.register_forward_pre_hook(hook, with_kwargs=True)
+
+
+class PackedCompletionCollator:
+    """
+    Packs a batch into a single sequence, keeping the loss masking of another collator
+
+    The wrapped collator pads the batch and masks the labels of the prompts,
+    padding is then dropped and the samples are concatenated.
+    """
+
+    def __init__(self, collator) -> None:
+        self.collator = collator
+
+    def __call__(self, features: list[dict[str, Any]]) -> dict[str, torch.Tensor]:
+        batch = self.collator(features)
+        keep = batch["attention_mask"].bool()
+        input_ids = batch["input_ids"][keep]
+        labels = batch["labels"][keep]
+        lengths = keep.sum(dim=1)
+        starts = torch.cumsum(lengths, dim=0) - lengths
+        # the first token of a sample must not be predicted from the previous sample
+        labels[starts] = -100
+        position_ids = torch.cat([torch.arange(int(n)) for n in lengths])
+        return {
+            "input_ids": input_ids.unsqueeze(0),
+            "labels": labels.unsqueeze(0),
+            "position_ids": position_ids.unsqueeze(0),
+        }
+
+
+def available_memory(device: torch.device) -> int:
+    """Bytes free for training on device"""
+    if device.type == "cuda":
+        return torch.cuda.mem_get_info(device)[0]
+    return psutil.virtual_memory().available
+
+
+def packing_token_budget(model, max_seq_length: int, memory_bytes: int) -> int:
+    """
+    Longest packed sequence, in multiples of max_seq_length, whose activations fit in memory
+
+    A decoder layer keeps about (34 * h + 5 * a * L) * L bytes of 16-bit activations
+    for a sequence of length L, hidden size h and a attention heads
+    (Korthikanti et al., "Reducing Activation Recomputation in Large Transformer Models").
+    """
+    config = model.config
+    hidden_size = config.hidden_size
+    num_layers = config.num_hidden_layers
+    num_heads = config.num_attention_heads
+    element_scale = torch.finfo(model.dtype).bits / 16
+    allowed = memory_bytes * PACKING_MEMORY_FRACTION
+
+    def activation_bytes(length: int) -> float:
+        return (
+            (34 * hidden_size + 5 * num_heads * length)
+            * length
+            * num_layers
+            * element_scale
+        )
+
+    budget = max_seq_length
+    while (
+        budget * 2 <= max_seq_length * MAX_PACKING_FACTOR
+        and activation_bytes(budget * 2) <= allowed
+    ):
+        budget *= 2
+    logger.info(
+        f"Packing up to {budget} tokens per step, {activation_bytes(budget) / 1024**3:.1f} GiB "
+        f"of activations estimated out of {memory_bytes / 1024**3:.1f} GiB available"
+    )
+    return budget
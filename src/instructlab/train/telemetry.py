@@ -0,0 +1,294 @@
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Per-step training telemetry.
+
+Every training step is written as one JSON line with the time spent waiting
+for data, in the forward pass, the backward pass and the optimizer step, the
+number of tokens processed and the memory in use. The latest step can also be
+exported as a Prometheus textfile (for the node exporter's textfile
+collector), and the run is registered so that `ilab process list` can
+summarise it.
+"""
+
+# Standard
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterator, Optional
+import contextlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+# Third Party
+import psutil
+
+# First Party
+from instructlab.defaults import ILAB_PROCESS_STATUS, ILAB_PROCESS_TYPES
+from instructlab.process.process import complete_process, register_process
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_FILE = "telemetry.jsonl"
+# the training library writes one metrics file per rank, rank 0 holds the steps
+TRAINING_LIBRARY_METRICS_FILE = "training_params_and_metrics_global0.jsonl"
+
+
+@dataclass
+class TelemetryOptions:
+    """
+    Where to write training telemetry.
+
+    Attributes:
+        prometheus_textfile     if set, the latest step is also exported to this Prometheus textfile
+    """
+
+    prometheus_textfile: Optional[Path] = None
+
+
+def device_memory_bytes() -> Optional[int]:
+    """Memory allocated by torch on the current accelerator, None on CPU"""
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return None
+    if torch.cuda.is_available():
+        return int(torch.cuda.memory_allocated())
+    if torch.backends.mps.is_available():
+        return int(torch.mps.current_allocated_memory())
+    return None
+
+
+class TrainingTelemetry:
+    """
+    Writes per-step training telemetry to `<output_dir>/telemetry.jsonl`.
+
+    Phases of the current step are timed with `phase()`, and `record_step()`
+    writes them along with tokens/sec and memory usage, then starts the next step.
+    """
+
+    def __init__(
+        self,
+        output_dir: str | Path,
+        pipeline: str,
+        options: Optional[TelemetryOptions] = None,
+    ) -> None:
+        options = options or TelemetryOptions()
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        self.path = output_dir / TELEMETRY_FILE
+        self.pipeline = pipeline
+        self.prometheus_textfile = options.prometheus_textfile
+        self._closed = False
+        self._process = psutil.Process()
+        self._seconds: dict[str, float] = {}
+        self._step_start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.process_uuid = register_process(
+            ILAB_PROCESS_TYPES.TRAINING, telemetry_path=self.path
+        )
+        logger.info(f"Writing training telemetry to {self.path}")
+
+    def __enter__(self) -> "TrainingTelemetry":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close(
+            ILAB_PROCESS_STATUS.ERRORED.value
+            if exc_type is not None
+            else ILAB_PROCESS_STATUS.DONE.value
+        )
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Adds the time spent in the block to phase `name` of the current step"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - start)
+
+    def add_phase(self, name: str, seconds: float) -> None:
+        self._seconds[name] = self._seconds.get(name, 0.0) + seconds
+
+    def record_step(
+        self,
+        epoch: int,
+        step: int,
+        tokens: Optional[int] = None,
+        loss: Optional[float] = None,
+        step_seconds: Optional[float] = None,
+        vram_bytes: Optional[int] = None,
+        rss_bytes: Optional[int] = None,
+        **extra: Any,
+    ) -> dict[str, Any]:
+        """Writes the current step and starts timing the next one"""
+        now = time.perf_counter()
+        if step_seconds is None:
+            step_seconds = now - self._step_start
+        self._step_start = now
+        record: dict[str, Any] = {
+            "timestamp": datetime.now().isoformat(),
+            "pipeline": self.pipeline,
+            "epoch": epoch,
+            "step": step,
+            "step_seconds": step_seconds,
+            "seconds": self._seconds,
+            "tokens": tokens,
+            "tokens_per_sec": (
+                tokens / step_seconds if tokens is not None and step_seconds else None
+            ),
+            "loss": loss,
+            "rss_bytes": (
+                rss_bytes if rss_bytes is not None else self._process.memory_info().rss
+            ),
+            "vram_bytes": (
+                vram_bytes if vram_bytes is not None else device_memory_bytes()
+            ),
+            **extra,
+        }
+        self._seconds = {}
+        with self._lock:
+            # a step takes far longer than opening the file, which is never
+            # left open when training dies
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+            if self.prometheus_textfile is not None:
+                self._write_prometheus(record)
+        return record
+
+    def close(self, status: str = ILAB_PROCESS_STATUS.DONE.value) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        complete_process(self.process_uuid, status)
+
+    def _write_prometheus(self, record: dict[str, Any]) -> None:
+        assert self.prometheus_textfile is not None
+        labels = f'pipeline="{self.pipeline}"'
+        lines = [
+            "# HELP ilab_training_step Last completed training step.",
+            "# TYPE ilab_training_step gauge",
+            f"ilab_training_step{{{labels}}} {record['step']}",
+            "# HELP ilab_training_epoch Epoch of the last completed training step.",
+            "# TYPE ilab_training_epoch gauge",
+            f"ilab_training_epoch{{{labels}}} {record['epoch']}",
+            "# HELP ilab_training_step_seconds Duration of the last training step.",
+            "# TYPE ilab_training_step_seconds gauge",
+            f"ilab_training_step_seconds{{{labels}}} {record['step_seconds']}",
+            "# HELP ilab_training_phase_seconds Time spent in each phase of the last training step.",
+            "# TYPE ilab_training_phase_seconds gauge",
+        ]
+        lines += [
+            f'ilab_training_phase_seconds{{{labels},phase="{phase}"}} {seconds}'
+            for phase, seconds in record["seconds"].items()
+        ]
+        gauges = (
+            ("tokens_per_second", "tokens_per_sec", "Tokens processed per second."),
+            ("loss", "loss", "Loss of the last training step."),
+            ("rss_bytes", "rss_bytes", "Resident memory of the training process."),
+            ("vram_bytes", "vram_bytes", "Accelerator memory allocated by torch."),
+        )
+        for name, key, help_text in gauges:
+            if record.get(key) is None:
+                continue
+            lines += [
+                f"# HELP ilab_training_{name} {help_text}",
+                f"# TYPE ilab_training_{name} gauge",
+                f"ilab_training_{name}{{{labels}}} {record[key]}",
+            ]
+        # the textfile collector must never read a partially written file
+        tmp_file = self.prometheus_textfile.with_name(
+            f".{self.prometheus_textfile.name}.{os.getpid()}"
+        )
+        tmp_file.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        os.replace(tmp_file, self.prometheus_textfile)
+
+
+class TrainingLibraryMetricsFollower(threading.Thread):
+    """
+    Forwards the step metrics the training library writes during accelerated training.
+
+    The library runs in torchrun worker processes, so per-phase timings aren't
+    available; steps are reported with their duration, loss-counted tokens,
+    the rank 0 CUDA memory and the resident memory of all workers.
+    """
+
+    def __init__(
+        self,
+        telemetry: TrainingTelemetry,
+        ckpt_output_dir: str | Path,
+        poll_interval: float = 1.0,
+    ) -> None:
+        super().__init__(name="training-metrics-follower", daemon=True)
+        self.telemetry = telemetry
+        self.metrics_file = Path(ckpt_output_dir) / TRAINING_LIBRARY_METRICS_FILE
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+        # skip the steps of earlier runs in the same directory
+        self._offset = (
+            self.metrics_file.stat().st_size if self.metrics_file.exists() else 0
+        )
+        self._last_timestamp: Optional[datetime] = None
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.poll_interval):
+            self.poll()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+        self.poll()
+
+    def poll(self) -> None:
+        if not self.metrics_file.exists():
+            return
+        with open(self.metrics_file, encoding="utf-8") as f:
+            f.seek(self._offset)
+            while True:
+                line = f.readline()
+                # only consume complete lines
+                if not line.endswith("\n"):
+                    break
+                self._offset = f.tell()
+                try:
+                    metrics = json.loads(line)
+                except ValueError:
+                    continue
+                if "step" in metrics:
+                    self._forward(metrics)
+
+    def _forward(self, metrics: dict[str, Any]) -> None:
+        step_seconds = None
+        timestamp = metrics.get("timestamp")
+        if timestamp is not None:
+            current = datetime.fromisoformat(timestamp)
+            if self._last_timestamp is not None:
+                step_seconds = (current - self._last_timestamp).total_seconds()
+            self._last_timestamp = current
+        cuda_mem = metrics.get("cuda_mem_allocated")
+        self.telemetry.record_step(
+            epoch=metrics.get("epoch", 0),
+            step=metrics["step"],
+            tokens=metrics.get("num_loss_counted_tokens"),
+            loss=metrics.get("total_loss"),
+            step_seconds=step_seconds,
+            # the library reports GiB
+            vram_bytes=int(cuda_mem * 1024**3) if cuda_mem is not None else None,
+            rss_bytes=self._workers_rss(),
+        )
+
+    @staticmethod
+    def _workers_rss() -> int:
+        """Resident memory of this process and the torchrun workers it started"""
+        process = psutil.Process()
+        rss = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                continue
+        return rss
@@ -4,9 +4,13 @@
 from dataclasses import dataclass
 from functools import wraps
 from pathlib import Path
-from typing import List, Tuple, TypedDict
+from typing import Iterable, List, Tuple, TypedDict
+import concurrent.futures
 import copy
 import glob
+import hashlib
+import importlib.metadata
+import itertools
 import json
 import logging
 import os
@@ -41,6 +45,7 @@ import yaml
 from . import common
 from .common import CLI_HELPER_SYS_PROMPT, SYSTEM_PROMPTS, SupportedModelArchitectures
 from .defaults import DEFAULT_INDENT, DEFAULTS, RECOMMENDED_SCOPEO_VERSION
+from .document_cache import DocumentCache
 
 # mypy: disable_error_code="import-untyped"
 
@@ -199,56 +204,125 @@ def is_taxonomy_file(fn: str) -> bool:
     return False
 
 
-def get_taxonomy_diff(
-    repo_path: str | Path = "taxonomy", base: str = "origin/main"
-) -> list[str]:
-    repo = git.Repo(repo_path)
-    untracked_files = [u for u in repo.untracked_files if is_taxonomy_file(u)]
+# committed changes of taxonomy repos, by repo, HEAD and base commit
+_taxonomy_diff_cache: dict[str, dict[str, typing.Any]] | None = None
+# entries kept in the taxonomy diff cache file
+TAXONOMY_DIFF_CACHE_SIZE = 64
+# valid files kept in the taxonomy validation cache file
+TAXONOMY_VALIDATION_CACHE_SIZE = 100000
 
-    branches = [b.name for b in repo.branches]  # type: ignore[attr-defined]
 
-    head_commit = None
-    if "/" in base:
-        re_git_branch = re.compile(f"remotes/{base}$", re.MULTILINE)
-    elif base in branches:
-        re_git_branch = re.compile(f"{base}$", re.MULTILINE)
-    else:
-        try:
-            head_commit = repo.commit(base)
-        except gitdb.exc.BadName as e:
-            raise TaxonomyReadingException(
-                yaml.YAMLError(
-                    f'Couldn\'t find the taxonomy git ref "{base}" from the current HEAD'
-                )
-            ) from e
-
-    # Move backwards from HEAD until we find the first commit that is part of base
-    # then we can take our diff from there
-    current_commit = repo.commit("HEAD")
-    while not head_commit:
-        contains = repo.git.branch("-a", "--contains", current_commit.hexsha)
-        if re_git_branch.findall(contains):
-            head_commit = current_commit
-            break
+def _committed_taxonomy_changes(
+    repo: Repo, head_commit, base: str, base_commit, cache_file: str
+) -> list[str]:
+    """
+    Paths added or modified between the fork point of HEAD from base and HEAD
+
+    The fork point is the merge base of HEAD and base when base is a branch, and
+    base itself otherwise. Results are cached by HEAD and base commit, which
+    identify the changes completely.
+    """
+    global _taxonomy_diff_cache  # pylint: disable=global-statement
+    if _taxonomy_diff_cache is None:
         try:
-            current_commit = current_commit.parents[0]
-        except IndexError as e:
+            with open(cache_file, encoding="utf-8") as f:
+                _taxonomy_diff_cache = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            _taxonomy_diff_cache = {}
+    cache = typing.cast(dict[str, dict[str, typing.Any]], _taxonomy_diff_cache)
+
+    key = f"{repo.working_dir}:{head_commit.hexsha}:{base_commit.hexsha}"
+    entry = cache.get(key)
+    if entry is not None:
+        return entry["files"]
+
+    branches = [b.name for b in repo.branches]  # type: ignore[attr-defined]
+    if "/" in base or base in branches:
+        fork_points = repo.merge_base(head_commit, base_commit)
+        if not fork_points:
             raise TaxonomyReadingException(
                 yaml.YAMLError(
                     f'Couldn\'t find the taxonomy base branch "{base}" from the current HEAD'
                 )
-            ) from e
-
-    modified_files = [
-        d.b_path
-        for d in head_commit.diff(None)
-        if d.b_path is not None and not d.deleted_file and is_taxonomy_file(d.b_path)
+            )
+        fork_point = fork_points[0]
+    else:
+        fork_point = base_commit
+    files = [
+        f
+        for f in repo.git.diff(
+            "--name-only",
+            "-z",
+            "--no-renames",
+            "--diff-filter=d",
+            fork_point.hexsha,
+            head_commit.hexsha,
+        ).split("\0")
+        if f
     ]
 
-    updated_taxonomy_files = list(
-        {f for f in untracked_files + modified_files if f is not None}
+    cache[key] = {"fork_point": fork_point.hexsha, "files": files}
+    # dicts keep their insertion order, the oldest entries are dropped first
+    for old_key in list(cache)[:-TAXONOMY_DIFF_CACHE_SIZE]:
+        del cache[old_key]
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        logger.debug(f"Failed to save the taxonomy diff cache {cache_file}: {e}")
+    return files
+
+
+def get_taxonomy_diff(
+    repo_path: str | Path = "taxonomy",
+    base: str = "origin/main",
+    cache_file: str | None = None,
+) -> list[str]:
+    """
+    Taxonomy files added or modified since base, including untracked files
+
+    The committed changes since the fork point are cached (see
+    _committed_taxonomy_changes); the working tree is read with a single
+    `git status` on every call.
+    """
+    repo = git.Repo(repo_path)
+    try:
+        base_commit = repo.commit(base)
+    except (gitdb.exc.BadName, ValueError) as e:
+        if "/" in base:
+            message = f'Couldn\'t find the taxonomy base branch "{base}" from the current HEAD'
+        else:
+            message = (
+                f'Couldn\'t find the taxonomy git ref "{base}" from the current HEAD'
+            )
+        raise TaxonomyReadingException(yaml.YAMLError(message)) from e
+
+    files = set(
+        _committed_taxonomy_changes(
+            repo,
+            repo.head.commit,
+            base,
+            base_commit,
+            cache_file if cache_file is not None else DEFAULTS.TAXONOMY_DIFF_CACHE,
+        )
     )
-    return updated_taxonomy_files
+    # XY PATH entries, X is the status in the index and Y in the working tree
+    status = repo.git.status(
+        "--porcelain", "-z", "--untracked-files=all", "--no-renames"
+    )
+    for entry in status.split("\0"):
+        if not entry:
+            continue
+        code, path = entry[:2], entry[3:]
+        if "D" in code:
+            files.discard(path)
+        else:
+            files.add(path)
+
+    return [f for f in files if is_taxonomy_file(f)]
 
 
 def get_taxonomy(repo="taxonomy"):
@@ -316,42 +390,51 @@ def _validate_documents(
         # Add other file types when supported here.
     }
 
-    with tempfile.TemporaryDirectory() as temp_dir:
-        try:
-            repo = git_clone_checkout(
-                repo_url=repo_url,
-                commit_hash=commit_hash,
-                temp_dir=temp_dir,
-                skip_checkout=skip_checkout,
+    def check_documents(working_dir: str) -> None:
+        logger.debug("Processing files...")
+        opened_files = False
+        for pattern in file_patterns:
+            for file_path in glob.glob(os.path.join(working_dir, pattern)):
+                logger.debug("Checking file: %s", file_path)
+                if os.path.isfile(file_path):
+                    file_extension = os.path.splitext(file_path)[1]
+                    file_info = file_types.get(file_extension)
+
+                    if not isinstance(file_info, dict):
+                        click.secho(
+                            "Unsupported file format for knowledge docs", fg="red"
+                        )
+                        raise click.exceptions.Exit(1)
+
+                    # Attempt to open the file
+                    if is_valid_document(file_path, file_info):
+                        opened_files = True
+
+        if not opened_files:
+            raise TaxonomyReadingException(
+                "Couldn't find any valid knowledge documents."
             )
 
-            logger.debug("Processing files...")
-            opened_files = False
-            for pattern in file_patterns:
-                for file_path in glob.glob(os.path.join(repo.working_dir, pattern)):
-                    logger.debug("Checking file: %s", file_path)
-                    if os.path.isfile(file_path):
-                        file_extension = os.path.splitext(file_path)[1]
-                        file_info = file_types.get(file_extension)
-
-                        if not isinstance(file_info, dict):
-                            click.secho(
-                                "Unsupported file format for knowledge docs", fg="red"
-                            )
-                            raise click.exceptions.Exit(1)
-
-                        # Attempt to open the file
-                        if is_valid_document(file_path, file_info):
-                            opened_files = True
-
-            if not opened_files:
-                raise TaxonomyReadingException(
-                    "Couldn't find any valid knowledge documents."
+    try:
+        if commit_hash and not skip_checkout:
+            # the files of a commit are fetched once and shared with the other
+            # qna.yaml files, `ilab rag convert` and `ilab data generate`
+            check_documents(
+                str(DocumentCache().checkout(repo_url, commit_hash, file_patterns))
+            )
+        else:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                repo = git_clone_checkout(
+                    repo_url=repo_url,
+                    commit_hash=commit_hash,
+                    temp_dir=temp_dir,
+                    skip_checkout=skip_checkout,
                 )
+                check_documents(str(repo.working_dir))
 
-        except (OSError, exc.GitCommandError, FileNotFoundError) as e:
-            click.secho(f"Error validating documents: {str(e)}", fg="red")
-            raise click.exceptions.Exit(1)
+    except (OSError, exc.GitCommandError, FileNotFoundError) as e:
+        click.secho(f"Error validating documents: {str(e)}", fg="red")
+        raise click.exceptions.Exit(1)
 
 
 def git_clone_checkout(
@@ -415,10 +498,176 @@ def validate_taxonomy_file(
     return taxonomy.warnings, taxonomy.errors
 
 
+class TaxonomyValidationCache:
+    """
+    Taxonomy files that validated without warnings or errors
+
+    Files are identified by their path, their content, the yamllint config and the
+    version of instructlab-schema, so any change to them validates the file again.
+    Files with warnings or errors are always validated again to report them.
+    """
+
+    def __init__(self, path: str | None = None, yamllint_config: str | None = None):
+        self.path = path if path is not None else DEFAULTS.TAXONOMY_VALIDATION_CACHE
+        self.changed = False
+        config_hash = hashlib.sha256((yamllint_config or "").encode("utf-8"))
+        self.salt = f"{importlib.metadata.version('instructlab-schema')}:{config_hash.hexdigest()}"
+        self.entries: dict[str, str] = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, json.JSONDecodeError) as e:
+            logger.debug(
+                f"Ignoring unreadable taxonomy validation cache {self.path}: {e}"
+            )
+
+    def key(self, file_path: str | Path) -> str | None:
+        file_path = os.path.abspath(file_path)
+        try:
+            with open(file_path, "rb") as f:
+                content_hash = hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            return None
+        return hashlib.sha256(
+            f"{self.salt}:{file_path}:{content_hash}".encode("utf-8")
+        ).hexdigest()
+
+    def is_valid(self, key: str | None) -> bool:
+        return key is not None and key in self.entries
+
+    def add(self, key: str | None, file_path: str | Path) -> None:
+        if key is None:
+            return
+        # re-inserted entries move to the end and are dropped last
+        self.entries.pop(key, None)
+        self.entries[key] = str(file_path)
+        self.changed = True
+
+    def save(self) -> None:
+        if not self.changed:
+            return
+        for old_key in list(self.entries)[:-TAXONOMY_VALIDATION_CACHE_SIZE]:
+            del self.entries[old_key]
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_file = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_file, self.path)
+            self.changed = False
+        except OSError as e:
+            logger.debug(f"Failed to save taxonomy validation cache {self.path}: {e}")
+
+
+class _LogRecordCollector(logging.Handler):
+    """Keeps the log records of a validation worker to emit them in the main process"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.records: list[logging.LogRecord] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # arguments and tracebacks may not pickle, send them formatted
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        self.records.append(record)
+
+
+_log_record_collector: _LogRecordCollector | None = None
+
+
+def _init_validation_worker(level: int) -> None:
+    global _log_record_collector  # pylint: disable=global-statement
+    _log_record_collector = _LogRecordCollector()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_log_record_collector)
+    root.setLevel(level)
+
+
+def _validate_taxonomy_file_worker(
+    file_path: str, yamllint_config: str | None
+) -> tuple[int, int, float, list[logging.LogRecord]]:
+    assert _log_record_collector is not None
+    start = time.monotonic()
+    warnings, errors = validate_taxonomy_file(file_path, yamllint_config)
+    elapsed = time.monotonic() - start
+    records, _log_record_collector.records = _log_record_collector.records, []
+    return warnings, errors, elapsed, records
+
+
+def validate_taxonomy_files(
+    file_paths: list[str],
+    yamllint_config: str | None = None,
+    max_workers: int | None = None,
+    cache_file: str | None = None,
+) -> tuple[int, int]:
+    """
+    Validates taxonomy files in worker processes, skipping the cached valid files
+
+    Returns the total number of warnings and errors. Messages of the workers are
+    logged by the main process, in the order of the files.
+    """
+    cache = TaxonomyValidationCache(cache_file, yamllint_config)
+    keys = {f: cache.key(f) for f in file_paths}
+    to_validate = [f for f in file_paths if not cache.is_valid(keys[f])]
+    for f in file_paths:
+        if f not in to_validate:
+            logger.debug("%s: unchanged since its last validation", f)
+
+    results: Iterable[tuple[int, int, float, list[logging.LogRecord]]]
+    executor = None
+    if len(to_validate) > 1 and max_workers != 1:
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(len(to_validate), max_workers or os.cpu_count() or 1),
+            initializer=_init_validation_worker,
+            initargs=(logging.getLogger().getEffectiveLevel(),),
+        )
+        results = executor.map(
+            _validate_taxonomy_file_worker,
+            to_validate,
+            itertools.repeat(yamllint_config),
+        )
+    else:
+
+        def validate(file_path: str) -> tuple[int, int, float, list[logging.LogRecord]]:
+            start = time.monotonic()
+            warnings, errors = validate_taxonomy_file(file_path, yamllint_config)
+            return warnings, errors, time.monotonic() - start, []
+
+        results = map(validate, to_validate)
+
+    total_warnings = 0
+    total_errors = 0
+    try:
+        for file_path, (warnings, errors, elapsed, records) in zip(
+            to_validate, results, strict=True
+        ):
+            for record in records:
+                logging.getLogger(record.name).handle(record)
+            logger.debug("%s: validated in %.2fs", file_path, elapsed)
+            total_warnings += warnings
+            total_errors += errors
+            if not warnings and not errors:
+                cache.add(keys[file_path], file_path)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        cache.save()
+    return total_warnings, total_errors
+
+
 def validate_taxonomy(
     taxonomy: str | Path,
     taxonomy_base: str,
     yaml_rules: str | Path | None = None,
+    max_workers: int | None = None,
 ) -> None:
     yamllint_config = None  # If no custom rules file, use default config
     if yaml_rules is not None:  # user attempted to pass custom rules file
@@ -430,7 +679,7 @@ def validate_taxonomy(
             logger.debug("Cannot find %s. Using default rules.", yaml_rules)
 
     if os.path.isfile(taxonomy):
-        warnings, errors = validate_taxonomy_file(taxonomy, yamllint_config)
+        warnings, errors = validate_taxonomy_files([str(taxonomy)], yamllint_config)
         if warnings:
             logger.warning(
                 "%s warnings (see above) due to taxonomy file not (fully) usable.",
@@ -445,17 +694,15 @@ def validate_taxonomy(
         else:
             # Gather the new or changed YAMLs using git diff, including untracked files
             taxonomy_files = get_taxonomy_diff(taxonomy, taxonomy_base)
-        total_errors = 0
-        total_warnings = 0
         if taxonomy_files:
             logger.debug("Found new taxonomy files:")
             for e in taxonomy_files:
                 logger.debug("* %s", e)
-        for f in taxonomy_files:
-            file_path = os.path.join(taxonomy, f)
-            warnings, errors = validate_taxonomy_file(file_path, yamllint_config)
-            total_warnings += warnings
-            total_errors += errors
+        total_warnings, total_errors = validate_taxonomy_files(
+            [os.path.join(taxonomy, f) for f in taxonomy_files],
+            yamllint_config,
+            max_workers=max_workers,
+        )
         if total_warnings:
             logger.warning(
                 "%s warnings (see above) due to taxonomy files that were not (fully) usable.",
@@ -595,12 +842,26 @@ def is_messages_dataset(
 
 
 def ensure_legacy_dataset(
-    dataset: List[MessageSample] | List[LegacyMessageSample],
-) -> List[LegacyMessageSample]:
+    dataset: List[MessageSample] | List[LegacyMessageSample] | typing.Any,
+    num_proc: int | None = None,
+) -> typing.Any:
     """
     Given a dataset that's either in the HF messages format or the legacy ilab train format,
     ensure that the returned dataset is always in the legacy ilab train format.
+
+    Lists are converted to lists. HuggingFace datasets are converted batch by batch with
+    `Dataset.map`, so that the converted samples are written to Arrow instead of being held
+    in memory. An `IterableDataset`, or any other iterable of samples, is converted lazily
+    as it is read, so memory use doesn't grow with its size.
     """
+    # Third Party
+    import datasets
+
+    if isinstance(dataset, (datasets.Dataset, datasets.IterableDataset)):
+        return convert_messages_to_legacy_hf_dataset(dataset, num_proc=num_proc)
+    if not isinstance(dataset, list):
+        return _iter_legacy_samples(dataset)
+
     if not dataset:
         # base case - they are both equivalent
         return []
@@ -611,6 +872,86 @@ def ensure_legacy_dataset(
     return convert_messages_to_legacy_dataset(dataset)  # type: ignore
 
 
+def _iter_legacy_samples(
+    samples: typing.Iterable[dict], batch_size: int = 1000
+) -> typing.Iterator[dict]:
+    samples = iter(samples)
+    first = next(samples, None)
+    if first is None:
+        return
+    if "messages" not in first:
+        yield first
+        yield from samples
+        return
+    pretraining = is_pretraining_dataset([first])  # type: ignore
+    batch = [first]
+    for sample in itertools.chain(samples, [None]):
+        if sample is not None:
+            batch.append(sample)
+            if len(batch) < batch_size:
+                continue
+        columns = _convert_messages_batch_to_legacy(
+            {"messages": [s["messages"] for s in batch]}, pretraining
+        )
+        for system, user, assistant in zip(
+            columns["system"], columns["user"], columns["assistant"], strict=True
+        ):
+            yield {"system": system, "user": user, "assistant": assistant}
+        batch = []
+
+
+def convert_messages_to_legacy_hf_dataset(dataset, num_proc: int | None = None):
+    """
+    Converts a HuggingFace `Dataset` or `IterableDataset` in the messages format to
+    the legacy format, batch by batch. Datasets already in the legacy format are
+    returned as they are.
+    """
+    # Third Party
+    import datasets
+
+    if isinstance(dataset, datasets.IterableDataset):
+        # the columns of a dataset read as it goes are only known from its first sample
+        first = next(iter(dataset), None)
+        if first is None or "messages" not in first:
+            return dataset
+        pretraining = is_pretraining_dataset([first])
+        column_names = list(first)
+        map_kwargs = {}
+    else:
+        if len(dataset) == 0 or "messages" not in dataset.column_names:
+            return dataset
+        pretraining = is_pretraining_dataset(dataset.select(range(1)))
+        column_names = dataset.column_names
+        map_kwargs = {"num_proc": num_proc, "desc": "Converting to the legacy format"}
+
+    return dataset.map(
+        _convert_messages_batch_to_legacy,
+        batched=True,
+        fn_kwargs={"pretraining": pretraining},
+        remove_columns=column_names,
+        **map_kwargs,
+    )
+
+
+def _convert_messages_batch_to_legacy(
+    batch: dict[str, list], pretraining: bool
+) -> dict[str, list]:
+    samples = [{"messages": messages} for messages in batch["messages"]]
+    if pretraining:
+        converted = convert_pretraining_messages_to_legacy_dataset(samples)  # type: ignore
+    else:
+        converted = convert_standard_messages_to_legacy_dataset(samples)  # type: ignore
+    columns: dict[str, list] = {"system": [], "user": [], "assistant": []}
+    for sample in converted:
+        if set(sample) != set(columns):
+            raise ValueError(
+                "The dataset is expecting a system, a user and an assistant message in each sample."
+            )
+        for key, column in columns.items():
+            column.append(sample[key])  # type: ignore[literal-required]
+    return columns
+
+
 def is_s3_repo(bucket_name: str) -> bool:
     """
     Checks if a provided repository follows the S3 bucket name syntax
@@ -1,6 +1,8 @@
 # Standard
 from unittest import mock
 from unittest.mock import patch
+import asyncio
+import contextlib
 import json
 import os
 import pathlib
@@ -9,13 +11,15 @@ import sys
 
 # Third Party
 from click.testing import CliRunner
+from llama_cpp.server.settings import Settings
 from safetensors.torch import save_file
+import llama_cpp.server.app as llama_app
 import pytest
 import torch
 
 # First Party
 from instructlab import lab
-from instructlab.model.backends import backends, common
+from instructlab.model.backends import backends, common, llama_cpp
 from instructlab.model.backends.vllm import build_vllm_cmd, get_argument
 from instructlab.utils import is_model_safetensors
 from tests.test_feature_gates import dev_preview
@@ -271,9 +275,41 @@ def test_ilab_llama_cpp_args(
         num_threads=None,
         chat_template=None,
         log_file=expected_log_file,
+        parallel=1,
     )
 
 
+def test_llama_cpp_proxy_pool(monkeypatch):
+    proxies = [mock.Mock(name=f"proxy{i}") for i in range(3)]
+    monkeypatch.setattr(llama_app, "_llama_proxy", proxies[0])
+    monkeypatch.setattr(llama_app, "get_llama_proxy", llama_app.get_llama_proxy)
+    monkeypatch.setattr(llama_cpp, "_llama_proxy_pool", None)
+    monkeypatch.setattr(llama_cpp, "LlamaProxy", mock.Mock(side_effect=proxies[1:]))
+    llama_cpp.set_llama_proxy_pool(Settings(model="test.gguf"), parallel=3)
+    assert (
+        llama_cpp.get_uvicorn_config(None, "localhost", 8000, 3).limit_concurrency == 4
+    )
+
+    in_flight = []
+
+    async def request():
+        async with contextlib.asynccontextmanager(llama_app.get_llama_proxy)() as proxy:
+            in_flight.append(proxy)
+            served = set(in_flight)
+            await asyncio.sleep(0.01)
+            in_flight.remove(proxy)
+            return served
+
+    async def requests():
+        return await asyncio.gather(*(request() for _ in range(6)))
+
+    served = asyncio.run(requests())
+    # three requests run at once, each on its own copy of the model
+    assert max(len(s) for s in served) == 3
+    assert set().union(*served) == set(proxies)
+    assert asyncio.run(llama_cpp.served_llama_proxies()) == proxies
+
+
 def test_build_vllm_cmd_with_defaults(tmp_path: pathlib.Path):
     host = "localhost"
     port = 8080
@@ -0,0 +1,84 @@
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard
+import json
+
+# Third Party
+import httpx
+import pytest
+
+# First Party
+from instructlab.client_utils import EndpointPoolTransport, read_endpoint_pool_file
+
+ENDPOINTS = ["http://a:8000/v1", "http://b:8000/v1", "http://c:8000/v1/"]
+
+
+def replicas(down: set[str]) -> httpx.MockTransport:
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host in down:
+            raise httpx.ConnectError("connection refused", request=request)
+        # a streamed body, like the responses of a real server
+        body = json.dumps({"host": request.url.host}).encode()
+        return httpx.Response(200, content=iter([body]))
+
+    return httpx.MockTransport(handler)
+
+
+def test_endpoint_pool_least_outstanding():
+    pool = EndpointPoolTransport(ENDPOINTS, replicas(down=set()))
+    client = httpx.Client(transport=pool)
+
+    # responses that are not closed yet keep their endpoint busy
+    responses = [
+        client.send(
+            client.build_request("POST", f"{ENDPOINTS[0]}/completions"), stream=True
+        )
+        for _ in range(6)
+    ]
+    assert [r.request.url.host for r in responses] == ["a", "b", "c"] * 2
+    assert all(r.request.url.path == "/v1/completions" for r in responses)
+    assert all(
+        r.request.headers["Host"] == f"{r.request.url.host}:8000" for r in responses
+    )
+    assert pool.outstanding == {e: 2 for e in pool.endpoints}
+
+    for r in responses[:4]:
+        r.read()
+        r.close()
+    # b and c still have a request in flight
+    assert client.get(f"{ENDPOINTS[0]}/models").json() == {"host": "a"}
+    for r in responses[4:]:
+        r.close()
+    assert pool.outstanding == {e: 0 for e in pool.endpoints}
+
+
+def test_endpoint_pool_failover():
+    down = {"b"}
+    pool = EndpointPoolTransport(ENDPOINTS, replicas(down), health_check_interval=60)
+    client = httpx.Client(transport=pool)
+
+    hosts = [client.get(f"{ENDPOINTS[0]}/models").json()["host"] for _ in range(4)]
+    assert "b" not in hosts
+    assert pool.healthy_endpoints == ["http://a:8000/v1/", "http://c:8000/v1/"]
+
+    # endpoints out of rotation are probed again once the interval has passed
+    down.clear()
+    pool.health_check_interval = 0
+    client.get(f"{ENDPOINTS[0]}/models")
+    assert pool.healthy_endpoints == pool.endpoints
+
+    down.update({"a", "b", "c"})
+    with pytest.raises(httpx.ConnectError):
+        client.get(f"{ENDPOINTS[0]}/models")
+
+
+def test_read_endpoint_pool_file(tmp_path):
+    pool_file = tmp_path / "endpoints.txt"
+    pool_file.write_text(
+        "# teacher replicas\nhttp://a:8000/v1\n\nhttp://b:8000/v1  # second node\n",
+        encoding="utf-8",
+    )
+    assert read_endpoint_pool_file(pool_file) == [
+        "http://a:8000/v1",
+        "http://b:8000/v1",
+    ]
@@ -0,0 +1,97 @@
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard
+from unittest import mock
+import os
+import pathlib
+import shutil
+
+# Third Party
+import click
+import git
+import pytest
+import yaml
+
+# First Party
+from instructlab import utils
+from instructlab.document_cache import DocumentCache, taxonomy_document_clones
+
+
+def make_document_repo(path: pathlib.Path) -> tuple[str, list[str]]:
+    repo = git.Repo.init(path, initial_branch="main")
+    commits = []
+    for version in ("v1", "v2"):
+        (path / "docs").mkdir(exist_ok=True)
+        (path / "docs" / "guide.md").write_text(f"guide {version}", encoding="utf-8")
+        (path / "notes.md").write_text(f"notes {version}", encoding="utf-8")
+        repo.index.add(["docs/guide.md", "notes.md"])
+        commits.append(repo.index.commit(version).hexsha)
+    return path.as_uri(), commits
+
+
+def test_checkout_fetches_each_commit_once(tmp_path: pathlib.Path):
+    repo_url, (first, second) = make_document_repo(tmp_path / "docs_repo")
+    cache = DocumentCache(tmp_path / "cache")
+
+    working_dir = cache.checkout(repo_url, first, ["docs/*.md"])
+    assert (working_dir / "docs" / "guide.md").read_text(encoding="utf-8") == "guide v1"
+    # only the files matching the patterns are checked out
+    assert not (working_dir / "notes.md").exists()
+    assert cache.checkout(repo_url, second, ["*.md"]) != working_dir
+
+    # cached commits are served without the repository
+    shutil.rmtree(tmp_path / "docs_repo")
+    with mock.patch.object(git.Repo, "init") as init:
+        assert cache.checkout(repo_url, first, ["docs/*.md"]) == working_dir
+        working_dir = cache.checkout(repo_url, first, ["*.md", "missing/*.pdf"])
+    init.assert_not_called()
+    assert (working_dir / "notes.md").read_text(encoding="utf-8") == "notes v1"
+
+    # clones of the repository are served by its mirror
+    with cache.redirect_clones([repo_url]):
+        clone = git.Repo.clone_from(repo_url, tmp_path / "clone")
+    assert "GIT_CONFIG_COUNT" not in os.environ
+    clone.git.checkout(second)
+    assert (tmp_path / "clone" / "notes.md").read_text(encoding="utf-8") == "notes v2"
+
+
+def test_checkout_unknown_commit(tmp_path: pathlib.Path):
+    repo_url, _ = make_document_repo(tmp_path / "docs_repo")
+    with pytest.raises(FileNotFoundError):
+        DocumentCache(tmp_path / "cache").checkout(repo_url, "0" * 40, ["*.md"])
+
+
+def test_validate_documents_from_cache(tmp_path: pathlib.Path):
+    repo_url, (first, _) = make_document_repo(tmp_path / "docs_repo")
+    source: utils.SourceDict = {
+        "repo": repo_url,
+        "commit": first,
+        "patterns": ["docs/*.md"],
+    }
+    utils._validate_documents(source)
+    with mock.patch.object(utils, "git_clone_checkout") as git_clone_checkout:
+        utils._validate_documents(source)
+    git_clone_checkout.assert_not_called()
+
+    with pytest.raises(utils.TaxonomyReadingException):
+        utils._validate_documents(source | {"patterns": ["*.pdf"]})
+    with pytest.raises(click.exceptions.Exit):
+        utils._validate_documents(source | {"commit": "0" * 40})
+
+
+def test_taxonomy_document_clones(taxonomy_dir, tmp_path_factory):
+    repo_path = tmp_path_factory.mktemp("docs_repo")
+    repo_url, (first, _) = make_document_repo(repo_path)
+    taxonomy_dir.create_untracked(
+        "knowledge/guide/qna.yaml",
+        yaml.safe_dump(
+            {"document": {"repo": repo_url, "commit": first, "patterns": ["*.md"]}}
+        ).encode("utf-8"),
+    )
+    cache = DocumentCache(tmp_path_factory.mktemp("cache"))
+    with taxonomy_document_clones(taxonomy_dir.root, "main", cache):
+        key = os.environ[f"GIT_CONFIG_KEY_{int(os.environ['GIT_CONFIG_COUNT']) - 1}"]
+        assert key == f"url.{cache.mirror_path(repo_url)}.insteadOf"
+        shutil.rmtree(repo_path)
+        clone = git.Repo.clone_from(repo_url, tmp_path_factory.mktemp("clone"))
+        clone.git.checkout(first)
@@ -120,6 +120,10 @@ subcommands: list[Command] = [
     Command(("model", "convert"), ("--model-dir", "test")),
     Command(("model", "download")),
     Command(("model", "evaluate"), ("--benchmark", "mmlu")),
+    Command(
+        ("model", "evaluate-matrix"),
+        ("--models", "foo", "--benchmarks", "mmlu"),
+    ),
     Command(("model", "serve")),
     Command(("model", "test")),
     Command(("model", "train")),
@@ -130,8 +134,11 @@ subcommands: list[Command] = [
     ),
     Command(("model", "remove"), ("--model", "test-model")),
     Command(("data",), needs_config=False, should_fail=False),
+    Command(("data", "convert"), ("train.jsonl",)),
+    Command(("data", "dedup"), ("train.jsonl",)),
     Command(("data", "generate")),
     Command(("data", "list")),
+    Command(("data", "stats"), ("train.jsonl",)),
     Command(("rag",), needs_config=False, should_fail=False),
     Command(("rag", "convert")),
     Command(("rag", "ingest")),
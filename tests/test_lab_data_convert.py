@@ -0,0 +1,67 @@
+# Standard
+import json
+import os
+import pathlib
+
+# Third Party
+from click.testing import CliRunner
+import pytest
+
+# First Party
+from instructlab import lab
+from instructlab.data import columnar
+from instructlab.data.list_data import list_data
+
+SAMPLES = [
+    {
+        "messages": [
+            {"role": "user", "content": f"question {i}"},
+            {"role": "assistant", "content": f"answer {i}"},
+        ],
+        "metadata": json.dumps({"sample": i}),
+    }
+    for i in range(5)
+]
+
+
+@pytest.mark.parametrize("fmt", ["arrow", "parquet"])
+def test_data_convert(cli_runner: CliRunner, tmp_path: pathlib.Path, fmt: str):
+    run_dir = tmp_path / "datasets" / "2025-01-01_120000"
+    run_dir.mkdir(parents=True)
+    jsonl = run_dir / "train_gen.jsonl"
+    jsonl.write_text("".join(json.dumps(s) + "\n" for s in SAMPLES), encoding="utf-8")
+
+    result = cli_runner.invoke(
+        lab.ilab,
+        ["--config=DEFAULT", "data", "convert", "--format", fmt, str(run_dir)],
+    )
+    assert result.exit_code == 0, result.stdout
+    converted = jsonl.with_suffix(f".{fmt}")
+    assert converted.is_file()
+
+    # loaders asking for the JSONL file read the converted copy
+    assert columnar.resolve_dataset_file(jsonl) == converted
+    ds = columnar.load_dataset_file(jsonl)
+    assert ds.to_list() == SAMPLES
+    assert list(columnar.iter_dataset_file(jsonl)) == SAMPLES
+    if fmt == "arrow":
+        # memory-mapped from the converted file, not copied
+        assert ds.cache_files[0]["filename"] == os.fspath(converted)
+
+    # a JSONL file modified after the conversion is read again
+    os.utime(converted, (0, 0))
+    assert columnar.resolve_dataset_file(jsonl) == jsonl
+
+    rows = {row[0]: row[4:] for row in list_data([str(tmp_path / "datasets")])}
+    assert rows[f"2025-01-01_120000/train_gen.{fmt}"] == ["5", "messages"]
+    assert rows["2025-01-01_120000/train_gen.jsonl"] == ["5", "messages"]
+
+
+def test_data_convert_not_jsonl(cli_runner: CliRunner, tmp_path: pathlib.Path):
+    text_file = tmp_path / "notes.txt"
+    text_file.touch()
+    result = cli_runner.invoke(
+        lab.ilab, ["--config=DEFAULT", "data", "convert", str(text_file)]
+    )
+    assert result.exit_code == 2
+    assert "is not a JSONL file or a directory" in result.output
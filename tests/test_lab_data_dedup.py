@@ -0,0 +1,80 @@
+# Standard
+import json
+import pathlib
+
+# Third Party
+from click.testing import CliRunner
+import numpy as np
+
+# First Party
+from instructlab import lab
+from instructlab.data import dedup
+
+ANSWER = (
+    "The mitochondria is the powerhouse of the cell because it produces most "
+    "of the chemical energy needed to power the biochemical reactions of the cell"
+)
+
+
+def sample(question: str, answer: str) -> dict:
+    return {
+        "messages": [
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": question},
+            {"role": "assistant", "content": answer},
+        ]
+    }
+
+
+def test_minhash_estimates_jaccard():
+    texts = [ANSWER, ANSWER.replace("biochemical", "chemical"), "something else"]
+    signatures = dedup.compute_signatures(texts, ngram=2, num_perm=256, num_workers=1)
+    first, second = (dedup.shingles(t, 2) for t in texts[:2])
+    jaccard = len(first & second) / len(first | second)
+    estimate = np.mean(signatures[0] == signatures[1])
+    assert abs(estimate - jaccard) < 0.1
+    assert np.mean(signatures[0] == signatures[2]) < 0.1
+    # signatures do not depend on the worker processes
+    assert (
+        dedup.compute_signatures(texts, ngram=2, num_perm=256, num_workers=2)
+        == signatures
+    ).all()
+
+
+def test_lsh_params():
+    bands, rows = dedup.lsh_params(0.8, 128)
+    assert bands * rows <= 128
+    assert abs((1 / bands) ** (1 / rows) - 0.8) < 0.05
+
+
+def test_data_dedup(cli_runner: CliRunner, tmp_path: pathlib.Path):
+    samples = [
+        sample("What does the mitochondria do?", ANSWER),
+        sample("Which organelle is unrelated?", "The ribosome assembles proteins."),
+        # near-duplicates of the first sample
+        sample("What does the mitochondria do?", ANSWER + "."),
+        sample("What does the mitochondria do ?", ANSWER.replace("most", "most")),
+        sample("What is the capital of France?", "Paris is the capital of France."),
+        # an exact duplicate of the second sample
+        sample("Which organelle is unrelated?", "The ribosome assembles proteins."),
+    ]
+    dataset = tmp_path / "train_gen.jsonl"
+    dataset.write_text("".join(json.dumps(s) + "\n" for s in samples), encoding="utf-8")
+
+    result = cli_runner.invoke(
+        lab.ilab,
+        ["--config=DEFAULT", "data", "dedup", str(dataset), "--num-workers", "1"],
+    )
+    assert result.exit_code == 0, result.stdout
+    assert "Kept 3 of 6 samples, removed 3 near-duplicates (50.0%)" in result.output
+    assert "2 clusters of near-duplicates, the largest with 3 samples" in result.output
+
+    output = tmp_path / "train_gen_dedup.jsonl"
+    with output.open(encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == [samples[0], samples[1], samples[4]]
+
+    _, report = dedup.dedup_dataset(
+        dataset, output=tmp_path / "other.jsonl", num_workers=1
+    )
+    assert report.cluster_sizes == {2: 1, 3: 1}
+    assert report.removed == 3
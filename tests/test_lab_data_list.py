@@ -1,4 +1,6 @@
 # Standard
+from unittest import mock
+import json
 import pathlib
 import re
 import textwrap
@@ -6,10 +8,13 @@ import time
 
 # Third Party
 from click.testing import CliRunner
+from tokenizers import Tokenizer, models, pre_tokenizers
+from transformers import PreTrainedTokenizerFast
 
 # First Party
 from instructlab import lab
 from instructlab.cli.data.list import extract_model_name
+from instructlab.data import list_data
 
 
 def extract_data_entries(table_output: str) -> str:
@@ -80,26 +85,26 @@ def test_data_list_command(cli_runner: CliRunner, tmp_path: pathlib.Path):
 
     expected_output = textwrap.dedent(f"""
         Run from 2025-01-02_120000
-        +--------------------------------------------------------------------------------------+---------+---------------------+-----------+
-        | Dataset                                                                              | Model   | Created At          | File size |
-        +--------------------------------------------------------------------------------------+---------+---------------------+-----------+
-        | 2025-01-02_120000/messages_modelB_2024-10-26T21_32_32.jsonl                          | modelB  | {file_info[2][1]} | {file_info[2][2]} |
-        | 2025-01-02_120000/node_datasets_2024-10-27T08_34_48/compositional_skills_valid.jsonl | General | {node_created_at} | {node_formatted_size} |
-        | 2025-01-02_120000/skills_train_msgs_2024-10-27T08_34_48.jsonl                        | General | {file_info[3][1]} | {file_info[3][2]} |
-        | 2025-01-02_120000/test_modelA_2024-10-27T08_34_48.jsonl                              | modelA  | {file_info[0][1]} | {file_info[0][2]} |
-        | 2025-01-02_120000/train_modelA_2024-10-27T08_34_48.jsonl                             | modelA  | {file_info[1][1]} | {file_info[1][2]} |
-        +--------------------------------------------------------------------------------------+---------+---------------------+-----------+
+        +--------------------------------------------------------------------------------------+---------+---------------------+-----------+---------+---------+
+        | Dataset                                                                              | Model   | Created At          | File size | Samples | Schema  |
+        +--------------------------------------------------------------------------------------+---------+---------------------+-----------+---------+---------+
+        | 2025-01-02_120000/messages_modelB_2024-10-26T21_32_32.jsonl                          | modelB  | {file_info[2][1]} | {file_info[2][2]} | 1       | unknown |
+        | 2025-01-02_120000/node_datasets_2024-10-27T08_34_48/compositional_skills_valid.jsonl | General | {node_created_at} | {node_formatted_size} | 1       | unknown |
+        | 2025-01-02_120000/skills_train_msgs_2024-10-27T08_34_48.jsonl                        | General | {file_info[3][1]} | {file_info[3][2]} | 1       | unknown |
+        | 2025-01-02_120000/test_modelA_2024-10-27T08_34_48.jsonl                              | modelA  | {file_info[0][1]} | {file_info[0][2]} | 1       | unknown |
+        | 2025-01-02_120000/train_modelA_2024-10-27T08_34_48.jsonl                             | modelA  | {file_info[1][1]} | {file_info[1][2]} | 1       | unknown |
+        +--------------------------------------------------------------------------------------+---------+---------------------+-----------+---------+---------+
 
         Run from 2025-01-01_120000
-        +--------------------------------------------------------------------------------------+---------+---------------------+-----------+
-        | Dataset                                                                              | Model   | Created At          | File size |
-        +--------------------------------------------------------------------------------------+---------+---------------------+-----------+
-        | 2025-01-01_120000/messages_modelB_2024-10-26T21_32_32.jsonl                          | modelB  | {file_info[2][1]} | {file_info[2][2]} |
-        | 2025-01-01_120000/node_datasets_2024-10-27T08_34_48/compositional_skills_valid.jsonl | General | {node_created_at} | {node_formatted_size} |
-        | 2025-01-01_120000/skills_train_msgs_2024-10-27T08_34_48.jsonl                        | General | {file_info[3][1]} | {file_info[3][2]} |
-        | 2025-01-01_120000/test_modelA_2024-10-27T08_34_48.jsonl                              | modelA  | {file_info[0][1]} | {file_info[0][2]} |
-        | 2025-01-01_120000/train_modelA_2024-10-27T08_34_48.jsonl                             | modelA  | {file_info[1][1]} | {file_info[1][2]} |
-        +--------------------------------------------------------------------------------------+---------+---------------------+-----------+
+        +--------------------------------------------------------------------------------------+---------+---------------------+-----------+---------+---------+
+        | Dataset                                                                              | Model   | Created At          | File size | Samples | Schema  |
+        +--------------------------------------------------------------------------------------+---------+---------------------+-----------+---------+---------+
+        | 2025-01-01_120000/messages_modelB_2024-10-26T21_32_32.jsonl                          | modelB  | {file_info[2][1]} | {file_info[2][2]} | 1       | unknown |
+        | 2025-01-01_120000/node_datasets_2024-10-27T08_34_48/compositional_skills_valid.jsonl | General | {node_created_at} | {node_formatted_size} | 1       | unknown |
+        | 2025-01-01_120000/skills_train_msgs_2024-10-27T08_34_48.jsonl                        | General | {file_info[3][1]} | {file_info[3][2]} | 1       | unknown |
+        | 2025-01-01_120000/test_modelA_2024-10-27T08_34_48.jsonl                              | modelA  | {file_info[0][1]} | {file_info[0][2]} | 1       | unknown |
+        | 2025-01-01_120000/train_modelA_2024-10-27T08_34_48.jsonl                             | modelA  | {file_info[1][1]} | {file_info[1][2]} | 1       | unknown |
+        +--------------------------------------------------------------------------------------+---------+---------------------+-----------+---------+---------+
         
     """).strip()
 
@@ -119,3 +124,68 @@ def test_extract_model_general_file():
     model_name = extract_model_name(filename)
 
     assert model_name == "General"
+
+
+def test_list_data_counts_and_cache(tmp_path: pathlib.Path):
+    datasets = tmp_path / "datasets" / "2025-01-01_120000"
+    datasets.mkdir(parents=True)
+    messages = [
+        {"messages": [{"role": "user", "content": "hello world"}]},
+        {"messages": [{"role": "assistant", "content": "hello"}]},
+    ]
+    (datasets / "messages.jsonl").write_text(
+        "".join(json.dumps(m) + "\n" for m in messages), encoding="utf-8"
+    )
+    legacy = {"system": "hello", "user": "world", "assistant": "hello world"}
+    # the last line has no newline
+    (datasets / "train.jsonl").write_text(
+        "\n".join([json.dumps(legacy)] * 3), encoding="utf-8"
+    )
+    (datasets / "empty.jsonl").touch()
+
+    backend = Tokenizer(models.WordLevel({"[UNK]": 0, "hello": 1, "world": 2}, "[UNK]"))
+    backend.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer_dir = tmp_path / "tokenizer"
+    PreTrainedTokenizerFast(
+        tokenizer_object=backend, unk_token="[UNK]"
+    ).save_pretrained(tokenizer_dir)
+
+    cache_path = str(tmp_path / "inventory.json")
+    rows = list_data.list_data(
+        [str(tmp_path / "datasets")],
+        tokenizer_path=str(tokenizer_dir),
+        num_workers=2,
+        cache_path=cache_path,
+    )
+    counts = {row[0]: row[4:] for row in rows}
+    assert counts == {
+        "2025-01-01_120000/messages.jsonl": ["2", "messages", "3"],
+        "2025-01-01_120000/train.jsonl": ["3", "legacy", "12"],
+        "2025-01-01_120000/empty.jsonl": ["0", "unknown", "-"],
+    }
+
+    # unchanged files are not read again
+    with (
+        mock.patch.object(list_data, "count_samples") as count_samples,
+        mock.patch.object(list_data, "count_tokens") as count_tokens,
+    ):
+        rows = list_data.list_data(
+            [str(tmp_path / "datasets")],
+            tokenizer_path=str(tokenizer_dir),
+            cache_path=cache_path,
+        )
+    count_samples.assert_not_called()
+    count_tokens.assert_not_called()
+    assert {row[0]: row[4:] for row in rows} == counts
+
+    # a modified file is counted again, a removed one leaves the cache
+    with (datasets / "train.jsonl").open("a", encoding="utf-8") as f:
+        f.write("\n" + json.dumps(legacy) + "\n")
+    (datasets / "empty.jsonl").unlink()
+    rows = list_data.list_data([str(tmp_path / "datasets")], cache_path=cache_path)
+    assert {row[0]: row[4:] for row in rows} == {
+        "2025-01-01_120000/messages.jsonl": ["2", "messages"],
+        "2025-01-01_120000/train.jsonl": ["4", "legacy"],
+    }
+    with open(cache_path, encoding="utf-8") as f:
+        assert len(json.load(f)) == 2
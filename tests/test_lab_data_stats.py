@@ -0,0 +1,121 @@
+# Standard
+import json
+import pathlib
+
+# Third Party
+from click.testing import CliRunner
+from tokenizers import Tokenizer, models, pre_tokenizers
+from transformers import PreTrainedTokenizerFast
+import numpy as np
+
+# First Party
+from instructlab import lab
+from instructlab.data import stats
+
+
+def make_tokenizer(path: pathlib.Path) -> str:
+    backend = Tokenizer(models.WordLevel({"[UNK]": 0, "word": 1}, "[UNK]"))
+    backend.pre_tokenizer = pre_tokenizers.Whitespace()
+    PreTrainedTokenizerFast(
+        tokenizer_object=backend, unk_token="[UNK]"
+    ).save_pretrained(path)
+    return str(path)
+
+
+def make_dataset(path: pathlib.Path, lengths: list[int]) -> None:
+    with path.open("w", encoding="utf-8") as f:
+        for i, length in enumerate(lengths):
+            if i % 2:
+                sample = {
+                    "system": "",
+                    "user": "word",
+                    "assistant": "word " * (length - 1),
+                }
+            else:
+                sample = {
+                    "messages": [
+                        {"role": "user", "content": "word " * (length - 1)},
+                        {"role": "assistant", "content": "word"},
+                    ]
+                }
+            f.write(json.dumps(sample) + "\n")
+        f.write(json.dumps({"unrelated": "word"}) + "\n")
+
+
+def test_token_lengths(tmp_path: pathlib.Path):
+    tokenizer = make_tokenizer(tmp_path / "tokenizer")
+    dataset = tmp_path / "train.jsonl"
+    lengths = list(range(1, 40))
+    make_dataset(dataset, lengths)
+    assert stats.token_lengths(dataset, tokenizer, num_workers=1).tolist() == lengths
+    assert stats.token_lengths(dataset, tokenizer, num_workers=2).tolist() == lengths
+
+
+def test_length_histogram():
+    lengths = np.array([1, 2, 3, 10, 10, 20])
+    assert stats.length_histogram(lengths, 2) == [(1, 10, 5), (11, 20, 1)]
+    assert stats.length_percentiles(lengths) == {50: 10, 90: 20, 95: 20, 99: 20}
+
+
+def test_plan_packing():
+    lengths = np.array([100] * 60 + [400] * 4 + [5000])
+    plan = stats.plan_packing(
+        lengths, max_seq_len=4096, max_batch_len=1000, effective_batch_size=32
+    )
+    assert plan.dropped == 1
+    assert plan.samples == 64
+    assert plan.tokens == 7600
+    assert plan.steps == 2
+    # avg 118.75 tokens * 32 samples needs 4 accumulation steps to fit 1000 tokens
+    assert plan.grad_accum == 4
+    assert plan.packing_max_batch_len == 950
+    # two batches of two 400 token samples have room for one 100 token sample only
+    assert plan.packed_batches == 9
+    assert plan.packing_efficiency == 7600 / (9 * 950)
+    assert 0 < plan.padding_waste < 1
+
+    # the packed length cannot hold the longest sample
+    plan = stats.plan_packing(
+        lengths, max_seq_len=4096, max_batch_len=1000, effective_batch_size=2
+    )
+    assert plan.error is not None
+    assert plan.packed_batches == 0
+
+
+def test_data_stats(cli_runner: CliRunner, tmp_path: pathlib.Path):
+    tokenizer = make_tokenizer(tmp_path / "tokenizer")
+    dataset = tmp_path / "train.jsonl"
+    make_dataset(dataset, [10] * 30 + [50] * 10)
+    result = cli_runner.invoke(
+        lab.ilab,
+        [
+            "--config=DEFAULT",
+            "data",
+            "stats",
+            str(dataset),
+            "--model-path",
+            tokenizer,
+            "--max-seq-len",
+            "20",
+            "--max-seq-len",
+            "100",
+            "--max-batch-len",
+            "200",
+            "--effective-batch-size",
+            "16",
+            "--num-workers",
+            "1",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert "40 samples, 800 tokens, mean length 20.0, longest 50" in result.output
+    assert "| p90        | 50     |" in result.output
+    rows = [
+        [cell.strip() for cell in line.split("|")[1:-1]]
+        for line in result.output.splitlines()
+        if line.startswith("| 20 ") or line.startswith("| 100 ")
+    ]
+    assert rows == [
+        ["20", "200", "16", "10", "1", "160", "2", "93.8%", "0.0%", "2", "300"],
+        ["100", "200", "16", "0", "2", "160", "5", "100.0%", "60.0%", "3", "800"],
+    ]
@@ -3,14 +3,16 @@
 
 # Standard
 from pathlib import Path
+from unittest import mock
 import re
 
 # Third Party
 from click.testing import CliRunner
+import git
 import pytest
 
 # First Party
-from instructlab import lab
+from instructlab import lab, utils
 
 TAXONOMY_BASE = "main"
 
@@ -430,3 +432,76 @@ class TestLabDiff:
         )
         assert result.output == ""
         assert result.exit_code == 0
+
+    def test_diff_fork_point_and_cache(self):
+        repo = git.Repo(self.taxonomy.root)
+        base_file = "compositional_skills/base/qna.yaml"
+        branch_file = "compositional_skills/branch/qna.yaml"
+        removed_file = "compositional_skills/removed/qna.yaml"
+        self.taxonomy.add_tracked(base_file)
+        repo.create_head("feature").checkout()
+        self.taxonomy.add_tracked(branch_file)
+        self.taxonomy.add_tracked(removed_file)
+        # main moves on after the fork point
+        repo.heads.main.checkout()
+        self.taxonomy.add_tracked("compositional_skills/later/qna.yaml")
+        repo.heads.feature.checkout()
+
+        cache_file = str(self.taxonomy.root / ".git" / "taxonomy_diff.json")
+        assert sorted(
+            utils.get_taxonomy_diff(self.taxonomy.root, "main", cache_file)
+        ) == [branch_file, removed_file]
+
+        # the working tree is read on every call, the committed changes are cached
+        self.taxonomy.root.joinpath(base_file).write_text("changed", encoding="utf-8")
+        self.taxonomy.remove_file(removed_file)
+        untracked_file = "compositional_skills/new/qna.yaml"
+        self.taxonomy.create_untracked(untracked_file)
+        with (
+            mock.patch.object(utils, "_taxonomy_diff_cache", None),
+            mock.patch.object(git.Repo, "merge_base") as merge_base,
+        ):
+            files = utils.get_taxonomy_diff(self.taxonomy.root, "main", cache_file)
+        merge_base.assert_not_called()
+        assert sorted(files) == [base_file, branch_file, untracked_file]
+
+    def test_validate_parallel_and_cache(self, testdata_path: Path, caplog):
+        invalid_file = "compositional_skills/invalid/qna.yaml"
+        valid_files = [f"compositional_skills/valid{i}/qna.yaml" for i in range(3)]
+        for f in valid_files:
+            self.taxonomy.create_untracked(f)
+        self.taxonomy.create_untracked(
+            invalid_file, testdata_path.joinpath("invalid_yaml.yaml").read_bytes()
+        )
+        paths = [str(self.taxonomy.root / f) for f in [*valid_files, invalid_file]]
+        cache_file = str(self.taxonomy.root / ".git" / "taxonomy_validation.json")
+
+        warnings, errors = utils.validate_taxonomy_files(
+            paths, max_workers=2, cache_file=cache_file
+        )
+        assert errors > 0
+        # messages of the worker processes are logged by the main process
+        assert any(invalid_file in record.getMessage() for record in caplog.records)
+
+        # only the file with errors and the changed file are validated again
+        self.taxonomy.root.joinpath(valid_files[0]).write_text(
+            self.taxonomy.root.joinpath(valid_files[0]).read_text(encoding="utf-8")
+            + "\n",
+            encoding="utf-8",
+        )
+        with mock.patch.object(
+            utils, "validate_taxonomy_file", return_value=(0, 0)
+        ) as validate:
+            assert utils.validate_taxonomy_files(
+                paths, max_workers=1, cache_file=cache_file
+            ) == (0, 0)
+        assert [c.args[0] for c in validate.call_args_list] == [paths[0], paths[3]]
+
+        # another yamllint config validates every file again
+        with mock.patch.object(
+            utils, "validate_taxonomy_file", return_value=(0, 0)
+        ) as validate:
+            utils.validate_taxonomy_files(
+                paths, "rules: {}", max_workers=1, cache_file=cache_file
+            )
+        assert validate.call_count == 4
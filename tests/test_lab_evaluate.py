@@ -1,6 +1,7 @@
 # Standard
 from unittest import mock
 from unittest.mock import patch
+import json
 import os
 import re
 import textwrap
@@ -11,6 +12,7 @@ from git import Repo
 from pandas import DataFrame
 from ragas.callbacks import ChainRun  # type: ignore
 from ragas.evaluation import EvaluationDataset, EvaluationResult  # type: ignore
+import pytest
 
 # First Party
 from instructlab import lab
@@ -892,6 +894,122 @@ def test_evaluate_dk_bench_input_with_responses(
     assert result.exit_code == 0
 
 
+def score_question(dataset):
+    result = get_mock_evaluation_result()
+    result.dataset = EvaluationDataset.from_pandas(DataFrame(dataset))
+    return result
+
+
+def write_questions(path, count):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            question = {
+                "user_input": f"question {i}",
+                "response": f"response {i}",
+                "reference": f"reference {i}",
+            }
+            f.write(json.dumps(question) + "\n")
+
+
+@patch(
+    "instructlab.model.dk_bench_utils.is_judge_model_name_valid",
+    return_value=True,
+)
+@patch("instructlab.eval.ragas.RagasEvaluator.run", side_effect=score_question)
+def test_dk_bench_streaming_resume(
+    run_mock, is_judge_model_name_valid_mock, tmp_path, monkeypatch
+):
+    # First Party
+    # a module level import would bind launch_server before other tests patch it
+    from instructlab.model import dk_bench_utils
+
+    monkeypatch.setenv("OPENAI_API_KEY", "TEMP_KEY")
+    questions = tmp_path / "questions.jsonl"
+    write_questions(questions, 3)
+    output_dir = tmp_path / "results"
+    args = (None, False, "", "", "", "model", None, None, None, False)
+    dk_bench_args = (*args, str(questions), "", 0.0, "gpt-4o", str(output_dir))
+
+    partial_results_file = dk_bench_utils.get_partial_results_file(
+        str(output_dir), "no-model-provided", questions
+    )
+    dk_bench_utils.check_partial_results_input(partial_results_file, questions)
+    # one scored row and a row cut off by a crash
+    partial_results_file.write_text(
+        json.dumps({"user_input": "question 0", "scores": 3}) + '\n{"user_in',
+        encoding="utf-8",
+    )
+
+    partial_results_file, model_name = dk_bench_utils.run_dk_bench_streaming(
+        *dk_bench_args
+    )
+    # only the questions missing from the partial file are judged
+    assert run_mock.call_count == 2
+    assert [
+        call.kwargs["dataset"][0]["user_input"] for call in run_mock.mock_calls
+    ] == [
+        "question 1",
+        "question 2",
+    ]
+    assert dk_bench_utils.count_completed_rows(partial_results_file) == 3
+
+    files, scores = dk_bench_utils.write_results_from_jsonl(
+        partial_results_file, ["jsonl", "xlsx"], str(output_dir), model_name
+    )
+    assert scores == [3, 5, 5]
+    jsonl_file, xlsx_file = files
+    with open(jsonl_file, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f]
+    assert [row["user_input"] for row in rows] == [f"question {i}" for i in range(3)]
+    assert os.path.getsize(xlsx_file) > 0
+    assert not partial_results_file.exists()
+    assert not partial_results_file.with_suffix(".sha256").exists()
+
+
+@patch(
+    "instructlab.model.dk_bench_utils.is_judge_model_name_valid",
+    return_value=True,
+)
+@patch("instructlab.eval.ragas.RagasEvaluator.run", side_effect=score_question)
+def test_dk_bench_streaming_changed_questions(
+    run_mock, is_judge_model_name_valid_mock, tmp_path, monkeypatch
+):
+    # First Party
+    # a module level import would bind launch_server before other tests patch it
+    from instructlab.model import dk_bench_utils
+
+    monkeypatch.setenv("OPENAI_API_KEY", "TEMP_KEY")
+    questions = tmp_path / "questions.jsonl"
+    write_questions(questions, 2)
+    args = (None, False, "", "", "", "model", None, None, None, False)
+    dk_bench_args = (*args, str(questions), "", 0.0, "gpt-4o", str(tmp_path))
+    # an interrupted run leaves its scored rows behind
+    dk_bench_utils.run_dk_bench_streaming(*dk_bench_args)
+    assert run_mock.call_count == 2
+
+    # rows of the partial file no longer match the questions by position
+    write_questions(questions, 3)
+    with pytest.raises(ValueError, match="different version"):
+        dk_bench_utils.run_dk_bench_streaming(*dk_bench_args)
+    assert run_mock.call_count == 2
+
+
+def test_evaluate_streaming_other_benchmark(cli_runner: CliRunner):
+    result = cli_runner.invoke(
+        lab.ilab,
+        [
+            "--config=DEFAULT",
+            "model",
+            "evaluate",
+            "--benchmark",
+            "mmlu",
+            "--streaming",
+        ],
+    )
+    assert result.exit_code == 2
+    assert "--streaming is only supported by the dk_bench benchmark" in result.output
+
+
 def test_evaluate_dk_bench_no_input_questions_file(cli_runner: CliRunner):
     result = cli_runner.invoke(
         lab.ilab,
@@ -1067,3 +1185,225 @@ def test_evaluate_dk_bench_output_dir_is_file(cli_runner: CliRunner, tmp_path):
     )
     assert result.exit_code == 1
     assert "is a file not a directory" in result.output
+
+
+@patch("instructlab.model.evaluate_matrix.validate_model")
+@patch(
+    "instructlab.model.evaluate_matrix.launch_server",
+    return_value=(mock.MagicMock(), "http://127.0.0.1:8000/v1", 1),
+)
+@patch(
+    "instructlab.eval.mmlu.MMLUEvaluator.run",
+    side_effect=[(0.5, {}), (0.75, {})],
+)
+@patch(
+    "instructlab.eval.mt_bench.MTBenchEvaluator.gen_answers",
+    return_value={},
+)
+@patch(
+    "instructlab.eval.mt_bench.MTBenchEvaluator.judge_answers",
+    autospec=True,
+    # models are judged concurrently, in any order
+    side_effect=lambda self, *args, **kwargs: {
+        "model-a": (1.5, [], [1.001, 2], 0),
+        "model-b": (2.5, [], [1.001, 2], 0),
+    }[self.model_name],
+)
+def test_evaluate_matrix(
+    judge_answers_mock,
+    gen_answers_mock,
+    run_mock,
+    launch_server_mock,
+    validate_model_mock,
+    cli_runner: CliRunner,
+    tmp_path,
+):
+    result = cli_runner.invoke(
+        lab.ilab,
+        [
+            "--config=DEFAULT",
+            "model",
+            "evaluate-matrix",
+            "--models",
+            "models/model-a",
+            "--models",
+            "models/model-b",
+            "--models",
+            "models/model-a",
+            "--benchmarks",
+            "mmlu",
+            "--benchmarks",
+            "mt_bench",
+            "--judge-endpoint",
+            "http://judge:8000/v1",
+            "--output-dir",
+            tmp_path,
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    # duplicate models are only served once and the remote judge is never launched
+    assert validate_model_mock.call_count == 2
+    assert launch_server_mock.call_count == 2
+    assert run_mock.call_count == 2
+    assert gen_answers_mock.call_count == 2
+    assert judge_answers_mock.call_count == 2
+    assert "# EVALUATION MATRIX REPORT" in result.output
+    assert "| models/model-a | 0.5/1.0  | 1.5/10.0 |" in result.output
+    assert "| models/model-b | 0.75/1.0 | 2.5/10.0 |" in result.output
+    assert "## TIMING (seconds)" in result.output
+    assert len(list(tmp_path.glob("matrix_*.json"))) == 1
+
+
+@patch("instructlab.model.evaluate_matrix.validate_model")
+@patch(
+    "instructlab.model.evaluate_matrix.launch_server",
+    return_value=(mock.MagicMock(), "http://127.0.0.1:8000/v1", 1),
+)
+@patch(
+    "instructlab.eval.mmlu.MMLUEvaluator.run",
+    side_effect=[RuntimeError("out of memory"), (0.75, {})],
+)
+def test_evaluate_matrix_benchmark_failure(
+    run_mock,
+    launch_server_mock,
+    validate_model_mock,
+    cli_runner: CliRunner,
+    tmp_path,
+):
+    result = cli_runner.invoke(
+        lab.ilab,
+        [
+            "--config=DEFAULT",
+            "model",
+            "evaluate-matrix",
+            "--models",
+            "models/model-a",
+            "--models",
+            "models/model-b",
+            "--benchmarks",
+            "mmlu",
+            "--output-dir",
+            tmp_path,
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    # the failure is reported in its cell and the next model is still evaluated
+    assert run_mock.call_count == 2
+    assert "| models/model-b | 0.75/1.0 |" in result.output
+    assert "out of memory" in result.output
+
+
+def test_evaluate_matrix_dk_bench_no_input_questions(cli_runner: CliRunner, tmp_path):
+    result = cli_runner.invoke(
+        lab.ilab,
+        [
+            "--config=DEFAULT",
+            "model",
+            "evaluate-matrix",
+            "--models",
+            "instructlab/granite-7b-lab",
+            "--benchmarks",
+            "dk_bench",
+            "--output-dir",
+            tmp_path,
+        ],
+    )
+    assert result.exit_code == 1
+    assert (
+        "Benchmark dk_bench requires the following args to be set: ['input-questions']"
+        in result.output
+    )
+
+
+@patch("lm_eval.tasks.TaskManager")
+@patch("instructlab.eval.mmlu.MMLUEvaluator.run")
+@patch(
+    "instructlab.eval.mmlu.MMLUEvaluator._run_mmlu",
+    autospec=True,
+    return_value={
+        "task1": {"acc,none": 0.2, "acc_stderr,none": 0.01},
+        "task2": {"acc,none": 0.6, "acc_stderr,none": 0.02},
+    },
+)
+def test_mmlu_request_cache_shared_across_checkpoints(
+    run_mmlu_mock, run_mock, task_manager_mock, tmp_path
+):
+    # Third Party
+    from instructlab.eval.mmlu import MMLUEvaluator
+    import lm_eval.caching.cache
+
+    # First Party
+    from instructlab.model.mmlu_cache import MMLURequestCache
+
+    lm_eval_cache_path = lm_eval.caching.cache.PATH
+    checkpoints = []
+    for name in ("samples_100", "samples_200"):
+        ckpt = tmp_path / name
+        ckpt.mkdir()
+        (ckpt / "tokenizer.json").write_text('{"vocab": {}}', encoding="utf-8")
+        (ckpt / "tokenizer_config.json").write_text("{}", encoding="utf-8")
+        checkpoints.append(ckpt)
+
+    cache = MMLURequestCache(tmp_path / "cache")
+    evaluators = [
+        MMLUEvaluator(str(ckpt), tasks=["task1", "task2"], system_prompt="sys")
+        for ckpt in checkpoints
+    ]
+    assert cache.key(evaluators[0]) == cache.key(evaluators[1])
+    assert cache.key(evaluators[0]) != cache.key(
+        MMLUEvaluator(str(checkpoints[0]), tasks=["task1", "task2"], few_shots=2)
+    )
+
+    for evaluator in evaluators:
+        overall_score, individual_scores = cache.run(evaluator)
+        assert round(overall_score, 2) == 0.4
+        assert individual_scores["task2"] == {"score": 0.6, "stderr": 0.02}
+
+    run_mock.assert_not_called()
+    # the request cache of lm_eval is only redirected during the evaluation
+    assert lm_eval_cache_path == lm_eval.caching.cache.PATH
+    assert cache.misses == 1
+    assert cache.hits == 1
+    assert "1 hit(s), 1 miss(es)" in cache.report()
+    # every checkpoint is evaluated with the same canonical tokenizer
+    model_args = [c.args[2]["model_args"] for c in run_mmlu_mock.call_args_list]
+    tokenizers = {args.rsplit("tokenizer=", 1)[1] for args in model_args}
+    assert len(tokenizers) == 1
+    assert all(c.args[2]["cache_requests"] for c in run_mmlu_mock.call_args_list)
+    # the lm_eval task index is built once
+    task_manager_mock.assert_called_once()
+
+
+@patch(
+    "instructlab.eval.mmlu.MMLUEvaluator.run",
+    return_value=(0.5, {"task1": {"score": 0.5}}),
+)
+def test_mmlu_request_cache_no_tokenizer(run_mock, tmp_path):
+    # Third Party
+    from instructlab.eval.mmlu import MMLUEvaluator
+
+    # First Party
+    from instructlab.model.mmlu_cache import MMLURequestCache
+
+    cache = MMLURequestCache(tmp_path / "cache")
+    evaluator = MMLUEvaluator(str(tmp_path), tasks=["task1"])
+    assert cache.run(evaluator, "http://127.0.0.1:8000/v1") == (
+        0.5,
+        {"task1": {"score": 0.5}},
+    )
+    run_mock.assert_called_once_with("http://127.0.0.1:8000/v1")
+    assert not cache.hits and not cache.misses
+
+
+def test_mmlu_request_cache_unsupported_evaluator(tmp_path):
+    # First Party
+    from instructlab.model.mmlu_cache import MMLURequestCache
+
+    (tmp_path / "tokenizer.json").write_text('{"vocab": {}}', encoding="utf-8")
+    # an instructlab-eval without the private _run_mmlu(server_url, extra_args)
+    evaluator = mock.Mock(spec=["run", "model_path"], model_path=str(tmp_path))
+    evaluator.run.return_value = (0.5, {})
+    cache = MMLURequestCache(tmp_path / "cache")
+    assert cache.run(evaluator) == (0.5, {})
+    evaluator.run.assert_called_once_with(None)
+    assert not cache.hits and not cache.misses
@@ -66,8 +66,10 @@ class TestLabModelTest:
         runner = CliRunner()
         with runner.isolated_filesystem():
             os.mkdir("generated")
+            # a repeated question is still sent and timed twice
             Path("test_file.jsonl").write_text(
-                '{"system": "", "user": "question?", "assistant": ""}', encoding="utf-8"
+                '{"system": "", "user": "question?", "assistant": ""}\n' * 2,
+                encoding="utf-8",
             )
             result = runner.invoke(
                 lab.ilab,
@@ -78,4 +80,53 @@ class TestLabModelTest:
             assert is_macos_with_m_chip_mock.call_count
             assert "question?" in result.output
             assert "answer!" in result.output
+            assert "2 requests in" in result.output
             assert result.exit_code == 0
+
+    @patch("instructlab.utils.is_macos_with_m_chip", return_value=False)
+    @patch(
+        "instructlab.model.linux_test.response",
+        side_effect=lambda client, user, create_params: f"answer to {user}",
+    )
+    @patch(
+        "instructlab.model.backends.backends.select_backend",
+        return_value=ServerMock(),
+    )
+    def test_model_test_linux_concurrent(
+        self,
+        select_backend_mock,
+        response_mock,
+        is_macos_with_m_chip_mock,
+    ):
+        runner = CliRunner()
+        with runner.isolated_filesystem():
+            os.mkdir("generated")
+            Path("test_file.jsonl").write_text(
+                "\n".join(
+                    f'{{"system": "", "user": "question {i}?", "assistant": ""}}'
+                    for i in range(10)
+                ),
+                encoding="utf-8",
+            )
+            result = runner.invoke(
+                lab.ilab,
+                [
+                    "--config=DEFAULT",
+                    "model",
+                    "test",
+                    "--test_file",
+                    "test_file.jsonl",
+                    "--max-workers",
+                    "4",
+                ],
+            )
+            assert result.exit_code == 0, result.output
+            # two models are tested
+            assert select_backend_mock.call_count == 2
+            assert response_mock.call_count == 20
+            assert is_macos_with_m_chip_mock.call_count
+            # answers are reported in test file order
+            positions = [result.output.index(f"### question {i}?") for i in range(10)]
+            assert positions == sorted(positions)
+            assert "answer to question 9?" in result.output
+            assert "10 requests in" in result.output
@@ -1,6 +1,7 @@
 # Standard
 import datetime
 import json
+import logging
 import os
 import textwrap
 
@@ -10,6 +11,11 @@ from click.testing import CliRunner
 # First Party
 from instructlab import lab
 from instructlab.defaults import DEFAULTS, ILAB_PROCESS_STATUS
+from instructlab.train.telemetry import (
+    TELEMETRY_FILE,
+    TelemetryOptions,
+    TrainingTelemetry,
+)
 
 
 def extract_process_entries(table_output: str) -> str:
@@ -124,3 +130,73 @@ def test_process_list_none(cli_runner: CliRunner):
     )
     assert result.exit_code == 0, result.output
     assert "No processes found in registry" in result.output
+
+
+def test_process_list_training_telemetry(cli_runner: CliRunner, tmp_path):
+    prometheus_file = tmp_path / "ilab_training.prom"
+    with TrainingTelemetry(
+        tmp_path / "checkpoints",
+        "full",
+        TelemetryOptions(prometheus_textfile=prometheus_file),
+    ) as telemetry:
+        telemetry.add_phase("data_wait", 0.25)
+        telemetry.add_phase("forward", 1.5)
+        telemetry.add_phase("backward", 2.0)
+        record = telemetry.record_step(
+            epoch=1, step=7, tokens=4096, step_seconds=4.0, vram_bytes=2 * 1024**3
+        )
+        assert record["seconds"] == {"data_wait": 0.25, "forward": 1.5, "backward": 2.0}
+        assert record["tokens_per_sec"] == 1024.0
+
+        result = cli_runner.invoke(
+            lab.ilab,
+            ["--config=DEFAULT", "process", "list", "--state", "running"],
+        )
+        assert result.exit_code == 0, result.output
+        assert telemetry.process_uuid in result.output
+        assert "Tokens/s" in result.output
+        rows = [
+            [col.strip() for col in line.split("|")[1:-1]]
+            for line in result.output.splitlines()
+            if line.startswith("|")
+        ]
+        assert [
+            telemetry.process_uuid,
+            "1/7",
+            "1024.0",
+            "0.250s",
+            "1.500s",
+            "2.000s",
+            "-",
+        ] == rows[-1][:7]
+        assert rows[-1][8] == "2.0 GiB"
+
+    assert 'ilab_training_step{pipeline="full"} 7' in prometheus_file.read_text(
+        encoding="utf-8"
+    )
+    assert (
+        'ilab_training_phase_seconds{pipeline="full",phase="forward"} 1.5'
+        in prometheus_file.read_text(encoding="utf-8")
+    )
+    lines = (tmp_path / "checkpoints" / TELEMETRY_FILE).read_text().splitlines()
+    assert json.loads(lines[-1])["step"] == 7
+
+    # the run is marked as completed when telemetry is closed
+    result = cli_runner.invoke(
+        lab.ilab,
+        ["--config=DEFAULT", "process", "list", "--state", "done"],
+    )
+    assert result.exit_code == 0, result.output
+    assert telemetry.process_uuid in result.output
+
+    # the process follows a log of its own, the telemetry is a separate file
+    with open(DEFAULTS.PROCESS_REGISTRY_FILE, encoding="utf-8") as f:
+        entry = json.load(f)[telemetry.process_uuid]
+    assert entry["telemetry_file"] == str(tmp_path / "checkpoints" / TELEMETRY_FILE)
+    assert entry["log_file"].startswith(os.path.join(DEFAULTS.LOGS_DIR, "training"))
+    assert os.path.isfile(entry["log_file"])
+    # nothing is written to the log once the process is completed
+    assert not any(
+        getattr(handler, "baseFilename", None) == entry["log_file"]
+        for handler in logging.getLogger().handlers
+    )
@@ -9,6 +9,7 @@ import json
 import os
 import platform
 import sys
+import time
 import typing
 
 # Third Party
@@ -19,6 +20,7 @@ import pytest
 from instructlab import lab
 from instructlab.configuration import DEFAULTS
 from instructlab.train import linux_train
+from instructlab.train.lora_mlx import make_data
 
 INPUT_DIR = "test_generated"
 TRAINING_RESULTS_DIR = "training_results"
@@ -469,7 +471,9 @@ class TestLabTrain:
         assert linux_train_mock.call_args[1]["num_epochs"] == 10
         assert linux_train_mock.call_args[1]["train_device"] is not None
         assert not linux_train_mock.call_args[1]["four_bit_quant"]
-        assert len(linux_train_mock.call_args[1]) == 6
+        assert len(linux_train_mock.call_args[1]) == 14
+        assert linux_train_mock.call_args[1]["test_batch_size"] == 8
+        assert linux_train_mock.call_args[1]["max_test_samples"] is None
         is_macos_with_m_chip_mock.assert_called_once()
         assert not os.path.isfile(LINUX_GGUF_FILE)
 
@@ -541,7 +545,7 @@ class TestLabTrain:
             assert linux_train_mock.call_args[1]["num_epochs"] == 10
             assert linux_train_mock.call_args[1]["train_device"] is not None
             assert not linux_train_mock.call_args[1]["four_bit_quant"]
-            assert len(linux_train_mock.call_args[1]) == 6
+            assert len(linux_train_mock.call_args[1]) == 14
             is_macos_with_m_chip_mock.assert_called_once()
             assert not os.path.isfile(LINUX_GGUF_FILE)
 
@@ -579,7 +583,7 @@ class TestLabTrain:
             assert linux_train_mock.call_args[1]["num_epochs"] == 10
             assert linux_train_mock.call_args[1]["train_device"] is not None
             assert not linux_train_mock.call_args[1]["four_bit_quant"]
-            assert len(linux_train_mock.call_args[1]) == 6
+            assert len(linux_train_mock.call_args[1]) == 14
             assert not os.path.isfile(LINUX_GGUF_FILE)
 
     @patch("instructlab.utils.is_macos_with_m_chip", return_value=False)
@@ -742,6 +746,636 @@ class TestLabTrain:
         get_checkpoints_mock.assert_called_once()
         assert result.exit_code == 0
 
+    def test_pipelined_phase_eval(self, tmp_path):
+        # First Party
+        from instructlab.model import accelerated_train
+        from instructlab.model.phased_training import EvalPhaseModel, TrainingJournal
+
+        journal = TrainingJournal(journalfile=tmp_path / "journal.yaml")
+        journal.commit(create_new=True)
+        phase_model = EvalPhaseModel(checkpoints=[])
+        journal.journal.eval_2 = phase_model
+        checkpoints_dir = tmp_path / "hf_format"
+        scores = {"samples_100": 1.0, "samples_200": 2.0}
+
+        def save_checkpoint(name):
+            ckpt = checkpoints_dir / name
+            ckpt.mkdir(parents=True)
+            (ckpt / "config.json").write_text("{}", encoding=ENCODING)
+            (ckpt / "model.safetensors").write_bytes(b"weights")
+            return ckpt
+
+        def run_phase():
+            first = save_checkpoint("samples_100")
+            # the first checkpoint is evaluated while training is still running
+            for _ in range(200):
+                if first in phase_model.finished_checkpoints:
+                    break
+                time.sleep(0.05)
+            assert first in phase_model.finished_checkpoints
+            save_checkpoint("samples_200")
+
+        def evaluate(model, env):
+            # the servers of the evaluation only see the spare GPUs, without
+            # changing the environment training and other threads see
+            assert env["CUDA_VISIBLE_DEVICES"] == "1"
+            assert os.environ.get("CUDA_VISIBLE_DEVICES") == visible_devices
+            return scores[model.name]
+
+        visible_devices = os.environ.get("CUDA_VISIBLE_DEVICES")
+        accelerated_train._run_pipelined_phase(
+            run_phase=run_phase,
+            checkpoints_dir=checkpoints_dir,
+            eval_func=evaluate,
+            phase_model=phase_model,
+            journal=journal,
+            gpus=[1],
+            poll_interval=0.05,
+        )
+
+        assert sorted(c.name for c in phase_model.finished_checkpoints) == [
+            "samples_100",
+            "samples_200",
+        ]
+        best = TrainingJournal.best_checkpoint(phase_model=phase_model)
+        assert best.checkpoint.name == "samples_200"
+        assert "samples_200" in (tmp_path / "journal.yaml").read_text(encoding=ENCODING)
+
+    def test_processed_dataset_cache(self, tmp_path):
+        # First Party
+        from instructlab.model.dataset_cache import ProcessedDatasetCache
+
+        model_dir = tmp_path / "model"
+        model_dir.mkdir()
+        (model_dir / "tokenizer.json").write_text("{}", encoding=ENCODING)
+        sdg_data = tmp_path / "train.jsonl"
+        sdg_data.write_text('{"messages": []}\n', encoding=ENCODING)
+        processed = tmp_path / "data.jsonl"
+        processed.write_text(
+            '{"input_ids": [1, 2, 3], "labels": [-100, 2, 3], "len": 3}\n'
+            '{"input_ids": [4, 5], "labels": [-100, 5], "len": 2}\n',
+            encoding=ENCODING,
+        )
+
+        def make_cache(max_seq_len=4096):
+            return ProcessedDatasetCache(
+                data_path=str(sdg_data),
+                model_path=str(model_dir),
+                chat_tmpl_path=None,
+                max_seq_len=max_seq_len,
+                cache_dir=tmp_path / "cache",
+            )
+
+        cache = make_cache()
+        assert not cache.exists()
+        cache.store(processed)
+        assert make_cache().exists()
+        assert not make_cache(max_seq_len=2048).exists()
+
+        dataset = make_cache().load()
+        assert len(dataset) == 2
+        assert list(dataset.get_lengths()) == [3, 2]
+        assert dataset[1]["input_ids"].tolist() == [4, 5]
+        assert dataset[0]["labels"].tolist() == [-100, 2, 3]
+        assert dataset[0]["attention_mask"].tolist() == [1, 1, 1]
+
+        compute = mock.MagicMock(return_value=(1000, 2))
+        assert cache.packing_params(8, 5000, compute) == (1000, 2)
+        assert make_cache().packing_params(8, 5000, compute) == (1000, 2)
+        compute.assert_called_once()
+
+        cache.restore(tmp_path / "output")
+        assert (tmp_path / "output" / "data.jsonl").read_text(
+            encoding=ENCODING
+        ) == processed.read_text(encoding=ENCODING)
+
+    @patch("instructlab.model.full_train.ProcessPoolExecutor")
+    def test_checkpoint_exporter_bounded_queue(self, executor_mock):
+        # First Party
+        from instructlab.model import full_train
+
+        futures = [mock.MagicMock() for _ in range(3)]
+        executor_mock.return_value.submit.side_effect = futures
+
+        exporter = full_train.CheckpointExporter(max_pending=2)
+        exporter.submit(Path("samples_0"))
+        exporter.submit(Path("samples_8"))
+        futures[0].result.assert_not_called()
+        # a third checkpoint waits for the oldest export to finish
+        exporter.submit(Path("samples_16"))
+        futures[0].result.assert_called_once()
+        futures[1].result.assert_not_called()
+
+        exporter.wait()
+        for future in futures:
+            future.result.assert_called_once()
+        executor_mock.return_value.submit.assert_called_with(
+            full_train.export_gguf, "samples_16"
+        )
+        executor_mock.return_value.shutdown.assert_called_once()
+
+    @patch("instructlab.model.full_train.ProcessPoolExecutor")
+    def test_checkpoint_exporter_errors(self, executor_mock):
+        # First Party
+        from instructlab.model import full_train
+
+        futures = [mock.MagicMock() for _ in range(2)]
+        futures[0].result.side_effect = RuntimeError("export failed")
+        executor_mock.return_value.submit.side_effect = futures
+
+        exporter = full_train.CheckpointExporter()
+        exporter.submit(Path("samples_0"))
+        exporter.submit(Path("samples_8"))
+        # after a training error, export failures are logged and the
+        # remaining exports still complete
+        exporter.wait(raise_errors=False)
+        futures[1].result.assert_called_once()
+        executor_mock.return_value.shutdown.assert_called_once()
+
+        futures = [mock.MagicMock()]
+        futures[0].result.side_effect = RuntimeError("export failed")
+        executor_mock.return_value.submit.side_effect = futures
+        exporter = full_train.CheckpointExporter()
+        exporter.submit(Path("samples_0"))
+        with pytest.raises(RuntimeError, match="export failed"):
+            exporter.wait()
+
+    def test_full_train_collate_fns(self):
+        # Third Party
+        import torch
+
+        # First Party
+        from instructlab.model import full_train
+
+        batch = [
+            {
+                "input_ids": torch.tensor([1, 2, 3]),
+                "labels": torch.tensor([-100, 2, 3]),
+                "attention_mask": torch.ones(3, dtype=torch.long),
+            },
+            {
+                "input_ids": torch.tensor([4, 5]),
+                "labels": torch.tensor([4, 5]),
+                "attention_mask": torch.ones(2, dtype=torch.long),
+            },
+        ]
+
+        padded = full_train.pad_collate_fn(batch, pad_token_id=0)
+        assert padded["input_ids"].tolist() == [[1, 2, 3], [0, 4, 5]]
+        assert padded["labels"].tolist() == [[-100, 2, 3], [-100, 4, 5]]
+        assert padded["attention_mask"].tolist() == [[1, 1, 1], [0, 1, 1]]
+        assert padded["num_loss_counted_tokens"] == 4
+        assert padded["num_padding_tokens"] == 1
+
+        packed = full_train.packed_collate_fn(batch)
+        assert packed["input_ids"].tolist() == [[1, 2, 3, 4, 5]]
+        # the second sample's first token isn't predicted across the boundary
+        assert packed["labels"].tolist() == [[-100, 2, 3, -100, 5]]
+        assert packed["position_ids"].tolist() == [[0, 1, 2, 0, 1]]
+        assert packed["num_loss_counted_tokens"] == 3
+        assert packed["num_padding_tokens"] == 0
+        # the mask is only built for the forward pass of models that need one
+        assert "attention_mask" not in packed
+        model = mock.Mock(config=mock.Mock(_attn_implementation="sdpa"))
+        inputs = full_train._model_inputs(
+            {"position_ids": packed["position_ids"]}, model, torch.device("cpu")
+        )
+        assert inputs["attention_mask"][0, 0].int().tolist() == [
+            [1, 0, 0, 0, 0],
+            [1, 1, 0, 0, 0],
+            [1, 1, 1, 0, 0],
+            [0, 0, 0, 1, 0],
+            [0, 0, 0, 1, 1],
+        ]
+        model.config._attn_implementation = "flash_attention_2"
+        inputs = full_train._model_inputs(
+            {"position_ids": packed["position_ids"]}, model, torch.device("cpu")
+        )
+        assert "attention_mask" not in inputs
+
+    def test_full_train_length_buckets(self):
+        # Third Party
+        import torch
+
+        # First Party
+        from instructlab.model import full_train
+
+        assert full_train.length_buckets(4096) == [128, 256, 512, 1024, 2048, 4096]
+        assert full_train.length_buckets(1000, count=3) == [256, 512, 1024]
+
+        batch = [
+            {
+                "input_ids": torch.tensor([1, 2, 3]),
+                "labels": torch.tensor([-100, 2, 3]),
+                "attention_mask": torch.ones(3, dtype=torch.long),
+            },
+            {
+                "input_ids": torch.tensor([4, 5]),
+                "labels": torch.tensor([4, 5]),
+                "attention_mask": torch.ones(2, dtype=torch.long),
+            },
+        ]
+        padded = full_train.pad_collate_fn(batch, pad_token_id=0, bucket_lengths=[4, 8])
+        assert padded["input_ids"].shape == (2, 4)
+        assert padded["num_padding_tokens"] == 3
+        assert padded["num_loss_counted_tokens"] == 4
+
+        packed = full_train.packed_collate_fn(
+            batch, bucket_lengths=[4, 8], pad_token_id=9
+        )
+        assert packed["input_ids"].tolist() == [[1, 2, 3, 4, 5, 9, 9, 9]]
+        assert packed["labels"].tolist() == [[-100, 2, 3, -100, 5, -100, -100, -100]]
+        assert packed["position_ids"].tolist() == [[0, 1, 2, 0, 1, 0, 0, 0]]
+        assert packed["num_loss_counted_tokens"] == 3
+        assert packed["num_padding_tokens"] == 3
+        # samples never attend to the padding, which only attends to itself
+        model = mock.Mock(config=mock.Mock(_attn_implementation="sdpa"))
+        mask = full_train._model_inputs(
+            {"position_ids": packed["position_ids"]}, model, torch.device("cpu")
+        )["attention_mask"]
+        assert not mask[0, 0, :5, 5:].any()
+        assert mask[0, 0, 5:, 5:].int().tolist() == [[1, 0, 0], [0, 1, 0], [0, 0, 1]]
+
+    def test_full_train_bounded_recompiles(self):
+        # Standard
+        import random
+
+        # Third Party
+        import torch
+
+        # First Party
+        from instructlab.model import full_train
+
+        assert full_train.row_buckets(1) == [1]
+        assert full_train.row_buckets(9) == [1, 2, 4, 8, 16]
+
+        bucket_lengths = full_train.length_buckets(256, count=3)
+        bucket_rows = full_train.row_buckets(9)
+        batch = [
+            {
+                "input_ids": torch.tensor([4, 5]),
+                "labels": torch.tensor([4, 5]),
+                "attention_mask": torch.ones(2, dtype=torch.long),
+            }
+        ] * 3
+        padded = full_train.pad_collate_fn(batch, 0, bucket_lengths, bucket_rows)
+        assert padded["input_ids"].shape == (4, 64)
+        assert padded["num_padding_tokens"] == 4 * 64 - 6
+        # the padding row only attends to its last token
+        assert padded["attention_mask"][3].sum() == 1
+
+        graphs = []
+
+        def count_graphs(graph_module, example_inputs):
+            graphs.append(graph_module)
+            return graph_module.forward
+
+        embedding = torch.nn.Embedding(8, 4)
+
+        def step(input_ids, attention_mask):
+            return (embedding(input_ids) * attention_mask.unsqueeze(-1)).sum()
+
+        compiled = torch.compile(step, backend=count_graphs, dynamic=False)
+        rng = random.Random(0)
+        shapes = set()
+        torch._dynamo.reset()
+        # a full cache of graphs would hide further recompiles
+        with torch._dynamo.config.patch(cache_size_limit=64):
+            for _ in range(40):
+                batch = [
+                    {
+                        "input_ids": torch.ones(length, dtype=torch.long),
+                        "labels": torch.ones(length, dtype=torch.long),
+                        "attention_mask": torch.ones(length, dtype=torch.long),
+                    }
+                    for length in (
+                        rng.randint(1, 200) for _ in range(rng.randint(1, 9))
+                    )
+                ]
+                padded = full_train.pad_collate_fn(
+                    batch, 0, bucket_lengths, bucket_rows
+                )
+                shapes.add(tuple(padded["input_ids"].shape))
+                compiled(padded["input_ids"], padded["attention_mask"])
+        torch._dynamo.reset()
+
+        # one graph per bucketed shape, however many sample counts and lengths
+        assert shapes <= {(r, n) for r in bucket_rows for n in bucket_lengths}
+        assert len(graphs) == len(shapes)
+
+    def test_full_train_step_checkpoints(self, tmp_path):
+        # Third Party
+        import torch
+
+        # First Party
+        from instructlab.model import full_train
+
+        model = torch.nn.Linear(4, 2)
+        optimizer = torch.optim.SGD(model.parameters(), lr=0.1, momentum=0.9)
+        model(torch.ones(1, 4)).sum().backward()
+        optimizer.step()
+        layout = {"packing_max_batch_len": 1024, "num_batches": 10}
+        checkpoints = full_train.StepCheckpoints(tmp_path, keep=2, layout=layout)
+        for global_step in (1, 2):
+            checkpoints.save(model, optimizer, 0, global_step * 4, global_step)
+        checkpoints.save(model, optimizer, 1, 2, 3)
+        expected_weight = model.weight.detach().clone()
+        expected_rand = torch.rand(3)
+
+        # only the last two checkpoints are kept
+        assert [p.name for p in checkpoints.checkpoints()] == ["step_2", "step_3"]
+        # an incomplete checkpoint is ignored
+        (checkpoints.dir / "step_9").mkdir()
+        assert checkpoints.latest() == checkpoints.dir / "step_3"
+
+        torch.nn.init.zeros_(model.weight)
+        torch.rand(5)
+        state = full_train.StepCheckpoints(tmp_path, layout=layout).load(
+            checkpoints.latest(), model, optimizer
+        )
+        assert (state["epoch"], state["batch"], state["global_step"]) == (1, 2, 3)
+        assert torch.equal(model.weight, expected_weight)
+        assert optimizer.state_dict()["state"][0]["momentum_buffer"] is not None
+        assert torch.equal(torch.rand(3), expected_rand)
+
+        with pytest.raises(ValueError, match="Cannot resume"):
+            full_train.StepCheckpoints(
+                tmp_path, layout={**layout, "num_batches": 11}
+            ).load(checkpoints.latest(), model, optimizer)
+
+        sampler = mock.MagicMock()
+        sampler.__iter__.return_value = iter([[0], [1], [2], [3]])
+        resumable = full_train.ResumableBatchSampler(sampler)
+        resumable.skip = 3
+        assert list(resumable) == [[3]]
+        # only the resumed epoch skips batches
+        sampler.__iter__.return_value = iter([[0], [1]])
+        assert list(resumable) == [[0], [1]]
+
+    def test_linux_train_batched_generation(self):
+        # Third Party
+        from datasets import Dataset
+        from tokenizers import Tokenizer, models, pre_tokenizers
+        from transformers import GPT2Config, GPT2LMHeadModel, PreTrainedTokenizerFast
+        import torch
+
+        special_tokens = ["<|endoftext|>", "<|assistant|>", "<|system|>", "<|user|>"]
+        words = "what is the capital of france name a primary color why".split()
+        vocab = {token: i for i, token in enumerate(["[UNK]", *special_tokens, *words])}
+        backend = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+        backend.pre_tokenizer = pre_tokenizers.Whitespace()
+        tokenizer = PreTrainedTokenizerFast(
+            tokenizer_object=backend,
+            unk_token="[UNK]",
+            eos_token="<|endoftext|>",
+            additional_special_tokens=special_tokens[1:],
+        )
+        tokenizer.pad_token = tokenizer.eos_token
+        tokenizer.padding_side = "right"
+
+        torch.manual_seed(0)
+        model = GPT2LMHeadModel(
+            GPT2Config(
+                vocab_size=len(vocab),
+                n_positions=128,
+                n_embd=16,
+                n_layer=1,
+                n_head=2,
+                bos_token_id=1,
+                eos_token_id=1,
+            )
+        )
+        model.eval()
+
+        users = ["what is the capital of france", "name a primary color", "why"]
+        generate_kwargs = {
+            "do_sample": False,
+            "temperature": None,
+            "top_p": None,
+            "max_new_tokens": 6,
+            # keep the untrained model from stopping right away
+            "suppress_tokens": [1, 2],
+        }
+        unbatched = linux_train.generate_responses(
+            model, tokenizer, users, batch_size=1, **generate_kwargs
+        )
+        batched = linux_train.generate_responses(
+            model, tokenizer, users, batch_size=3, **generate_kwargs
+        )
+        assert batched == unbatched
+        assert all(batched)
+        assert all(
+            "<|endoftext|>" not in r and "<|assistant|>" not in r for r in batched
+        )
+        # generation pads on the left without changing the tokenizer
+        assert tokenizer.padding_side == "right"
+
+        # each sequence of a batch stops on its own
+        criteria = linux_train.StoppingCriteriaSub(
+            stops=[torch.tensor(1)], device=torch.device("cpu")
+        )
+        assert criteria(torch.tensor([[5, 1], [5, 6]]), None).tolist() == [True, False]
+
+        test_dataset = Dataset.from_list([{"user": u} for u in users])
+        assert linux_train.compared_test_samples(test_dataset, 2)["user"] == users[:2]
+        assert linux_train.compared_test_samples(test_dataset, 10)["user"] == users
+        assert linux_train.compared_test_samples(test_dataset)["user"] == users
+
+    def test_linux_train_generation_strips_eos_padding(self):
+        # Third Party
+        from tokenizers import Tokenizer, models, pre_tokenizers
+        from transformers import PreTrainedTokenizerFast
+        import torch
+
+        vocab = {
+            token: i
+            for i, token in enumerate(["[UNK]", "</s>", "<|assistant|>", "red", "blue"])
+        }
+        backend = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+        backend.pre_tokenizer = pre_tokenizers.Whitespace()
+        tokenizer = PreTrainedTokenizerFast(
+            tokenizer_object=backend, unk_token="[UNK]", eos_token="</s>"
+        )
+        tokenizer.pad_token = tokenizer.eos_token
+
+        model = mock.MagicMock(device=torch.device("cpu"))
+
+        def generate(input_ids, attention_mask, **kwargs):
+            assert kwargs["pad_token_id"] == 1
+            # the shorter response is padded with EOS up to the longer one
+            responses = torch.tensor([[3, 1, 1, 1], [4, 3, 4, 1]])
+            return torch.cat([input_ids, responses], dim=1)
+
+        model.generate.side_effect = generate
+        responses = linux_train.generate_responses(
+            model, tokenizer, ["red", "blue"], batch_size=2
+        )
+        assert responses == ["red", "blue red blue"]
+
+    @pytest.mark.parametrize("attn_implementation", ["sdpa", "eager"])
+    def test_packed_completion_collator(self, attn_implementation):
+        # Third Party
+        from transformers import LlamaConfig, LlamaForCausalLM
+        import torch
+
+        # First Party
+        from instructlab.train import packing
+
+        def padding_collator(features):
+            # right-padded, with the prompt (the first two tokens) masked
+            length = max(len(f["input_ids"]) for f in features)
+            batch = {
+                "input_ids": torch.zeros((len(features), length), dtype=torch.long),
+                "attention_mask": torch.zeros(
+                    (len(features), length), dtype=torch.long
+                ),
+            }
+            for i, f in enumerate(features):
+                batch["input_ids"][i, : len(f["input_ids"])] = torch.tensor(
+                    f["input_ids"]
+                )
+                batch["attention_mask"][i, : len(f["input_ids"])] = 1
+            batch["labels"] = batch["input_ids"].masked_fill(
+                batch["attention_mask"] == 0, -100
+            )
+            batch["labels"][:, :2] = -100
+            return batch
+
+        features = [{"input_ids": [5, 6, 7, 8]}, {"input_ids": [9, 10, 11]}]
+        packed = packing.PackedCompletionCollator(padding_collator)(features)
+        assert packed["input_ids"].tolist() == [[5, 6, 7, 8, 9, 10, 11]]
+        assert packed["labels"].tolist() == [[-100, -100, 7, 8, -100, -100, 11]]
+        assert packed["position_ids"].tolist() == [[0, 1, 2, 3, 0, 1, 2]]
+        assert "attention_mask" not in packed
+
+        torch.manual_seed(0)
+        model = LlamaForCausalLM(
+            LlamaConfig(
+                vocab_size=16,
+                hidden_size=16,
+                intermediate_size=32,
+                num_hidden_layers=1,
+                num_attention_heads=2,
+                attn_implementation=attn_implementation,
+            )
+        )
+        model.eval()
+        hook = packing.add_packed_attention_mask(model)
+        try:
+            with torch.no_grad():
+                logits = model(
+                    input_ids=packed["input_ids"], position_ids=packed["position_ids"]
+                ).logits
+        finally:
+            hook.remove()
+        with torch.no_grad():
+            first = model(input_ids=torch.tensor([[5, 6, 7, 8]])).logits
+            second = model(input_ids=torch.tensor([[9, 10, 11]])).logits
+        # packed samples don't attend to each other
+        torch.testing.assert_close(logits[:, :4], first)
+        torch.testing.assert_close(logits[:, 4:], second)
+
+        assert packing.sample_spans(torch.tensor([0, 1, 0, 1, 2])) == [(0, 2), (2, 5)]
+        budget = packing.packing_token_budget(model, 300, 1024**3)
+        assert budget == 300 * packing.MAX_PACKING_FACTOR
+        assert packing.packing_token_budget(model, 300, 0) == 300
+
+    def test_cpu_autotuner(self, tmp_path):
+        # Third Party
+        import psutil
+        import torch
+
+        # First Party
+        from instructlab.train.autotune import CPUAutoTuner
+
+        default_threads = torch.get_num_threads()
+        memory_budget = psutil.Process().memory_info().rss + 256 * 1024**2
+
+        def compute_trial(micro_batch):
+            if micro_batch == 4096:
+                # goes over the memory budget
+                buf = b"\x01" * (512 * 1024**2)
+                time.sleep(0.2)
+                del buf
+            return micro_batch * torch.get_num_threads(), 1.0
+
+        def loader_trial(num_workers, micro_batch):
+            return (num_workers + 1) * 1000, 1.0
+
+        tuner = CPUAutoTuner("key", memory_budget=memory_budget, tuning_dir=tmp_path)
+        try:
+            profile = tuner.tune(
+                compute_trial,
+                [512, 1024, 4096],
+                1024,
+                loader_trial=loader_trial,
+                threads=[1, 2],
+                workers=[0, 2, 4],
+            )
+            assert profile.num_threads == 2
+            assert profile.micro_batch == 1024
+            assert profile.tokens_per_sec == 2048
+            # 2 workers are the fewest that keep up with the step
+            assert profile.num_workers == 2
+            assert torch.get_num_threads() == 2
+            assert any(
+                trial.get("micro_batch") == 4096 and trial["peak_rss"] > memory_budget
+                for trial in profile.trials
+            )
+
+            # the saved profile is reused without trials
+            torch.set_num_threads(1)
+            untried = mock.Mock()
+            reused = CPUAutoTuner("key", tuning_dir=tmp_path).tune(
+                untried, [1024], 1024, loader_trial=untried
+            )
+            untried.assert_not_called()
+            assert (reused.num_threads, reused.num_workers, reused.micro_batch) == (
+                2,
+                2,
+                1024,
+            )
+            assert torch.get_num_threads() == 2
+        finally:
+            torch.set_num_threads(default_threads)
+
+    def test_training_library_metrics_follower(self, tmp_path):
+        # First Party
+        from instructlab.train.telemetry import (
+            TRAINING_LIBRARY_METRICS_FILE,
+            TrainingLibraryMetricsFollower,
+        )
+
+        metrics_file = tmp_path / TRAINING_LIBRARY_METRICS_FILE
+        # steps of an earlier run in the same directory are skipped
+        metrics_file.write_text(json.dumps({"step": 99}) + "\n", encoding="utf-8")
+        telemetry = mock.MagicMock()
+        follower = TrainingLibraryMetricsFollower(
+            telemetry, tmp_path, poll_interval=0.01
+        )
+        follower.start()
+        with open(metrics_file, "a", encoding="utf-8") as f:
+            for step, timestamp in ((1, "12:00:00"), (2, "12:00:02")):
+                metric = {
+                    "epoch": 0,
+                    "step": step,
+                    "num_loss_counted_tokens": 512,
+                    "total_loss": 1.5,
+                    "cuda_mem_allocated": 1.0,
+                    "timestamp": f"2025-01-01T{timestamp}",
+                }
+                f.write(json.dumps(metric) + "\n")
+            # a partially written line is left for the next poll
+            f.write('{"step": 3')
+        follower.stop()
+
+        assert telemetry.record_step.call_count == 2
+        second = telemetry.record_step.call_args.kwargs
+        assert second["step"] == 2
+        assert second["step_seconds"] == 2.0
+        assert second["tokens"] == 512
+        assert second["vram_bytes"] == 1024**3
+
     @patch(
         "instructlab.model.accelerated_train.accelerated_train",
         return_value=0,
@@ -795,3 +1429,83 @@ class TestLabTrain:
         passed_train_args = accelerated_train_mock.call_args.kwargs["train_args"]
 
         assert not passed_train_args.accelerate_full_state_at_epoch
+
+
+def test_make_data_stable_split(tmp_path: Path):
+    samples = [
+        {"system": "", "user": f"question {i}", "assistant": f"answer {i}"}
+        for i in range(1000)
+    ]
+    (tmp_path / "train_gen.jsonl").write_text(
+        "".join(json.dumps(s) + "\n" for s in samples), encoding=ENCODING
+    )
+    (tmp_path / "test_gen.jsonl").write_text(
+        "".join(json.dumps(s) + "\n" for s in samples[:10]), encoding=ENCODING
+    )
+
+    def read_split(name: str) -> list[dict]:
+        with open(tmp_path / f"{name}.jsonl", encoding=ENCODING) as f:
+            return [json.loads(line) for line in f]
+
+    make_data.make_data(data_dir=str(tmp_path))
+    train, valid, test = (read_split(name) for name in ("train", "valid", "test"))
+    assert len(train) + len(valid) == 1000
+    assert 700 < len(train) < 900
+    assert [s["user"] for s in test] == [s["user"] for s in samples[:10]]
+    assert train[0]["text"].startswith("<|system|>\n")
+    assert train[0]["text"].endswith(f"{train[0]['assistant']}<|endoftext|>")
+
+    # samples keep their split when the dataset is reordered or grows
+    (tmp_path / "train_gen.jsonl").write_text(
+        "".join(
+            json.dumps(s) + "\n"
+            for s in [*reversed(samples), {"system": "", "user": "q", "assistant": "a"}]
+        ),
+        encoding=ENCODING,
+    )
+    make_data.make_data(data_dir=str(tmp_path))
+    valid_users = {s["user"] for s in valid}
+    assert {s["user"] for s in read_split("valid")} - {"q"} == valid_users
+
+    # the Shiv data is split in three
+    (tmp_path / "raw.jsonl").write_text(
+        "".join(
+            json.dumps({"inputs": s["user"], "targets": s["assistant"]}) + "\n"
+            for s in samples
+        ),
+        encoding=ENCODING,
+    )
+    make_data.make_data(
+        data_dir=str(tmp_path),
+        is_shiv=True,
+        ratios={"train": 0.5, "valid": 0.25, "test": 0.25},
+    )
+    splits = {name: read_split(name) for name in ("train", "valid", "test")}
+    assert sum(len(split) for split in splits.values()) == 1000
+    assert all(150 < len(splits[name]) < 350 for name in ("valid", "test"))
+    users = [{s["user"] for s in split} for split in splits.values()]
+    assert not (users[0] & users[1] or users[0] & users[2] or users[1] & users[2])
+
+    # small datasets always get a validation sample, and a test one for Shiv data
+    for size in range(2, 6):
+        (tmp_path / "train_gen.jsonl").write_text(
+            "".join(json.dumps(s) + "\n" for s in samples[:size]), encoding=ENCODING
+        )
+        make_data.make_data(data_dir=str(tmp_path))
+        train, valid = read_split("train"), read_split("valid")
+        assert len(train) >= 1 and len(valid) >= 1
+        assert {s["user"] for s in train + valid} == {s["user"] for s in samples[:size]}
+    (tmp_path / "raw.jsonl").write_text(
+        "".join(
+            json.dumps({"inputs": s["user"], "targets": s["assistant"]}) + "\n"
+            for s in samples[:3]
+        ),
+        encoding=ENCODING,
+    )
+    make_data.make_data(data_dir=str(tmp_path), is_shiv=True)
+    assert [len(read_split(name)) for name in ("train", "valid", "test")] == [1, 1, 1]
+    (tmp_path / "train_gen.jsonl").write_text(
+        json.dumps(samples[0]) + "\n", encoding=ENCODING
+    )
+    with pytest.raises(ValueError, match="at least 2 are needed"):
+        make_data.make_data(data_dir=str(tmp_path))
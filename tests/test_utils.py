@@ -141,6 +141,49 @@ class TestUtils:
             sample["assistant"] == "As an AI language model, I have absolutely no idea."
         )
 
+    def test_convert_hf_dataset_to_legacy(self):
+        # Third Party
+        import datasets
+
+        messages: typing.List[MessageSample] = [
+            {
+                "messages": [
+                    {"role": "system", "content": "You are a friendly assistant"},
+                    {"role": "user", "content": f"What is {i}+{i}?"},
+                    {"role": "assistant", "content": f"{i}+{i}={2 * i}"},
+                ],
+                "group": "test",
+                "dataset": "test-dataset",
+                "metadata": "test",
+            }
+            for i in range(5)
+        ]
+        expected = utils.ensure_legacy_dataset(messages)
+
+        legacy = utils.ensure_legacy_dataset(datasets.Dataset.from_list(messages))
+        assert isinstance(legacy, datasets.Dataset)
+        assert legacy.column_names == ["system", "user", "assistant"]
+        assert legacy.to_list() == expected
+        # legacy datasets are left as they are
+        assert utils.ensure_legacy_dataset(legacy) is legacy
+
+        # iterables are converted as they are read
+        streamed = utils.ensure_legacy_dataset(sample for sample in messages)
+        assert not isinstance(streamed, list)
+        assert list(streamed) == expected
+        streamed = utils.ensure_legacy_dataset(
+            datasets.Dataset.from_list(messages).to_iterable_dataset()
+        )
+        assert isinstance(streamed, datasets.IterableDataset)
+        assert list(streamed) == expected
+
+        with pytest.raises(ValueError):
+            utils.ensure_legacy_dataset(
+                datasets.Dataset.from_list(
+                    [{"messages": m["messages"][:2]} for m in messages]
+                )
+            )
+
     @pytest.mark.parametrize(
         "system,user,assistant",
         [